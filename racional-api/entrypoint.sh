@@ -8,6 +8,8 @@ python manage.py migrate
 python manage.py seed_users
 python manage.py seed_transactions
 python manage.py seed_stocks
+python manage.py compute_stock_stats
 
-python manage.py runserver 0.0.0.0:8000
+# ASGI server, the portfolio stream keeps connections open
+uvicorn project.asgi:application --host 0.0.0.0 --port 8000 --reload
 
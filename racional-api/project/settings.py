@@ -51,6 +51,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    # Before the others, so it compresses what they return
+    'racional_api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -89,7 +91,7 @@ DATABASES = {
         'USER': os.environ.get('POSTGRES_USER'),
         'PASSWORD': os.environ.get('POSTGRES_PASSWORD'),
         'HOST': os.environ.get('POSTGRES_HOST'),
-        'PORT': 5432,
+        'PORT': int(os.environ.get('POSTGRES_PORT', 5432)),
     }
 }
 
@@ -137,10 +139,61 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
+    # orjson instead of the json module, same output (rest_framework.renderers.JSONRenderer to go back)
+    "DEFAULT_RENDERER_CLASSES": [
+        "racional_api.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
 }
 
 SPECTACULAR_SETTINGS = {
     "TITLE": "Racional Investment API",
     "DESCRIPTION": "API for users, portfolios, orders and movements.",
     "VERSION": "1.0.0",
-}
\ No newline at end of file
+}
+
+# Number of cash ledger entries between two balance checkpoints of a user
+CASH_LEDGER_CHECKPOINT_INTERVAL = int(os.environ.get("CASH_LEDGER_CHECKPOINT_INTERVAL", 100))
+
+# Seconds a portfolio total for a past `as_of` date stays cached
+PORTFOLIO_AS_OF_CACHE_TIMEOUT = int(os.environ.get("PORTFOLIO_AS_OF_CACHE_TIMEOUT", 60 * 60 * 24))
+
+# Return analytics
+ANALYTICS_PERIODS_PER_YEAR = 252
+ANALYTICS_RISK_FREE_RATE = float(os.environ.get("ANALYTICS_RISK_FREE_RATE", 0.0))
+ANALYTICS_CACHE_TIMEOUT = int(os.environ.get("ANALYTICS_CACHE_TIMEOUT", 60 * 60))
+
+# Upper bound for ?max_points= on the stock price history endpoint
+PRICE_HISTORY_MAX_POINTS = int(os.environ.get("PRICE_HISTORY_MAX_POINTS", 2000))
+
+# Soft deleted rows older than this many days are moved to ArchivedRecord by `archive_deleted`
+ARCHIVE_RETENTION_DAYS = int(os.environ.get("ARCHIVE_RETENTION_DAYS", 90))
+
+# Seconds a stored Idempotency-Key response is replayed, expired keys are removed by `purge_idempotency_keys`
+IDEMPOTENCY_KEY_TTL = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 60 * 60 * 24))
+
+# "sync" executes stock orders inside the request, "queued" stores them as PENDING for `run_order_workers`
+ORDER_EXECUTION_MODE = os.environ.get("ORDER_EXECUTION_MODE", "sync")
+
+# Portfolio stream: seconds between change checks, and between keepalive comments on an idle stream
+PORTFOLIO_STREAM_POLL_INTERVAL = float(os.environ.get("PORTFOLIO_STREAM_POLL_INTERVAL", 1.0))
+PORTFOLIO_STREAM_KEEPALIVE = float(os.environ.get("PORTFOLIO_STREAM_KEEPALIVE", 15.0))
+
+# Dashboard evolution series: default range in days and default number of points
+DASHBOARD_EVOLUTION_DAYS = int(os.environ.get("DASHBOARD_EVOLUTION_DAYS", 365))
+DASHBOARD_EVOLUTION_POINTS = int(os.environ.get("DASHBOARD_EVOLUTION_POINTS", 100))
+
+# Responses smaller than this many bytes are sent uncompressed
+RESPONSE_COMPRESSION_MIN_SIZE = int(os.environ.get("RESPONSE_COMPRESSION_MIN_SIZE", 1024))
+
+# OpenAPI schema built by `manage.py spectacular` (see Dockerfile), generated on the first request when missing
+OPENAPI_SCHEMA_FILE = os.environ.get("OPENAPI_SCHEMA_FILE", BASE_DIR / "openapi.json")
+
+# Admin changelists stop counting filtered rows here, and show the planner's estimate for larger whole tables
+ADMIN_COUNT_LIMIT = int(os.environ.get("ADMIN_COUNT_LIMIT", 10_000))
+
+# Portfolio simulation: request limits, paths per vectorized chunk and worker processes (1 runs in the request)
+SIMULATION_MAX_PATHS = int(os.environ.get("SIMULATION_MAX_PATHS", 100_000))
+SIMULATION_MAX_YEARS = int(os.environ.get("SIMULATION_MAX_YEARS", 50))
+SIMULATION_CHUNK_PATHS = int(os.environ.get("SIMULATION_CHUNK_PATHS", 1_000))
+SIMULATION_PROCESSES = int(os.environ.get("SIMULATION_PROCESSES", 1))
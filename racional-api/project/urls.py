@@ -16,16 +16,15 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
-from drf_spectacular.views import (
-    SpectacularAPIView,
-    SpectacularSwaggerView,
-)
+from drf_spectacular.views import SpectacularSwaggerView
+
+from racional_api.schema import PrebuiltSchemaView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     
-    # OpenAPI schema (JSON)
-    path('api/schema/', SpectacularAPIView.as_view(), name='schema'),
+    # OpenAPI schema, built once (see racional_api/schema.py)
+    path('api/schema/', PrebuiltSchemaView.as_view(), name='schema'),
 
     # Swagger UI
     path(
@@ -0,0 +1,358 @@
+"""
+Admin of every model, usable on production sized tables.
+
+A stock Django changelist runs `COUNT(*)` twice (filtered and full), pages
+with OFFSET, sorts by `Meta.ordering` (`-created_at` has no index of its own)
+and loads the related rows it shows one by one. Here:
+
+- The count of a whole table is the planner's estimate (`pg_class.reltuples`)
+  and a filtered one stops at ADMIN_COUNT_LIMIT rows.
+- Rows are ordered by primary key, the only sortable column, and pages are a
+  keyset: "Next" asks for the rows after the last id shown (`?after=`), so
+  page 10,000 is as fast as the first.
+- Related rows are joined (`list_select_related`), edited by id
+  (`raw_id_fields`) and filtered by id through the indexes on those columns.
+  Other filters are choices and flags, which do not query the table.
+- Soft deleted rows are listed too, with a filter on `is_deleted`.
+- Rows that move cash or holdings are read-only: their bookkeeping (ledger
+  entries, lots, positions, `User.money`) only runs through the API.
+"""
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ChangeList
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+from .models import (
+    ArchivedRecord,
+    CashBalanceCheckpoint,
+    CashLedgerEntry,
+    IdempotencyKey,
+    LotDisposal,
+    Order,
+    Portfolio,
+    PortfolioComponent,
+    PortfolioVersion,
+    Position,
+    Stock,
+    StockDailyStats,
+    StockPrice,
+    TaxLot,
+    Transaction,
+    User,
+)
+
+CURSOR_VAR = "after"
+
+
+def estimated_count(model, using="default"):
+    """Row count of the model's table from the planner statistics, None before its first ANALYZE."""
+    with connections[using].cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [model._meta.db_table])
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    Paginator that never counts a large table.
+
+    Unfiltered, the count is the planner's estimate once it is above
+    ADMIN_COUNT_LIMIT; filtered, counting stops at that many rows. `label` is
+    the count as shown ("~12345678", "10000+" or exact).
+    """
+
+    label = None
+
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_COUNT_LIMIT
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > limit:
+                self.label = f"~{estimate}"
+                return estimate
+        count = queryset.order_by()[: limit + 1].count()
+        if count > limit:
+            self.label = f"{limit}+"
+            return limit
+        self.label = str(count)
+        return count
+
+
+class KeysetChangeList(ChangeList):
+    """
+    Changelist paged by primary key instead of OFFSET.
+
+    `after` is the id the page starts after, `next_page_url` is None on the
+    last page. Links to other filters or orderings start from the first page.
+    """
+
+    def __init__(self, request, *args, **kwargs):
+        self.after = request.GET.get(CURSOR_VAR)
+        super().__init__(request, *args, **kwargs)
+
+    def get_filters_params(self, params=None):
+        params = super().get_filters_params(params)
+        params.pop(CURSOR_VAR, None)
+        return params
+
+    def get_query_string(self, new_params=None, remove=None):
+        return super().get_query_string(new_params, [CURSOR_VAR, *(remove or ())])
+
+    def get_results(self, request):
+        paginator = self.model_admin.get_paginator(request, self.queryset, self.list_per_page)
+        queryset = self.queryset
+        if self.after is not None:
+            try:
+                after = int(self.after)
+            except ValueError:
+                raise IncorrectLookupParameters(f"Invalid {CURSOR_VAR}: {self.after}")
+            # The only ordering is the primary key, in either direction
+            term = queryset.query.order_by[0]
+            descending = term.descending if hasattr(term, "descending") else term.startswith("-")
+            queryset = queryset.filter(pk__lt=after) if descending else queryset.filter(pk__gt=after)
+
+        # One row more than a page tells whether there is a next one
+        rows = list(queryset[: self.list_per_page + 1])
+        self.result_list = rows[: self.list_per_page]
+        self.next_page_url = None
+        if len(rows) > self.list_per_page:
+            self.next_page_url = self.get_query_string({CURSOR_VAR: self.result_list[-1].pk})
+        self.first_page_url = self.get_query_string() if self.after is not None else None
+
+        self.result_count = paginator.count
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = self.next_page_url is not None or self.after is not None
+        self.paginator = paginator
+
+
+class IdFilter(admin.SimpleListFilter):
+    """Text box filtering on the id of a related row (`parameter_name`), through the index on that column."""
+
+    template = "admin/racional_api/id_filter.html"
+
+    def lookups(self, request, model_admin):
+        # Any id is accepted, one entry keeps the filter on the page
+        return [("", "")]
+
+    def queryset(self, request, queryset):
+        if not self.value():
+            return queryset
+        try:
+            pk = int(self.value())
+        except ValueError:
+            raise IncorrectLookupParameters(f"Invalid {self.parameter_name}: {self.value()}")
+        return queryset.filter(**{f"{self.parameter_name}_id": pk})
+
+    def choices(self, changelist):
+        yield {
+            "query_parts": [
+                (key, value)
+                for key, values in changelist.get_filters_params().items()
+                if key != self.parameter_name
+                for value in values
+            ],
+            "query_string": changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+
+class UserIdFilter(IdFilter):
+    title = "user id"
+    parameter_name = "user"
+
+
+class StockIdFilter(IdFilter):
+    title = "stock id"
+    parameter_name = "stock"
+
+
+class PortfolioIdFilter(IdFilter):
+    title = "portfolio id"
+    parameter_name = "portfolio"
+
+
+class OrderIdFilter(IdFilter):
+    title = "order id"
+    parameter_name = "order"
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Keyset paged, estimated count changelist ordered by id (see module docstring)."""
+
+    paginator = EstimatedCountPaginator
+    change_list_template = "admin/racional_api/keyset_change_list.html"
+    ordering = ("-pk",)
+    sortable_by = ("id",)
+    show_full_result_count = False
+    show_facets = admin.ShowFacets.NEVER
+    list_per_page = 100
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+    def get_queryset(self, request):
+        # Deleted rows too, `is_deleted` is a filter
+        manager = getattr(self.model, "all_objects", self.model._default_manager)
+        return manager.get_queryset().order_by(*self.get_ordering(request))
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        # Deletes with a queryset, skipping the soft delete and the ledger reversal of `delete()`
+        actions.pop("delete_selected", None)
+        return actions
+
+
+class ReadOnlyAdmin(LargeTableAdmin):
+    """Browse only: adding, editing or deleting here would skip the ledger and lot bookkeeping."""
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(User)
+class UserAdmin(LargeTableAdmin):
+    list_display = ("id", "first_name", "last_name", "email", "money", "is_deleted")
+    # Cash only moves with deposits, withdrawals and orders
+    readonly_fields = ("money",)
+    list_filter = ("is_deleted",)
+    # Exact match, served by the unique index
+    search_fields = ("=email",)
+
+
+@admin.register(Transaction)
+class TransactionAdmin(ReadOnlyAdmin):
+    list_display = ("id", "user", "transaction_type", "amount", "execution_date", "created_at", "is_deleted")
+    list_select_related = ("user",)
+    list_filter = (UserIdFilter, "transaction_type", "is_deleted")
+    raw_id_fields = ("user",)
+
+
+@admin.register(Stock)
+class StockAdmin(LargeTableAdmin):
+    list_display = ("id", "symbol", "name", "is_deleted")
+    list_filter = ("is_deleted",)
+    search_fields = ("=symbol",)
+
+
+@admin.register(StockPrice)
+class StockPriceAdmin(LargeTableAdmin):
+    list_display = ("id", "stock__symbol", "value", "date", "is_deleted")
+    list_select_related = ("stock",)
+    list_filter = (StockIdFilter, "is_deleted")
+    raw_id_fields = ("stock",)
+
+
+@admin.register(StockDailyStats)
+class StockDailyStatsAdmin(LargeTableAdmin):
+    list_display = ("id", "stock__symbol", "date", "close", "daily_return", "volatility_20", "is_deleted")
+    list_select_related = ("stock",)
+    list_filter = (StockIdFilter, "is_deleted")
+    raw_id_fields = ("stock",)
+
+
+@admin.register(Portfolio)
+class PortfolioAdmin(LargeTableAdmin):
+    list_display = ("id", "user", "name", "risk", "is_deleted")
+    list_select_related = ("user",)
+    list_filter = (UserIdFilter, "risk", "is_deleted")
+    raw_id_fields = ("user",)
+
+
+@admin.register(PortfolioComponent)
+class PortfolioComponentAdmin(LargeTableAdmin):
+    list_display = ("id", "portfolio_id", "stock__symbol", "weight", "is_deleted")
+    list_select_related = ("stock",)
+    list_filter = (PortfolioIdFilter, "is_deleted")
+    raw_id_fields = ("portfolio", "stock")
+
+
+@admin.register(PortfolioVersion)
+class PortfolioVersionAdmin(LargeTableAdmin):
+    list_display = ("id", "portfolio_id", "valid_from", "valid_to", "is_deleted")
+    list_filter = (PortfolioIdFilter, "is_deleted")
+    raw_id_fields = ("portfolio",)
+
+
+@admin.register(Order)
+class OrderAdmin(ReadOnlyAdmin):
+    list_display = (
+        "id",
+        "user",
+        "asset_type",
+        "side",
+        "stock__symbol",
+        "portfolio_id",
+        "quantity",
+        "execution_price",
+        "execution_date",
+        "status",
+        "is_deleted",
+    )
+    list_select_related = ("user", "stock")
+    list_filter = (UserIdFilter, StockIdFilter, "status", "asset_type", "side", "is_deleted")
+    raw_id_fields = ("user", "stock", "portfolio")
+
+
+@admin.register(Position)
+class PositionAdmin(ReadOnlyAdmin):
+    list_display = ("id", "user", "stock__symbol", "quantity", "cost_basis", "realized_pnl", "last_sold_on")
+    list_select_related = ("user", "stock")
+    list_filter = (UserIdFilter, StockIdFilter)
+    raw_id_fields = ("user", "stock")
+
+
+@admin.register(TaxLot)
+class TaxLotAdmin(ReadOnlyAdmin):
+    list_display = ("id", "user", "stock__symbol", "order_id", "acquired_on", "quantity", "remaining", "unit_cost")
+    list_select_related = ("user", "stock")
+    list_filter = (UserIdFilter, StockIdFilter)
+    raw_id_fields = ("user", "stock", "order")
+
+
+@admin.register(LotDisposal)
+class LotDisposalAdmin(ReadOnlyAdmin):
+    list_display = ("id", "lot_id", "order_id", "quantity", "unit_price", "realized_pnl", "disposed_on")
+    list_filter = (OrderIdFilter,)
+    raw_id_fields = ("lot", "order")
+
+
+@admin.register(CashLedgerEntry)
+class CashLedgerEntryAdmin(ReadOnlyAdmin):
+    list_display = ("id", "user", "entry_type", "amount", "execution_date", "transaction_id", "order_id")
+    list_select_related = ("user",)
+    list_filter = (UserIdFilter, "entry_type", "is_deleted")
+    raw_id_fields = ("user", "transaction", "order")
+
+
+@admin.register(CashBalanceCheckpoint)
+class CashBalanceCheckpointAdmin(ReadOnlyAdmin):
+    list_display = ("id", "user", "last_entry_id", "balance", "created_at")
+    list_select_related = ("user",)
+    list_filter = (UserIdFilter,)
+    raw_id_fields = ("user",)
+
+
+@admin.register(ArchivedRecord)
+class ArchivedRecordAdmin(LargeTableAdmin):
+    list_display = ("id", "model", "object_id", "deleted_at", "archived_at")
+    # The (model, object_id) unique constraint serves both
+    search_fields = ("=model", "=object_id")
+
+
+@admin.register(IdempotencyKey)
+class IdempotencyKeyAdmin(LargeTableAdmin):
+    list_display = ("id", "scope", "key", "status_code", "created_at", "expires_at")
+    search_fields = ("=key",)
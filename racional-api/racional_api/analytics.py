@@ -0,0 +1,391 @@
+"""
+Vectorized return analytics over the StockPrice history.
+
+Prices are loaded once as a (days x stocks) matrix and every metric is
+computed with NumPy over whole columns, never row by row.
+"""
+from datetime import datetime, time
+
+import numpy as np
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Func, Q
+from django.db.models.functions import Trunc, TruncDate
+from django.utils import timezone
+
+from .models import Order, PortfolioVersion, StockPrice
+from .valuation import end_of_day
+
+
+def price_matrix(stock_ids, start=None, end=None, carry_in=False):
+    """
+    Daily closing prices of `stock_ids` between `start` and `end` (dates, inclusive).
+
+    Returns `(days, prices)`: a datetime64[D] array and a float matrix with one
+    column per stock id, in the given order. Days without a price carry the
+    previous one forward, days before the first price of a stock are NaN.
+    With `carry_in`, the same query also reads the last price of each stock
+    before `start`, as a row on its own (earlier) day.
+    """
+    stock_ids = list(stock_ids)
+    if not stock_ids:
+        return np.array([], dtype="datetime64[D]"), np.empty((0, 0))
+
+    prices = StockPrice.objects.filter(stock_id__in=stock_ids)
+    if start is not None:
+        since = timezone.make_aware(datetime.combine(start, time.min))
+        window = Q(date__gte=since)
+        if carry_in:
+            window |= Q(
+                pk__in=prices.filter(date__lt=since)
+                .order_by("stock_id", "-date")
+                .distinct("stock_id")
+                .values("pk")
+            )
+        prices = prices.filter(window)
+    if end is not None:
+        prices = prices.filter(date__lt=end_of_day(end))
+
+    # The day travels as a plain number and rows skip the ORM converters, so
+    # nothing is built per row
+    rows = fetch_rows(prices.order_by("date").values_list("stock_id", epoch(TruncDate("date")), "value"))
+    rows = np.array(rows, dtype=float).reshape(-1, 3)
+    if not len(rows):
+        return np.array([], dtype="datetime64[D]"), np.empty((0, len(stock_ids)))
+
+    days, day_index = np.unique(rows[:, 1] // 86400, return_inverse=True)
+    order = np.argsort(stock_ids)
+    columns = order[np.searchsorted(np.array(stock_ids)[order], rows[:, 0])]
+
+    matrix = np.full((len(days), len(stock_ids)), np.nan)
+    # Rows are sorted by date, so the last price of a day wins
+    matrix[day_index, columns] = rows[:, 2]
+    return days.astype("datetime64[D]"), forward_fill(matrix)
+
+
+def epoch(expression):
+    """Seconds since epoch of a truncated date or local timestamp, as a float."""
+    return Func(
+        expression,
+        template="EXTRACT(EPOCH FROM %(expressions)s)::float8",
+        output_field=FloatField(),
+    )
+
+
+def fetch_rows(queryset):
+    """Raw result tuples of a `values_list` queryset, without per row field conversion."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
+
+
+def fetch_columns(queryset, fields):
+    """
+    Columns of `queryset` as a dict of NumPy arrays, one per field.
+
+    Date fields become datetime64[D] arrays, everything else floats, with
+    NaN for NULL values.
+    """
+    rows = fetch_rows(queryset.values_list(*fields))
+    columns = list(zip(*rows)) or [()] * len(fields)
+    result = {}
+    for field, values in zip(fields, columns):
+        is_date = queryset.model._meta.get_field(field).get_internal_type() == "DateField"
+        result[field] = np.array(values, dtype="datetime64[D]" if is_date else float)
+    return result
+
+
+def to_rows(columns):
+    """Turn a dict of parallel arrays into a list of dicts, NaN becoming None."""
+    names = list(columns)
+    values = [
+        np.where(np.isnan(column), None, column).tolist() if column.dtype.kind == "f" else column.tolist()
+        for column in columns.values()
+    ]
+    return [dict(zip(names, row)) for row in zip(*values)]
+
+
+def forward_fill(matrix):
+    """Replace NaNs with the last value above them in the same column."""
+    if matrix.size == 0:
+        return matrix
+    rows = np.where(~np.isnan(matrix), np.arange(matrix.shape[0])[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return matrix[rows, np.arange(matrix.shape[1])]
+
+
+def daily_returns(prices):
+    """Simple returns between consecutive rows, 0 where a price is missing."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = prices[1:] / prices[:-1] - 1.0
+    returns[~np.isfinite(returns)] = 0.0
+    return returns
+
+
+def basket_returns(prices, weights):
+    """
+    Daily returns of a basket rebalanced to `weights` every day.
+
+    `weights` has one value per column, or one row per day (as built by
+    `weight_matrix`), in which case each return uses the weights held on the
+    day it starts from.
+    """
+    weights = np.asarray(weights, dtype=float)
+    returns = daily_returns(prices)
+    if weights.ndim == 1:
+        return returns @ weights
+    return np.einsum("ij,ij->i", returns, weights[:-1])
+
+
+def composition_versions(portfolio, start=None, end=None):
+    """
+    `(valid_from, valid_to, weights)` of the versions of a portfolio in effect
+    at some point between `start` and `end`, oldest first. Portfolios created
+    before versioning get their current components as one open ended version.
+    """
+    versions = PortfolioVersion.objects.filter(portfolio=portfolio)
+    if not versions.exists():
+        weights = {
+            str(stock_id): str(weight)
+            for stock_id, weight in portfolio.components.values_list("stock_id", "weight")
+        }
+        return [(None, None, weights)]
+    if start is not None:
+        versions = versions.filter(Q(valid_to__isnull=True) | Q(valid_to__gt=start))
+    if end is not None:
+        versions = versions.filter(valid_from__lte=end)
+    return list(versions.order_by("valid_from").values_list("valid_from", "valid_to", "weights"))
+
+
+def weight_matrix(versions, stock_ids, days):
+    """
+    Target weights on each of `days` (rows) for `stock_ids` (columns).
+
+    Every day is matched to the last version started on or before it with a
+    single `searchsorted` over the version starts, then the version's weights
+    row is gathered; days outside every version get zero weights.
+    """
+    column = {stock_id: index for index, stock_id in enumerate(stock_ids)}
+    # One row per version plus a zero row for days no version covers
+    table = np.zeros((len(versions) + 1, len(stock_ids)))
+    for row, (_, _, weights) in enumerate(versions):
+        for stock_id, weight in weights.items():
+            table[row, column[int(stock_id)]] = float(weight)
+
+    open_start, open_end = np.datetime64("0001-01-01"), np.datetime64("9999-12-31")
+    starts = np.array([start or open_start for start, _, _ in versions], dtype="datetime64[D]")
+    ends = np.array([end or open_end for _, end, _ in versions], dtype="datetime64[D]")
+
+    index = np.searchsorted(starts, days, side="right") - 1
+    covered = (index >= 0) & (days < ends[np.maximum(index, 0)])
+    return table[np.where(covered, index, len(versions))]
+
+
+def holdings_returns(days, prices, quantities):
+    """
+    Time weighted daily returns of actual holdings.
+
+    `quantities` has the same shape as `prices` and holds the units owned at
+    the end of each day. The value bought or sold on a day is a cash flow, so
+    it is removed from that day's value before comparing with the previous one.
+    """
+    values = np.nansum(quantities * prices, axis=1)
+    flows = np.nansum(np.diff(quantities, axis=0) * prices[1:], axis=1)
+    previous = values[:-1]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns = np.where(previous > 0, (values[1:] - flows) / previous - 1.0, 0.0)
+    returns[~np.isfinite(returns)] = 0.0
+    return returns
+
+
+def quantity_matrix(user_id, stock_ids, days):
+    """Units of each stock held by a user at the end of each of `days`."""
+    if len(days) == 0:
+        return np.zeros((0, len(stock_ids)))
+
+    orders = (
+        Order.objects.filter(
+            user_id=user_id,
+            asset_type=Order.ASSET_STOCK,
+            status=Order.EXECUTED,
+            stock_id__in=stock_ids,
+            execution_date__lte=days[-1].item(),
+        )
+        .exclude(quantity=None)
+        .values_list("stock_id", "side", "execution_date", "quantity")
+    )
+    return cumulative_quantities(list(orders), stock_ids, days)
+
+
+def cumulative_quantities(orders, stock_ids, days):
+    """
+    Units of each stock held at the end of each of `days`, from
+    `(stock_id, side, date, quantity)` order rows. Orders after the last day
+    are left out.
+    """
+    column = {stock_id: index for index, stock_id in enumerate(stock_ids)}
+    quantities = np.zeros((len(days), len(stock_ids)))
+    if not orders or len(days) == 0:
+        return quantities
+
+    order_stocks, sides, dates, amounts = zip(*orders)
+    signed = np.array(amounts, dtype=float) * np.where(np.array(sides) == Order.BUY, 1.0, -1.0)
+    # Orders before the first day land on it, so the history starts with them
+    day_index = np.searchsorted(days, np.array(dates, dtype="datetime64[D]"))
+    kept = day_index < len(days)
+    columns = np.array([column[s] for s in order_stocks])
+    np.add.at(quantities, (day_index[kept], columns[kept]), signed[kept])
+    return np.cumsum(quantities, axis=0)
+
+
+def rolling_mean_std(values, window):
+    """
+    Rolling mean and sample standard deviation over `window` values, from cumulative sums.
+
+    Positions with fewer than `window` values before them are NaN.
+    """
+    mean = np.full(len(values), np.nan)
+    std = np.full(len(values), np.nan)
+    if len(values) < window:
+        return mean, std
+
+    sums = np.cumsum(np.concatenate(([0.0], values)))
+    squares = np.cumsum(np.concatenate(([0.0], values * values)))
+    total = sums[window:] - sums[:-window]
+    total_squares = squares[window:] - squares[:-window]
+
+    mean[window - 1:] = total / window
+    variance = (total_squares - total * total / window) / (window - 1)
+    std[window - 1:] = np.sqrt(np.maximum(variance, 0.0))
+    return mean, std
+
+
+def daily_stats(closes, windows):
+    """
+    Return, log return and rolling mean/volatility for a series of daily closes.
+
+    The first close has no return. Returns a dict of arrays, all as long as `closes`.
+    """
+    closes = np.asarray(closes, dtype=float)
+    returns = np.full(len(closes), np.nan)
+    log_returns = np.full(len(closes), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        returns[1:] = closes[1:] / closes[:-1] - 1.0
+        log_returns[1:] = np.log(closes[1:] / closes[:-1])
+    returns[~np.isfinite(returns)] = np.nan
+    log_returns[~np.isfinite(log_returns)] = np.nan
+
+    stats = {"daily_return": returns, "log_return": log_returns}
+    for window in windows:
+        mean = np.full(len(closes), np.nan)
+        std = np.full(len(closes), np.nan)
+        mean[1:], std[1:] = rolling_mean_std(np.nan_to_num(returns[1:]), window)
+        stats[f"mean_{window}"] = mean
+        stats[f"volatility_{window}"] = std
+    return stats
+
+
+def price_history(stock_id, start=None, end=None, interval="day", max_points=None):
+    """
+    OHLC buckets of a stock's prices between `start` and `end` (dates, inclusive).
+
+    `interval` is the bucket size (day, week or month). When there are more
+    buckets than `max_points`, consecutive buckets are merged into at most
+    `max_points` so a long history ships a bounded number of points while
+    keeping its highs and lows. Returns a dict of parallel arrays (date, open,
+    high, low, close) ordered by date.
+    """
+    prices = StockPrice.objects.filter(stock_id=stock_id)
+    if start is not None:
+        prices = prices.filter(date__gte=timezone.make_aware(datetime.combine(start, time.min)))
+    if end is not None:
+        prices = prices.filter(date__lt=end_of_day(end))
+
+    rows = fetch_rows(prices.order_by("date").values_list(epoch(Trunc("date", interval)), "value"))
+    rows = np.array(rows, dtype=float).reshape(-1, 2)
+    if not len(rows):
+        return {
+            "date": np.array([], dtype="datetime64[D]"),
+            **{name: np.array([]) for name in ("open", "high", "low", "close")},
+        }
+
+    buckets, values = rows[:, 0], rows[:, 1]
+    starts = np.flatnonzero(np.concatenate(([True], buckets[1:] != buckets[:-1])))
+    if max_points and len(starts) > max_points:
+        starts = starts[:: -(-len(starts) // max_points)]
+    ends = np.append(starts[1:], len(values)) - 1
+
+    return {
+        "date": (buckets[starts] // 86400).astype("datetime64[D]"),
+        "open": values[starts],
+        "high": np.maximum.reduceat(values, starts),
+        "low": np.minimum.reduceat(values, starts),
+        "close": values[ends],
+    }
+
+
+def performance(returns):
+    """Time weighted return, annualized volatility, max drawdown and Sharpe ratio of daily returns."""
+    periods = settings.ANALYTICS_PERIODS_PER_YEAR
+    if len(returns) == 0:
+        return {
+            "time_weighted_return": 0.0,
+            "annualized_volatility": 0.0,
+            "max_drawdown": 0.0,
+            "sharpe_ratio": None,
+        }
+
+    wealth = np.cumprod(1.0 + returns)
+    peaks = np.maximum.accumulate(np.concatenate(([1.0], wealth)))[1:]
+    volatility = float(np.std(returns, ddof=1) * np.sqrt(periods)) if len(returns) > 1 else 0.0
+    annual_return = float(np.mean(returns) * periods)
+
+    return {
+        "time_weighted_return": round(float(wealth[-1] - 1.0), 6),
+        "annualized_volatility": round(volatility, 6),
+        "max_drawdown": round(float(np.min(wealth / peaks - 1.0)), 6),
+        "sharpe_ratio": (
+            round((annual_return - settings.ANALYTICS_RISK_FREE_RATE) / volatility, 6)
+            if volatility > 0
+            else None
+        ),
+    }
+
+
+def portfolio_analytics(portfolio, start=None, end=None):
+    """
+    Performance of a portfolio's weighted basket and of its owner's actual
+    holdings. The basket follows the composition in effect on each day.
+    """
+    versions = composition_versions(portfolio, start, end)
+    held = (
+        Order.objects.filter(
+            user_id=portfolio.user_id,
+            asset_type=Order.ASSET_STOCK,
+            status=Order.EXECUTED,
+            stock__isnull=False,
+        )
+        .order_by()
+        .values_list("stock_id", flat=True)
+        .distinct()
+    )
+
+    basket_ids = sorted({int(stock_id) for _, _, weights in versions for stock_id in weights})
+    stock_ids = basket_ids + sorted(set(held) - set(basket_ids))
+    days, prices = price_matrix(stock_ids, start, end)
+    weights = weight_matrix(versions, stock_ids, days)
+
+    quantities = quantity_matrix(portfolio.user_id, stock_ids, days)
+    holds_anything = bool(quantities.size and np.any(quantities > 0))
+
+    return {
+        "portfolio_id": portfolio.pk,
+        "start": days[0].item() if len(days) else start,
+        "end": days[-1].item() if len(days) else end,
+        "days": len(days),
+        "basket": performance(basket_returns(prices, weights)),
+        "holdings": (
+            performance(holdings_returns(days, prices, quantities)) if holds_anything else None
+        ),
+    }
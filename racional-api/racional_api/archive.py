@@ -0,0 +1,107 @@
+"""
+Archival of soft deleted rows.
+
+Rows that were soft deleted long enough ago are copied into ArchivedRecord
+and removed from their table in small batches, each in its own short
+transaction, so the hot tables and their indexes only hold live data.
+"""
+from django.apps import apps
+from django.core import serializers
+from django.db import models, transaction
+from django.db.models import Exists, OuterRef
+
+from .models import ArchivedRecord, SoftDeleteModel
+
+
+def archivable_models():
+    """Soft deletable models of the app, each one before the models it points to."""
+    candidates = [
+        model
+        for model in apps.get_app_config("racional_api").get_models()
+        if issubclass(model, SoftDeleteModel)
+    ]
+    ordered = []
+    pending = list(candidates)
+    while pending:
+        ready = [
+            model
+            for model in pending
+            if not any(
+                rel.related_model in pending and rel.related_model is not model
+                for rel in model._meta.related_objects
+            )
+        ] or pending
+        ordered.extend(ready)
+        pending = [model for model in pending if model not in ready]
+    return ordered
+
+
+def blocking_relations(model):
+    """Relations whose rows keep a `model` row from being removed (PROTECT or CASCADE)."""
+    return [
+        rel
+        for rel in model._meta.related_objects
+        if rel.on_delete not in (models.SET_NULL, models.SET_DEFAULT, models.DO_NOTHING)
+    ]
+
+
+def archivable(model, cutoff):
+    """Rows of `model` soft deleted before `cutoff` that no other row points to."""
+    rows = model.all_objects.filter(is_deleted=True, updated_at__lt=cutoff)
+    for rel in blocking_relations(model):
+        referenced = rel.related_model._base_manager.filter(**{rel.field.name: OuterRef("pk")})
+        rows = rows.filter(~Exists(referenced))
+    return rows
+
+
+def archive_batch(model, cutoff, batch_size):
+    """
+    Move up to `batch_size` archivable rows of `model` into ArchivedRecord.
+
+    Rows locked by another transaction are skipped, and the lock taken on the
+    others keeps new rows from pointing to them until they are gone.
+    Returns the number of rows moved.
+    """
+    with transaction.atomic():
+        rows = list(
+            archivable(model, cutoff).order_by("pk").select_for_update(skip_locked=True)[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        label = model._meta.label_lower
+        ArchivedRecord.objects.bulk_create(
+            [
+                ArchivedRecord(
+                    model=label,
+                    object_id=row.pk,
+                    payload=data["fields"],
+                    deleted_at=row.updated_at,
+                )
+                for row, data in zip(rows, serializers.serialize("python", rows))
+            ]
+        )
+        # A queryset delete removes the rows for real (Model.delete only flags
+        # them) and nulls SET_NULL references such as ledger entries
+        model.all_objects.filter(pk__in=[row.pk for row in rows]).delete()
+    return len(rows)
+
+
+def restore(records):
+    """
+    Put archived rows back in their tables with their original ids and drop
+    their archive copies. Rows come back as they were archived, soft deleted.
+    """
+    position = {model._meta.label_lower: index for index, model in enumerate(archivable_models())}
+    # Rows that others point to go first
+    records = sorted(records, key=lambda r: (-position.get(r.model, 0), r.object_id))
+
+    with transaction.atomic():
+        objects = serializers.deserialize(
+            "python",
+            [{"model": r.model, "pk": r.object_id, "fields": r.payload} for r in records],
+        )
+        for obj in objects:
+            obj.save()
+        ArchivedRecord.objects.filter(pk__in=[r.pk for r in records]).delete()
+    return len(records)
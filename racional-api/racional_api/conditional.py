@@ -0,0 +1,94 @@
+"""
+Conditional GET (ETag / Last-Modified) for per-user read endpoints.
+
+The validator is not computed from the response: it is one query on the
+user's row whose subqueries read, each from an index, what the response
+depends on (newest ledger entry, newest order or transaction change, newest
+price row ingested for the stocks the user holds). An unchanged response
+costs that query and a 304.
+"""
+import hashlib
+
+from django.db.models import F, OuterRef, Subquery
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+from .models import CashLedgerEntry, Order, Position, StockPrice, Transaction, User
+
+
+def version_subqueries():
+    """Every value a view can be validated on, as subqueries on the user's row."""
+    ledger = CashLedgerEntry.objects.filter(user_id=OuterRef("pk")).order_by("-id")
+    # Newest row by id, not by date: a backfilled or corrected price is a new row too
+    newest_price = StockPrice.all_objects.filter(stock_id=OuterRef("stock_id")).order_by("-id")
+    held = Position.objects.filter(user_id=OuterRef("pk"))
+
+    def newest_held_price(field):
+        # One index probe per position for its stock's newest price row
+        return Subquery(
+            held.annotate(newest=Subquery(newest_price.values(field)[:1]))
+            .order_by(F("newest").desc(nulls_last=True))
+            .values("newest")[:1]
+        )
+
+    return {
+        "ledger": Subquery(ledger.values("id")[:1]),
+        "ledger_at": Subquery(ledger.values("created_at")[:1]),
+        # Every row, soft deleting one also changes what the user sees
+        "orders_at": Subquery(
+            Order.all_objects.filter(user_id=OuterRef("pk")).order_by("-updated_at").values("updated_at")[:1]
+        ),
+        "transactions_at": Subquery(
+            Transaction.all_objects.filter(user_id=OuterRef("pk")).order_by("-updated_at").values("updated_at")[:1]
+        ),
+        "prices": newest_held_price("id"),
+        "prices_at": newest_held_price("created_at"),
+    }
+
+
+def user_versions(user_id, names):
+    """Values `names` of `version_subqueries` for a user, in one query. None if the user does not exist."""
+    subqueries = version_subqueries()
+    return (
+        User.objects.filter(pk=user_id)
+        .values("pk", **{name: subqueries[name] for name in names})
+        .first()
+    )
+
+
+class ConditionalGetMixin:
+    """
+    Answer GET with 304 when `If-None-Match` / `If-Modified-Since` still match.
+
+    `versions` names the values of `version_subqueries` the response depends
+    on. The ETag also covers the view, the query string and the Accept header.
+    The row read is left in `self.user_versions` (None for unknown users, who
+    fall through to the view), so the view does not look the user up again.
+    """
+    versions = ()
+    user_versions = None
+
+    def dispatch(self, request, *args, **kwargs):
+        if request.method not in ("GET", "HEAD"):
+            return super().dispatch(request, *args, **kwargs)
+        found = self.user_versions = user_versions(kwargs["user_id"], self.versions)
+        if found is None:
+            return super().dispatch(request, *args, **kwargs)
+
+        key = repr((type(self).__name__, request.get_full_path(), request.headers.get("Accept"), found))
+        etag = quote_etag(hashlib.sha1(key.encode()).hexdigest())
+        changed = [value for name, value in found.items() if name.endswith("_at") and value is not None]
+        last_modified = int(max(changed).timestamp()) if changed else None
+
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            response = super().dispatch(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+
+        response["ETag"] = etag
+        if last_modified is not None:
+            response["Last-Modified"] = http_date(last_modified)
+        # Clients may keep the response but must revalidate before using it
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
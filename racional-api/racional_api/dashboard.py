@@ -0,0 +1,200 @@
+"""
+User dashboard: portfolio total, last movements and value evolution in one response.
+
+The sections share their inputs instead of each fetching its own: the user
+is read once, the user's executed stock orders once (current holdings and the
+holdings of every day come from the same rows), the cash ledger once (grouped
+by day, its sum is the current cash) and the prices of every held stock over
+the range in one query, whose last day also values the total.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.db.models import Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import CashLedgerEntry, Order, Transaction
+from .valuation import compute_portfolio_total, summarize_total
+
+SECTIONS = ("total", "movements", "evolution")
+
+
+def last_movements(user_id, limit=10):
+    """The `limit` newest deposits, withdraws and orders of a user, newest first."""
+    movements = []
+
+    # 1) Transactions: DEPOSIT / WITHDRAW
+    transactions = Transaction.objects.filter(user_id=user_id).order_by("-created_at")[:limit]
+    for t in transactions:
+        movements.append(
+            {
+                "type": "TRANSACTION",
+                "subtype": t.transaction_type,
+                "asset_type": None,
+                "symbol": None,
+                "portfolio_id": None,
+                "amount": t.amount,
+                "quantity": None,
+                "execution_price": None,
+                "value": t.amount,
+                "date": t.execution_date or t.created_at.date(),
+                "created_at": t.created_at,
+            }
+        )
+
+    # 2) Orders: BUY / SELL of STOCK / PORTFOLIO
+    orders = (
+        Order.objects.filter(user_id=user_id)
+        .select_related("stock", "portfolio")
+        .order_by("-created_at")[:limit]
+    )
+    for o in orders:
+        symbol = o.stock.symbol if (o.asset_type == Order.ASSET_STOCK and o.stock) else None
+        portfolio_id = o.portfolio.pk if (o.asset_type == Order.ASSET_PORTFOLIO and o.portfolio) else None
+
+        if o.quantity is not None and o.execution_price is not None:
+            value = (o.quantity * o.execution_price).quantize(Decimal("0.01"))
+        else:
+            value = None
+
+        movements.append(
+            {
+                "type": "ORDER",
+                "subtype": o.side,
+                "asset_type": o.asset_type,
+                "symbol": symbol,
+                "portfolio_id": portfolio_id,
+                "amount": None,
+                "quantity": o.quantity,
+                "execution_price": o.execution_price,
+                "value": value,
+                "date": o.execution_date or o.created_at.date(),
+                "created_at": o.created_at,
+            }
+        )
+
+    # 3) Each list holds the newest `limit` of its kind, merge them
+    return sorted(movements, key=lambda m: m["created_at"], reverse=True)[:limit]
+
+
+def downsample(count, points):
+    """Indexes of at most `points` evenly spaced items out of `count`, first and last included."""
+    import numpy as np
+
+    if count <= points:
+        return np.arange(count)
+    return np.unique(np.linspace(0, count - 1, points).round().astype(int))
+
+
+def user_dashboard(user, include=SECTIONS, limit=10, start=None, end=None, points=None):
+    """
+    Dashboard of `user` (a dict with its id and name) with the sections in `include`.
+
+    `evolution` is the daily value (cash plus stocks) between `start` and
+    `end`, by default the last DASHBOARD_EVOLUTION_DAYS days, downsampled to
+    at most `points` points.
+    """
+    user_id = user["id"]
+    data = {"user": user}
+    if "movements" in include:
+        data["movements"] = last_movements(user_id, limit)
+    if "evolution" not in include:
+        if "total" in include:
+            data["total"] = compute_portfolio_total(user_id)
+        return data
+
+    # NumPy and the analytics helpers are only loaded once an evolution is asked for
+    import numpy as np
+
+    from .analytics import cumulative_quantities, price_matrix
+
+    today = timezone.localdate()
+    end = end or today
+    start = start or end - timedelta(days=settings.DASHBOARD_EVOLUTION_DAYS - 1)
+    points = points or settings.DASHBOARD_EVOLUTION_POINTS
+
+    orders = list(
+        Order.objects.filter(
+            user_id=user_id,
+            asset_type=Order.ASSET_STOCK,
+            status=Order.EXECUTED,
+            stock__isnull=False,
+        )
+        .exclude(quantity=None)
+        .order_by()
+        .values_list(
+            "stock_id",
+            "stock__symbol",
+            "side",
+            Coalesce("execution_date", TruncDate("created_at")),
+            "quantity",
+        )
+    )
+    ledger = list(
+        CashLedgerEntry.objects.filter(user_id=user_id)
+        .order_by()
+        .values("execution_date")
+        .annotate(total=Sum("amount"))
+        .order_by("execution_date")
+        .values_list("execution_date", "total")
+    )
+    stock_ids = sorted({row[0] for row in orders})
+    symbols = {row[0]: row[1] for row in orders}
+    days, prices = price_matrix(stock_ids, start, end, carry_in=True)
+
+    calendar = np.arange(np.datetime64(start), np.datetime64(end) + 1)
+    # Price of each stock in effect on every calendar day
+    index = np.searchsorted(days, calendar, side="right") - 1
+    daily_prices = np.full((len(calendar), len(stock_ids)), np.nan)
+    daily_prices[index >= 0] = prices[index[index >= 0]]
+    quantities = cumulative_quantities(
+        [(stock_id, side, day, quantity) for stock_id, _, side, day, quantity in orders],
+        stock_ids,
+        calendar,
+    )
+
+    # Cash at the end of every calendar day, entries before `start` included
+    cash_days = np.array([day for day, _ in ledger], dtype="datetime64[D]")
+    cash_totals = np.cumsum([float(total) for _, total in ledger])
+    index = np.searchsorted(cash_days, calendar, side="right") - 1
+    cash = np.zeros(len(calendar))
+    cash[index >= 0] = cash_totals[index[index >= 0]]
+    stocks = np.nansum(quantities * daily_prices, axis=1)
+
+    kept = downsample(len(calendar), points)
+    data["evolution"] = [
+        {
+            "date": calendar[i].item(),
+            "cash": round(float(cash[i]), 2),
+            "stocks_value": round(float(stocks[i]), 2),
+            "total": round(float(cash[i] + stocks[i]), 2),
+        }
+        for i in kept
+    ]
+
+    if "total" in include:
+        if end < today:
+            data["total"] = compute_portfolio_total(user_id)
+        else:
+            held = {}
+            for stock_id, _, side, _, quantity in orders:
+                held[stock_id] = held.get(stock_id, Decimal("0")) + (quantity if side == Order.BUY else -quantity)
+            holdings = sorted(
+                (
+                    {"stock_id": stock_id, "symbol": symbols[stock_id], "quantity": quantity}
+                    for stock_id, quantity in held.items()
+                    if quantity > 0
+                ),
+                key=lambda h: h["symbol"],
+            )
+            # The evolution's last day carries the latest price of every stock
+            latest = {
+                stock_id: Decimal(str(price))
+                for stock_id, price in zip(stock_ids, daily_prices[-1])
+                if not np.isnan(price)
+            }
+            balance = sum((total for _, total in ledger), Decimal("0.00"))
+            data["total"] = summarize_total(user_id, None, balance, holdings, latest)
+    return data
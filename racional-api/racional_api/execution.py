@@ -0,0 +1,217 @@
+"""
+Execution of stock orders.
+
+With ORDER_EXECUTION_MODE = "queued", StockOrderSerializer stores orders as
+PENDING and the `run_order_workers` processes execute them here. Pending rows
+are claimed with SELECT ... FOR UPDATE SKIP LOCKED, so any number of workers
+share the queue without a broker and no order is executed twice.
+"""
+import logging
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.db.models import Count, Min, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from .models import CashLedgerEntry, Order, Position, StockPrice, User, to_cents
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def user_lock(user_id):
+    """
+    Run the block in a transaction holding the advisory lock of `user_id`.
+
+    Orders, investments and cash movements of one user run one at a time,
+    while different users never wait on each other. Balances must be read
+    inside the block. The lock is released when the transaction ends.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            # The user id is the lock key, no other advisory locks are used
+            cursor.execute("SELECT pg_advisory_xact_lock(%s)", [user_id])
+        yield
+
+
+def try_user_locks(user_ids):
+    """Take the advisory locks of the users that are free, without waiting. Returns their ids."""
+    if not user_ids:
+        return set()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT id FROM unnest(%s::bigint[]) AS id WHERE pg_try_advisory_xact_lock(id)",
+            [sorted(user_ids)],
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def price_on(stock_id, day):
+    """Last price of a stock at or before `day`, as a Decimal, or None."""
+    value = (
+        StockPrice.objects.filter(stock_id=stock_id, date__lte=day)
+        .order_by("-date")
+        .values_list("value", flat=True)
+        .first()
+    )
+    return None if value is None else Decimal(str(value))
+
+
+def net_quantity(user_id, stock_id, day):
+    """Units of a stock a user holds from executed orders up to `day`."""
+    totals = Order.objects.filter(
+        user_id=user_id,
+        stock_id=stock_id,
+        status=Order.EXECUTED,
+        execution_date__lte=day,
+    ).aggregate(
+        total_bought=Sum("quantity", filter=Q(side=Order.BUY)),
+        total_sold=Sum("quantity", filter=Q(side=Order.SELL)),
+    )
+    return (totals["total_bought"] or 0) - (totals["total_sold"] or 0)
+
+
+def execute_pending(batch_size=100, max_users=10):
+    """
+    Claim up to `batch_size` pending orders and execute them.
+
+    Work is claimed per user: up to `max_users` users with pending orders are
+    locked with SKIP LOCKED, oldest order first, along with their `user_lock`
+    when it is free, and their pending orders run
+    in arrival order. Workers never wait on each other and a user's orders
+    are never reordered across workers. Prices are looked up once per stock
+    and day, and orders, ledger entries and balances are written in bulk.
+    Orders that cannot run, or raise while running, are marked FAILED with
+    the reason.
+    Returns `(executed, failed)`.
+    """
+    pending = Order.objects.filter(status=Order.PENDING)
+    with transaction.atomic():
+        users = {
+            user.pk: user
+            for user in User.all_objects.filter(pk__in=pending.values("user_id"))
+            .annotate(
+                first_pending=Subquery(
+                    pending.filter(user_id=OuterRef("pk")).order_by("id").values("id")[:1]
+                )
+            )
+            .order_by("first_pending")
+            .select_for_update(skip_locked=True, of=("self",))[:max_users]
+        }
+        # Users with a request in flight (see `user_lock`) are left for the next batch
+        free = try_user_locks(list(users))
+        users = {user_id: user for user_id, user in users.items() if user_id in free}
+        orders = list(pending.filter(user_id__in=users).order_by("id")[:batch_size])
+        if not orders:
+            return 0, 0
+
+        prices = {}
+        money = {user_id: user.money for user_id, user in users.items()}
+        # Orders executed in this batch, not written yet, by (user, stock)
+        fills = defaultdict(list)
+        now = timezone.now()
+        for order in orders:
+            if users[order.user_id].is_deleted:
+                reason = "User not found or deleted."
+            else:
+                key = (order.stock_id, order.execution_date)
+                try:
+                    # A savepoint, a database error must not abort the batch
+                    with transaction.atomic():
+                        if key not in prices:
+                            prices[key] = price_on(*key)
+                        reason, money[order.user_id] = settle(
+                            order, prices[key], money[order.user_id], fills[order.user_id, order.stock_id]
+                        )
+                except Exception as exc:
+                    # One bad row must not block the queue of every other user
+                    logger.exception("Order %s could not be executed", order.pk)
+                    reason = f"Execution error: {exc}"
+
+            if reason:
+                order.status = Order.FAILED
+                order.failure_reason = reason[:255]
+            else:
+                order.status = Order.EXECUTED
+                order.execution_price = prices[key]
+                order.executed_at = now
+                fills[order.user_id, order.stock_id].append(order)
+
+        # Orders sharing a price or a failure reason are written with one UPDATE
+        outcomes = defaultdict(list)
+        for order in orders:
+            outcomes[order.status, order.execution_price, order.failure_reason].append(order.pk)
+        for (state, price, reason), ids in outcomes.items():
+            Order.objects.filter(pk__in=ids).update(
+                status=state,
+                execution_price=price,
+                executed_at=now if state == Order.EXECUTED else None,
+                failure_reason=reason,
+                updated_at=now,
+            )
+        executed = [order for order in orders if order.status == Order.EXECUTED]
+        CashLedgerEntry.record_many(CashLedgerEntry.for_order(order) for order in executed)
+        Position.apply_orders(executed)
+
+        changed = []
+        for user_id, user in users.items():
+            if money[user_id] != user.money:
+                user.money = money[user_id]
+                user.updated_at = now
+                changed.append(user)
+        User.objects.bulk_update(changed, ["money", "updated_at"])
+    return len(executed), len(orders) - len(executed)
+
+
+def settle(order, price, money, fills=()):
+    """
+    Check one order against the user's cash or holdings, counting `fills`
+    (orders of the same user and stock executed but not saved yet).
+    Returns `(failure reason, new cash)`.
+    """
+    if price is None:
+        return "No price available for the execution date.", money
+
+    cost = to_cents(price * order.quantity)
+    if order.side == Order.BUY:
+        if money < cost:
+            return "Insufficient funds for this purchase.", money
+        return None, money - cost
+
+    available = net_quantity(order.user_id, order.stock_id, order.execution_date) + sum(
+        fill.quantity if fill.side == Order.BUY else -fill.quantity
+        for fill in fills
+        if fill.execution_date <= order.execution_date
+    )
+    if available < order.quantity:
+        return f"Insufficient stock quantity to sell. Amount of stock available: {available}", money
+    return None, money + cost
+
+
+def queue_stats(window_seconds=60):
+    """Queue depth, age of the oldest pending order and recent execution throughput."""
+    now = timezone.now()
+    pending = Order.objects.filter(status=Order.PENDING).aggregate(
+        count=Count("id"), oldest=Min("created_at")
+    )
+    recent = Order.objects.filter(
+        executed_at__gte=now - timedelta(seconds=window_seconds)
+    ).aggregate(executed=Count("id"))
+    failed = Order.objects.filter(
+        status=Order.FAILED,
+        updated_at__gte=now - timedelta(seconds=window_seconds),
+    ).count()
+
+    return {
+        "pending": pending["count"],
+        "oldest_pending_seconds": (
+            (now - pending["oldest"]).total_seconds() if pending["oldest"] else None
+        ),
+        "window_seconds": window_seconds,
+        "executed": recent["executed"],
+        "failed": failed,
+        "executed_per_second": round(recent["executed"] / window_seconds, 3),
+    }
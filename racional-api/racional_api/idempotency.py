@@ -0,0 +1,115 @@
+"""
+`Idempotency-Key` support for create endpoints that move money.
+
+The key row is inserted in the same database transaction as the work it
+guards. A concurrent retry with the same key waits on the unique index until
+the first request commits and then replays its response; if the first
+request fails, its key row is rolled back with everything else and the retry
+runs normally.
+"""
+import hashlib
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+IDEMPOTENCY_HEADER = "Idempotency-Key"
+
+IDEMPOTENCY_KEY_PARAMETER = OpenApiParameter(
+    IDEMPOTENCY_HEADER,
+    OpenApiTypes.STR,
+    location=OpenApiParameter.HEADER,
+    description=(
+        "Clave única por operación. Si se repite la misma solicitud con la misma clave, "
+        "se devuelve la respuesta original sin volver a ejecutarla."
+    ),
+)
+
+
+def request_fingerprint(request):
+    body = json.dumps(request.data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method} {request.path}\n{body}".encode()).hexdigest()
+
+
+class IdempotentCreateMixin:
+    """
+    Make POST idempotent when the request carries an `Idempotency-Key` header.
+
+    Only successful responses are stored; requests without the header behave
+    as before.
+    """
+    idempotency_scope = None
+
+    def post(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if key is None:
+            return super().post(request, *args, **kwargs)
+        if not key or len(key) > IdempotencyKey._meta.get_field("key").max_length:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} must have between 1 and 255 characters."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        scope = self.idempotency_scope or type(self).__name__
+        fingerprint = request_fingerprint(request)
+
+        with transaction.atomic():
+            stored = self.claim_key(scope, key, fingerprint)
+            if stored is not None:
+                return self.replay(stored, fingerprint)
+
+            response = super().post(request, *args, **kwargs)
+            if not status.is_success(response.status_code):
+                # Nothing was done, free the key for a corrected retry
+                transaction.set_rollback(True)
+                return response
+
+            IdempotencyKey.objects.filter(scope=scope, key=key).update(
+                status_code=response.status_code,
+                response_body=response.data,
+            )
+        return response
+
+    def claim_key(self, scope, key, fingerprint):
+        """Insert the key, or return the live row already stored for it."""
+        now = timezone.now()
+        expires_at = now + timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    scope=scope, key=key, fingerprint=fingerprint, expires_at=expires_at
+                )
+                return None
+        except IntegrityError:
+            pass
+
+        stored = IdempotencyKey.objects.select_for_update().get(scope=scope, key=key)
+        if stored.expires_at > now:
+            return stored
+        # Expired but not purged yet: reuse the row for this request
+        stored.fingerprint = fingerprint
+        stored.status_code = None
+        stored.response_body = None
+        stored.expires_at = expires_at
+        stored.save()
+        return None
+
+    def replay(self, stored, fingerprint):
+        if stored.fingerprint != fingerprint:
+            return Response(
+                {"detail": f"{IDEMPOTENCY_HEADER} was already used with a different request."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            )
+        return Response(
+            stored.response_body,
+            status=stored.status_code,
+            headers={"Idempotent-Replayed": "true"},
+        )
@@ -0,0 +1,66 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from racional_api.archive import archivable_models, archive_batch
+
+
+class Command(BaseCommand):
+    help = (
+        "Move rows soft deleted more than --days ago into ArchivedRecord, in batches. "
+        "Rows still referenced by other rows are left in place."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=settings.ARCHIVE_RETENTION_DAYS,
+            help="Retention window, defaults to ARCHIVE_RETENTION_DAYS.",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--model",
+            action="append",
+            help="Only archive this model (e.g. `order`), can be repeated.",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        targets = archivable_models()
+        if options["model"]:
+            names = {name.lower() for name in options["model"]}
+            unknown = names - {model._meta.model_name for model in targets}
+            if unknown:
+                raise CommandError(f"Unknown model(s): {', '.join(sorted(unknown))}")
+            targets = [model for model in targets if model._meta.model_name in names]
+
+        start = time.perf_counter()
+        total = 0
+        for model in targets:
+            model_start = time.perf_counter()
+            moved = batches = 0
+            while True:
+                count = archive_batch(model, cutoff, options["batch_size"])
+                if count:
+                    moved += count
+                    batches += 1
+                if count < options["batch_size"]:
+                    break
+
+            elapsed = time.perf_counter() - model_start
+            total += moved
+            if moved:
+                self.stdout.write(
+                    f"{model._meta.model_name}: {moved} rows in {batches} batches, "
+                    f"{elapsed:.2f}s ({moved / elapsed:.0f} rows/s)"
+                )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Archived {total} rows deleted before {cutoff:%Y-%m-%d} "
+                f"in {time.perf_counter() - start:.2f}s"
+            )
+        )
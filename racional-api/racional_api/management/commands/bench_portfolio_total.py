@@ -0,0 +1,89 @@
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from racional_api.models import CashLedgerEntry, Order, Stock, StockPrice, User
+from racional_api.views import UserPortfolioTotalView
+
+
+class Command(BaseCommand):
+    help = (
+        "Time GET /users/<id>/portfolio/total/ for users with a growing number of orders. "
+        "Data is created inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", type=int, nargs="+", default=[10, 10_000, 1_000_000])
+        parser.add_argument("--stocks", type=int, default=10)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=50_000)
+
+    def handle(self, *args, **options):
+        view = UserPortfolioTotalView.as_view()
+        factory = APIRequestFactory()
+
+        for size in options["sizes"]:
+            with transaction.atomic():
+                user = self.seed(size, options["stocks"], options["batch_size"])
+
+                request = factory.get(f"/api/users/{user.pk}/portfolio/total/")
+                timings = []
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    response = view(request, user_id=user.pk)
+                    response.render()
+                    timings.append((time.perf_counter() - start) * 1000)
+
+                self.stdout.write(
+                    f"{size:>10} orders: median {statistics.median(timings):8.2f} ms, "
+                    f"min {min(timings):8.2f} ms, positions {len(response.data['positions'])}"
+                )
+                transaction.set_rollback(True)
+
+    def seed(self, size, stock_count, batch_size):
+        user = User.objects.create(
+            first_name="Bench",
+            last_name="User",
+            phone_number="000",
+            email=f"bench-{time.time_ns()}@example.com",
+        )
+        now = timezone.now()
+        stocks = [
+            Stock.objects.create(symbol=f"BENCH{i}", name=f"Bench {i}") for i in range(stock_count)
+        ]
+        StockPrice.objects.bulk_create(
+            [StockPrice(stock=s, value=100.0, date=now) for s in stocks]
+        )
+
+        # bulk_create skips Order.save, so the cash side is one ledger entry
+        CashLedgerEntry.record(
+            CashLedgerEntry(
+                user=user,
+                entry_type=CashLedgerEntry.DEPOSIT,
+                amount=Decimal("1000000.00"),
+                execution_date=date.today(),
+            )
+        )
+
+        start_date = date.today() - timedelta(days=3650)
+        for offset in range(0, size, batch_size):
+            Order.objects.bulk_create(
+                [
+                    Order(
+                        user=user,
+                        asset_type=Order.ASSET_STOCK,
+                        side=Order.SELL if i % 3 == 2 else Order.BUY,
+                        stock=stocks[i % stock_count],
+                        quantity=Decimal("1.0000"),
+                        execution_price=Decimal("100.0000"),
+                        execution_date=start_date + timedelta(days=i % 3650),
+                    )
+                    for i in range(offset, min(size, offset + batch_size))
+                ]
+            )
+        return user
@@ -0,0 +1,110 @@
+import statistics
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from racional_api.models import Order, Stock, Transaction, User
+from racional_api.renderers import FastJSONRenderer
+from racional_api.views import TransactionListView, UserLastMovementsView
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rendering time of DRF's JSONRenderer and FastJSONRenderer on the movements and "
+        "transaction list endpoints, and bytes on the wire with and without gzip. "
+        "Data is created inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+        rows = options["rows"]
+
+        with transaction.atomic():
+            user = self.seed(rows, options["batch_size"])
+            cases = [
+                (
+                    "movements",
+                    lambda: UserLastMovementsView.as_view()(
+                        factory.get(f"/api/users/{user.pk}/movements/", {"limit": rows}), user_id=user.pk
+                    ),
+                ),
+                (
+                    "transactions",
+                    lambda: TransactionListView.as_view()(
+                        factory.get(f"/api/users/{user.pk}/transactions/"), user_id=user.pk
+                    ),
+                ),
+            ]
+
+            for name, view in cases:
+                response, serialize_ms = self.time(view, options["repeat"])
+                data = response.data
+                body, drf_ms = self.time(lambda: JSONRenderer().render(data), options["repeat"])
+                fast_body, fast_ms = self.time(lambda: FastJSONRenderer().render(data), options["repeat"])
+                if fast_body != body:
+                    self.stderr.write(f"{name}: FastJSONRenderer output differs from JSONRenderer")
+                compressed, gzip_ms = self.time(lambda: compress_string(body), options["repeat"])
+                self.stdout.write(
+                    f"{name:>12}: {len(data):>7} rows | view {serialize_ms:8.1f} ms | "
+                    f"render json {drf_ms:7.1f} ms, orjson {fast_ms:6.1f} ms (x{drf_ms / fast_ms:.1f}) | "
+                    f"{len(body) / 1024:8.0f} KiB, gzip {len(compressed) / 1024:6.0f} KiB "
+                    f"(x{len(body) / len(compressed):.1f}, {gzip_ms:.1f} ms)"
+                )
+            transaction.set_rollback(True)
+
+    def time(self, func, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            result = func()
+            timings.append((time.perf_counter() - start) * 1000)
+        return result, statistics.median(timings)
+
+    def seed(self, size, batch_size):
+        user = User.objects.create(
+            first_name="Bench",
+            last_name="Renderers",
+            phone_number="000",
+            email=f"bench-renderers-{time.time_ns()}@example.com",
+        )
+        stock = Stock.objects.create(symbol="RENDER", name="Renderer bench")
+        # Half of the movements are transactions and half orders
+        Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    user=user,
+                    transaction_type=Transaction.DEPOSIT,
+                    amount=Decimal("10.00") + i,
+                    execution_date=date.today(),
+                )
+                for i in range(size)
+            ],
+            batch_size=batch_size,
+        )
+        Order.objects.bulk_create(
+            [
+                Order(
+                    user=user,
+                    asset_type=Order.ASSET_STOCK,
+                    stock=stock,
+                    side=Order.BUY,
+                    quantity=Decimal("1.5000"),
+                    execution_price=Decimal("12.3456"),
+                    execution_date=date.today(),
+                    status=Order.EXECUTED,
+                )
+                for _ in range(size // 2)
+            ],
+            batch_size=batch_size,
+        )
+        return user
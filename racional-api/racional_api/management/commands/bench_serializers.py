@@ -0,0 +1,128 @@
+import statistics
+import time
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+from racional_api.models import Portfolio, PortfolioComponent, Stock, Transaction, User
+from racional_api.serializers import DepositSerializer, PortfolioCreateSerializer, UserSerializer
+from racional_api.views import PortfolioListView, TransactionListView, UserListCreateView
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/second of the user, transaction and portfolio list endpoints "
+        "against the ModelSerializer path they used before. "
+        "Data is created inside a transaction that is rolled back at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=10_000)
+        parser.add_argument("--components", type=int, default=5)
+        parser.add_argument("--repeat", type=int, default=3)
+        parser.add_argument("--batch-size", type=int, default=5_000)
+
+    def handle(self, *args, **options):
+        factory = APIRequestFactory()
+
+        with transaction.atomic():
+            user = self.seed(options["rows"], options["components"], options["batch_size"])
+            cases = [
+                (
+                    "users",
+                    lambda: UserSerializer(User.objects.all(), many=True).data,
+                    lambda: UserListCreateView.as_view()(factory.get("/api/users/")),
+                ),
+                (
+                    "transactions",
+                    lambda: DepositSerializer(
+                        Transaction.objects.filter(user_id=user.pk).order_by("-created_at"), many=True
+                    ).data,
+                    lambda: TransactionListView.as_view()(
+                        factory.get(f"/api/users/{user.pk}/transactions/"), user_id=user.pk
+                    ),
+                ),
+                (
+                    "portfolios",
+                    lambda: PortfolioCreateSerializer(
+                        Portfolio.objects.filter(user_id=user.pk), many=True
+                    ).data,
+                    lambda: PortfolioListView.as_view()(
+                        factory.get(f"/api/users/{user.pk}/portfolios/"), user_id=user.pk
+                    ),
+                ),
+            ]
+
+            for name, before, after in cases:
+                rows, before_ms = self.time(lambda: JSONRenderer().render(before()), options["repeat"])
+                _, after_ms = self.time(lambda: after().render().content, options["repeat"])
+                self.stdout.write(
+                    f"{name:>12}: {rows:>7} rows | before {before_ms:9.1f} ms "
+                    f"({rows / before_ms * 1000:>9.0f} rows/s) | after {after_ms:9.1f} ms "
+                    f"({rows / after_ms * 1000:>9.0f} rows/s) | x{before_ms / after_ms:.1f}"
+                )
+            transaction.set_rollback(True)
+
+    def time(self, render, repeat):
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            content = render()
+            timings.append((time.perf_counter() - start) * 1000)
+        # Rows are the top level objects of the rendered JSON list
+        rows = content.count(b'{"id":')
+        return rows, statistics.median(timings)
+
+    def seed(self, size, component_count, batch_size):
+        suffix = time.time_ns()
+        User.objects.bulk_create(
+            [
+                User(
+                    first_name="Bench",
+                    last_name=str(i),
+                    phone_number="000",
+                    email=f"bench-{suffix}-{i}@example.com",
+                )
+                for i in range(size)
+            ],
+            batch_size=batch_size,
+        )
+        user = User.objects.filter(email=f"bench-{suffix}-0@example.com").get()
+
+        Transaction.objects.bulk_create(
+            [
+                Transaction(
+                    user=user,
+                    transaction_type=Transaction.DEPOSIT,
+                    amount=Decimal("10.00"),
+                    execution_date=date.today(),
+                )
+                for _ in range(size)
+            ],
+            batch_size=batch_size,
+        )
+
+        stocks = [
+            Stock.objects.create(symbol=f"SER{i}", name=f"Serializer bench {i}")
+            for i in range(component_count)
+        ]
+        portfolios = Portfolio.objects.bulk_create(
+            [
+                Portfolio(user=user, name=f"Bench {i}", description="", risk=Portfolio.LOW)
+                for i in range(size)
+            ],
+            batch_size=batch_size,
+        )
+        weight = Decimal(1) / component_count
+        PortfolioComponent.objects.bulk_create(
+            [
+                PortfolioComponent(portfolio=portfolio, stock=stock, weight=weight)
+                for portfolio in portfolios
+                for stock in stocks
+            ],
+            batch_size=batch_size,
+        )
+        return user
@@ -0,0 +1,51 @@
+import statistics
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from racional_api import simulation
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the Monte Carlo projection of POST /api/portfolios/<id>/simulate/ on a synthetic history, "
+        "for each method and number of processes. Fails when a median exceeds --budget-ms."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--paths", type=int, default=10_000)
+        parser.add_argument("--years", type=int, default=10)
+        parser.add_argument("--history-days", type=int, default=1_260)
+        parser.add_argument("--processes", type=int, nargs="+", default=[1])
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--budget-ms", type=float, default=1000)
+
+    def handle(self, *args, **options):
+        log_returns = np.random.default_rng(0).normal(0.0003, 0.01, options["history_days"])
+
+        over = []
+        for processes in options["processes"]:
+            for method in simulation.METHODS:
+                run = lambda: simulation.simulate(
+                    log_returns, options["years"], 1000, 100, options["paths"], method, 0, processes
+                )
+                # The first run starts the pool
+                run()
+                times = []
+                for _ in range(options["repeat"]):
+                    start = time.perf_counter()
+                    values = run()
+                    times.append((time.perf_counter() - start) * 1000)
+                median = statistics.median(times)
+                self.stdout.write(
+                    f"{method:>9} x {processes} processes: {options['paths']} paths x {options['years']} years "
+                    f"in {median:7.1f} ms | median final value {np.median(values[:, -1]):12.2f}"
+                )
+                if median > options["budget_ms"]:
+                    over.append(f"{method} with {processes} processes {median:.0f} ms > {options['budget_ms']:.0f} ms")
+
+        if simulation._pool is not None:
+            simulation._pool.shutdown()
+        if over:
+            raise CommandError(f"Simulation over budget: {'; '.join(over)}")
@@ -0,0 +1,115 @@
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Run in a fresh interpreter: what a worker imports before serving
+IMPORT_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.urls import get_resolver
+get_resolver().url_patterns
+print(time.perf_counter() - start)
+print(",".join(name for name in ("numpy", "pandas", "matplotlib") if name in sys.modules))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure worker cold start: import time of Django, the settings and every view module in a "
+        "fresh interpreter, and time from launching uvicorn to the first response of --path. "
+        "Fails when a median exceeds its budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--path", default="/api/schema/")
+        parser.add_argument("--import-budget-ms", type=float, default=1000)
+        parser.add_argument("--budget-ms", type=float, default=3000, help="Budget for the first response.")
+        parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for the server.")
+
+    def handle(self, *args, **options):
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "project.settings")}
+
+        imports, processes, heavy = [], [], set()
+        for _ in range(options["repeat"]):
+            start = time.perf_counter()
+            output = subprocess.run(
+                [sys.executable, "-c", IMPORT_SCRIPT],
+                cwd=settings.BASE_DIR,
+                env=env,
+                capture_output=True,
+                text=True,
+                check=True,
+            ).stdout.splitlines()
+            processes.append((time.perf_counter() - start) * 1000)
+            imports.append(float(output[0]) * 1000)
+            heavy.update(filter(None, output[1].split(",")))
+        import_ms = statistics.median(imports)
+        self.stdout.write(
+            f"imports: {import_ms:7.1f} ms (process {statistics.median(processes):7.1f} ms) | "
+            f"heavy modules loaded: {', '.join(sorted(heavy)) or 'none'}"
+        )
+
+        firsts, seconds = [], []
+        for _ in range(options["repeat"]):
+            first_ms, second_ms = self.first_response(env, options["path"], options["timeout"])
+            firsts.append(first_ms)
+            seconds.append(second_ms)
+        first_ms = statistics.median(firsts)
+        self.stdout.write(
+            f"first response of {options['path']}: {first_ms:7.1f} ms from launch | "
+            f"second {statistics.median(seconds):6.1f} ms"
+        )
+
+        over = []
+        if import_ms > options["import_budget_ms"]:
+            over.append(f"imports {import_ms:.0f} ms > {options['import_budget_ms']:.0f} ms")
+        if first_ms > options["budget_ms"]:
+            over.append(f"first response {first_ms:.0f} ms > {options['budget_ms']:.0f} ms")
+        if over:
+            raise CommandError(f"Cold start over budget: {'; '.join(over)}")
+
+    def first_response(self, env, path, timeout):
+        """Milliseconds from launching a server to its first response, and the latency of a second request."""
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        url = f"http://127.0.0.1:{port}{path}"
+
+        start = time.perf_counter()
+        server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "project.asgi:application", "--port", str(port), "--log-level", "warning"],
+            cwd=settings.BASE_DIR,
+            env=env,
+        )
+        try:
+            with httpx.Client() as client:
+                while True:
+                    if server.poll() is not None:
+                        raise CommandError(f"The server exited with code {server.returncode}")
+                    if time.perf_counter() - start > timeout:
+                        raise CommandError(f"No response from {url} after {timeout:.0f} s")
+                    try:
+                        response = client.get(url)
+                        break
+                    except httpx.TransportError:
+                        time.sleep(0.01)
+                first_ms = (time.perf_counter() - start) * 1000
+                if response.status_code >= 500:
+                    raise CommandError(f"{url} answered {response.status_code}")
+
+                begin = time.perf_counter()
+                client.get(url)
+                return first_ms, (time.perf_counter() - begin) * 1000
+        finally:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,83 @@
+import math
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+from django.db.models.functions import TruncDate
+from racional_api.analytics import daily_stats
+from racional_api.models import Stock, StockDailyStats, StockPrice
+from racional_api.valuation import end_of_day
+
+
+class Command(BaseCommand):
+    help = (
+        "Fill StockDailyStats with daily returns and rolling statistics. "
+        "Only price dates after the last computed day of each stock are processed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--symbol", help="Only process this stock.")
+        parser.add_argument("--full", action="store_true", help="Drop existing stats and recompute everything.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        stocks = Stock.objects.order_by("pk")
+        if options["symbol"]:
+            stocks = stocks.filter(symbol=options["symbol"])
+
+        start = time.perf_counter()
+        created = 0
+        for stock in stocks:
+            with transaction.atomic():
+                if options["full"]:
+                    StockDailyStats.all_objects.filter(stock=stock).delete()
+                created += self.process(stock, options["batch_size"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Created {created} daily stats rows in {time.perf_counter() - start:.2f}s"
+            )
+        )
+
+    def process(self, stock, batch_size):
+        existing = StockDailyStats.objects.filter(stock=stock)
+        last_day = existing.aggregate(last=Max("date"))["last"]
+
+        # Closes already processed are read back from the stats table, just
+        # enough of them to fill the longest rolling window of the new days
+        history = list(
+            existing.order_by("-date").values_list("date", "close")[: max(StockDailyStats.WINDOWS)]
+        )[::-1]
+
+        prices = StockPrice.objects.filter(stock=stock)
+        if last_day is not None:
+            prices = prices.filter(date__gte=end_of_day(last_day))
+
+        # The last price of each day is its close
+        new_closes = dict(prices.order_by("date").values_list(TruncDate("date"), "value"))
+        if not new_closes:
+            return 0
+
+        days = [day for day, _ in history] + list(new_closes)
+        stats = daily_stats(
+            [close for _, close in history] + list(new_closes.values()),
+            StockDailyStats.WINDOWS,
+        )
+
+        rows = [
+            StockDailyStats(
+                stock=stock,
+                date=days[i],
+                close=float(new_closes[days[i]]),
+                **{name: none_if_nan(values[i]) for name, values in stats.items()},
+            )
+            for i in range(len(history), len(days))
+        ]
+        StockDailyStats.objects.bulk_create(rows, batch_size=batch_size)
+        return len(rows)
+
+
+def none_if_nan(value):
+    value = float(value)
+    return None if math.isnan(value) else value
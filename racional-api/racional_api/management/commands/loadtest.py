@@ -0,0 +1,223 @@
+import asyncio
+import random
+import statistics
+import time
+from collections import defaultdict
+from datetime import date
+
+import httpx
+from django.core.management.base import BaseCommand, CommandError
+
+REQUESTS = ("deposit", "order", "invest", "total", "movements")
+DEFAULT_MIX = "deposit=2,order=3,invest=1,total=3,movements=3"
+# Portfolio weights must add up to exactly 1
+BASKET_WEIGHTS = {1: ["1.0"], 2: ["0.5", "0.5"], 3: ["0.4", "0.3", "0.3"]}
+
+
+class LoadTest:
+    """
+    Seed users through the API, then run `concurrency` clients that pick
+    requests from a weighted mix until `duration` seconds have passed.
+    """
+
+    def __init__(self, client, mix, users, rng):
+        self.client = client
+        self.mix = mix
+        self.user_count = users
+        self.rng = rng
+        self.users = []
+        self.stocks = []
+        self.portfolios = {}
+        self.results = defaultdict(list)
+
+    async def seed(self):
+        resp = await self.client.get("stocks/")
+        resp.raise_for_status()
+        for stock in resp.json():
+            prices = await self.client.get(f"stocks/{stock['symbol']}/prices/", params={"max_points": 2})
+            if prices.status_code == 200 and prices.json()["points"]:
+                self.stocks.append(stock)
+            if len(self.stocks) == 5:
+                break
+        if not self.stocks:
+            raise CommandError("No stocks with prices, run `manage.py seed_stocks` first.")
+
+        run = time.time_ns()
+        basket = self.stocks[:3]
+        self.basket = [
+            {"symbol": stock["symbol"], "weight": weight}
+            for stock, weight in zip(basket, BASKET_WEIGHTS[len(basket)])
+        ]
+        await asyncio.gather(*(self.seed_user(run, i) for i in range(self.user_count)))
+
+    async def seed_user(self, run, index):
+        resp = await self.client.post(
+            "users/",
+            json={
+                "first_name": "Load",
+                "last_name": f"Test {index}",
+                "phone_number": "000",
+                "email": f"loadtest-{run}-{index}@example.com",
+            },
+        )
+        resp.raise_for_status()
+        user_id = resp.json()["id"]
+        resp = await self.client.post(
+            "transactions/deposit/",
+            json={"user_id": user_id, "amount": "1000000.00", "execution_date": str(date.today())},
+        )
+        resp.raise_for_status()
+        resp = await self.client.post(
+            "portfolios/",
+            json={
+                "user_id": user_id,
+                "name": f"Load test {index}",
+                "description": "",
+                "risk": "LOW",
+                "components": self.basket,
+            },
+        )
+        resp.raise_for_status()
+        self.portfolios[user_id] = resp.json()["id"]
+        self.users.append(user_id)
+
+    # One coroutine per kind of request, each returns the response
+
+    def deposit(self, user_id):
+        return self.client.post(
+            "transactions/deposit/",
+            json={"user_id": user_id, "amount": "100.00", "execution_date": str(date.today())},
+        )
+
+    def order(self, user_id):
+        return self.client.post(
+            "orders/stocks/",
+            json={
+                "user_id": user_id,
+                "stock_id": self.rng.choice(self.stocks)["id"],
+                "side": "BUY",
+                "quantity": "1",
+                "execution_date": str(date.today()),
+            },
+        )
+
+    def invest(self, user_id):
+        return self.client.post(
+            "portfolios/invest/",
+            json={
+                "user_id": user_id,
+                "portfolio_id": self.portfolios[user_id],
+                "amount": "500.00",
+                "execution_date": str(date.today()),
+            },
+        )
+
+    def total(self, user_id):
+        return self.client.get(f"users/{user_id}/portfolio/total/")
+
+    def movements(self, user_id):
+        return self.client.get(f"users/{user_id}/movements/")
+
+    async def worker(self, deadline):
+        names, weights = zip(*self.mix.items())
+        while time.perf_counter() < deadline:
+            name = self.rng.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                resp = await getattr(self, name)(self.rng.choice(self.users))
+                outcome = resp.status_code
+            except httpx.HTTPError as exc:
+                outcome = type(exc).__name__
+            self.results[name].append(((time.perf_counter() - start) * 1000, outcome))
+
+    async def run(self, concurrency, duration):
+        deadline = time.perf_counter() + duration
+        await asyncio.gather(*(self.worker(deadline) for _ in range(concurrency)))
+
+
+def percentile(values, pct):
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+
+class Command(BaseCommand):
+    help = (
+        "Load test a running API: seed users, portfolios and cash through the API, then send "
+        "a weighted mix of deposits, orders, investments, totals and movements from concurrent "
+        "async clients. Reports RPS, latency percentiles and errors per endpoint."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--base-url", default="http://localhost:8000/api/")
+        parser.add_argument("--users", type=int, default=20, help="Users to seed.")
+        parser.add_argument("--concurrency", type=int, default=20, help="Concurrent clients.")
+        parser.add_argument("--duration", type=float, default=30, help="Seconds to run.")
+        parser.add_argument(
+            "--mix",
+            default=DEFAULT_MIX,
+            help=f"Weights per request, default {DEFAULT_MIX}.",
+        )
+        parser.add_argument("--timeout", type=float, default=30)
+        parser.add_argument("--seed", type=int, default=None, help="Random seed for a repeatable mix.")
+
+    def handle(self, *args, **options):
+        mix = self.parse_mix(options["mix"])
+        elapsed, results = asyncio.run(self.load(mix, options))
+        self.report(results, elapsed)
+
+    def parse_mix(self, value):
+        mix = {}
+        for part in value.split(","):
+            name, _, weight = part.partition("=")
+            name = name.strip()
+            if name not in REQUESTS or not weight.strip().isdigit():
+                raise CommandError(f"Invalid mix entry {part!r}, expected e.g. {DEFAULT_MIX}")
+            mix[name] = int(weight)
+        if not any(mix.values()):
+            raise CommandError("At least one weight must be greater than 0.")
+        return mix
+
+    async def load(self, mix, options):
+        base_url = options["base_url"].rstrip("/") + "/"
+        limits = httpx.Limits(max_connections=options["concurrency"])
+        async with httpx.AsyncClient(
+            base_url=base_url, timeout=options["timeout"], limits=limits
+        ) as client:
+            test = LoadTest(client, mix, options["users"], random.Random(options["seed"]))
+            self.stdout.write(f"Seeding {options['users']} users on {base_url}")
+            try:
+                await test.seed()
+            except httpx.HTTPError as exc:
+                raise CommandError(f"Seeding failed: {exc}")
+
+            self.stdout.write(
+                f"Running {options['concurrency']} clients for {options['duration']:.0f}s"
+            )
+            start = time.perf_counter()
+            await test.run(options["concurrency"], options["duration"])
+            return time.perf_counter() - start, test.results
+
+    def report(self, results, elapsed):
+        self.stdout.write(
+            f"{'endpoint':<10} {'requests':>8} {'rps':>8} {'p50 ms':>8} {'p90 ms':>8} "
+            f"{'p99 ms':>8} {'max ms':>8} {'errors':>7}  codes"
+        )
+        rows = sorted(results.items())
+        rows.append(("all", [sample for _, samples in rows for sample in samples]))
+        for name, samples in rows:
+            if not samples:
+                continue
+            latencies = sorted(latency for latency, _ in samples)
+            codes = defaultdict(int)
+            for _, outcome in samples:
+                codes[outcome] += 1
+            errors = sum(
+                count for outcome, count in codes.items()
+                if not isinstance(outcome, int) or outcome >= 400
+            )
+            self.stdout.write(
+                f"{name:<10} {len(samples):>8} {len(samples) / elapsed:>8.1f} "
+                f"{statistics.median(latencies):>8.1f} {percentile(latencies, 90):>8.1f} "
+                f"{percentile(latencies, 99):>8.1f} {latencies[-1]:>8.1f} "
+                f"{errors / len(samples):>7.1%}  "
+                + " ".join(f"{code}:{count}" for code, count in sorted(codes.items(), key=str))
+            )
@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from racional_api.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses past their IDEMPOTENCY_KEY_TTL, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        now = timezone.now()
+        total = 0
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=now).values_list("pk", flat=True)[
+                    : options["batch_size"]
+                ]
+            )
+            if not ids:
+                break
+            total += IdempotencyKey.objects.filter(pk__in=ids).delete()[0]
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {total} expired idempotency keys in {time.perf_counter() - start:.2f}s"
+            )
+        )
@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+from racional_api.models import Order, Position
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild the FIFO tax lots and positions of every user (or one) from their executed "
+        "stock orders. Needed once for orders stored before lots existed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, help="Only rebuild this user.")
+
+    def handle(self, *args, **options):
+        users = Order.objects.filter(asset_type=Order.ASSET_STOCK, stock__isnull=False)
+        if options["user_id"]:
+            users = users.filter(user_id=options["user_id"])
+        user_ids = users.order_by("user_id").values_list("user_id", flat=True).distinct()
+
+        start = time.perf_counter()
+        count = 0
+        for user_id in user_ids:
+            Position.rebuild(user_id)
+            count += 1
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt lots of {count} user(s) in {time.perf_counter() - start:.2f}s."
+            )
+        )
@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from racional_api.models import (
+    CashBalanceCheckpoint,
+    CashLedgerEntry,
+    Order,
+    Transaction,
+    User,
+)
+
+
+class Command(BaseCommand):
+    help = "Compare the cash ledger balance of every user against User.money."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--user-id", type=int, help="Only reconcile this user.")
+        parser.add_argument(
+            "--rebuild",
+            action="store_true",
+            help="Rebuild ledger entries and checkpoints from Transactions and Orders first.",
+        )
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by("pk")
+        if options["user_id"]:
+            users = users.filter(pk=options["user_id"])
+
+        mismatches = 0
+        for user in users:
+            if options["rebuild"]:
+                self.rebuild(user)
+
+            balance = CashLedgerEntry.balance(user.pk)
+            if balance != user.money:
+                mismatches += 1
+                self.stdout.write(
+                    self.style.WARNING(
+                        f"User {user.pk}: ledger={balance} money={user.money} diff={balance - user.money}"
+                    )
+                )
+
+        if mismatches:
+            raise CommandError(f"{mismatches} user(s) with a cash mismatch.")
+        self.stdout.write(self.style.SUCCESS(f"Cash reconciled for {users.count()} user(s)."))
+
+    @transaction.atomic
+    def rebuild(self, user):
+        User.objects.select_for_update().filter(pk=user.pk).first()
+        CashBalanceCheckpoint.objects.filter(user=user).delete()
+        CashLedgerEntry.objects.filter(user=user).delete()
+
+        sources = [
+            *Transaction.objects.filter(user=user),
+            *Order.objects.filter(user=user, asset_type=Order.ASSET_STOCK),
+        ]
+        sources.sort(key=lambda row: (row.created_at, row.pk))
+
+        entries = [
+            CashLedgerEntry.for_transaction(row) if isinstance(row, Transaction) else CashLedgerEntry.for_order(row)
+            for row in sources
+        ]
+        entries = CashLedgerEntry.objects.bulk_create([e for e in entries if e is not None])
+
+        interval = settings.CASH_LEDGER_CHECKPOINT_INTERVAL
+        balance = Decimal("0.00")
+        checkpoints = []
+        for index, entry in enumerate(entries, start=1):
+            balance += entry.amount
+            if index % interval == 0:
+                checkpoints.append(
+                    CashBalanceCheckpoint(user=user, last_entry_id=entry.pk, balance=balance)
+                )
+        CashBalanceCheckpoint.objects.bulk_create(checkpoints)
@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+from racional_api.archive import restore
+from racional_api.models import ArchivedRecord
+
+
+class Command(BaseCommand):
+    help = (
+        "List or restore rows moved to ArchivedRecord by `archive_deleted`. "
+        "Restored rows keep their ids and stay soft deleted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("model", help="Model name, e.g. `order`.")
+        parser.add_argument("ids", nargs="*", type=int, help="Ids to restore, all archived rows of the model if empty.")
+        parser.add_argument("--list", action="store_true", help="Only print the matching archived rows.")
+
+    def handle(self, *args, **options):
+        records = ArchivedRecord.objects.filter(
+            model=f"racional_api.{options['model'].lower()}"
+        ).order_by("object_id")
+        if options["ids"]:
+            records = records.filter(object_id__in=options["ids"])
+
+        if options["list"]:
+            for record in records:
+                self.stdout.write(
+                    f"{record.object_id}\tdeleted {record.deleted_at:%Y-%m-%d %H:%M}\t"
+                    f"archived {record.archived_at:%Y-%m-%d %H:%M}\t{record.payload}"
+                )
+            return
+
+        try:
+            restored = restore(list(records))
+        except IntegrityError as exc:
+            raise CommandError(
+                f"Could not restore: {exc}. Restore the rows they point to first."
+            ) from exc
+        self.stdout.write(self.style.SUCCESS(f"Restored {restored} {options['model']} rows"))
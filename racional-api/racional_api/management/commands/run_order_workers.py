@@ -0,0 +1,69 @@
+import multiprocessing
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from racional_api.execution import execute_pending
+
+
+def work(batch_size, max_users, once, poll_interval):
+    """Execute batches until the queue is empty (`once`) or forever, polling when idle."""
+    executed = failed = 0
+    try:
+        while True:
+            done, errors = execute_pending(batch_size, max_users)
+            executed += done
+            failed += errors
+            if done + errors == 0:
+                if once:
+                    break
+                time.sleep(poll_interval)
+    finally:
+        connections.close_all()
+    return executed, failed
+
+
+class Command(BaseCommand):
+    help = (
+        "Execute PENDING stock orders (ORDER_EXECUTION_MODE=queued) with a pool of worker "
+        "processes. Workers claim batches with SKIP LOCKED, so several commands can run at once."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--users-per-batch",
+            type=int,
+            default=10,
+            help="Users a worker locks per batch, other workers take the rest.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Exit when the queue is empty instead of polling for new orders.",
+        )
+        parser.add_argument("--poll-interval", type=float, default=1.0, help="Seconds to wait when idle.")
+
+    def handle(self, *args, **options):
+        processes = max(1, options["processes"])
+        task = (options["batch_size"], options["users_per_batch"], options["once"], options["poll_interval"])
+
+        start = time.perf_counter()
+        if processes == 1:
+            results = [work(*task)]
+        else:
+            # Children must not inherit the parent's database connection
+            connections.close_all()
+            with multiprocessing.get_context("fork").Pool(processes) as pool:
+                results = pool.starmap(work, [task] * processes)
+        elapsed = time.perf_counter() - start
+
+        executed = sum(done for done, _ in results)
+        failed = sum(errors for _, errors in results)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Executed {executed} orders, {failed} failed, with {processes} processes "
+                f"in {elapsed:.2f}s ({(executed + failed) / elapsed:.0f} orders/s)"
+            )
+        )
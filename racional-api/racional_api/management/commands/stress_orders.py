@@ -0,0 +1,122 @@
+import multiprocessing
+import statistics
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+from rest_framework.test import APIRequestFactory
+from racional_api.models import (
+    CashBalanceCheckpoint,
+    CashLedgerEntry,
+    LotDisposal,
+    Order,
+    Position,
+    Stock,
+    StockPrice,
+    TaxLot,
+    User,
+)
+from racional_api.views import StockOrderCreateView
+
+PRICE = Decimal("10.00")
+
+
+def place_orders(user_ids, stock_id, count, offset):
+    """Post `count` BUY orders spread over `user_ids`. Returns the latency of each one in ms."""
+    view = StockOrderCreateView.as_view()
+    factory = APIRequestFactory()
+    timings = []
+    try:
+        for i in range(count):
+            request = factory.post(
+                "/api/orders/stocks/",
+                {
+                    "user_id": user_ids[(offset + i) % len(user_ids)],
+                    "stock_id": stock_id,
+                    "side": Order.BUY,
+                    "quantity": "1",
+                    "execution_date": str(date.today()),
+                },
+                format="json",
+            )
+            start = time.perf_counter()
+            response = view(request)
+            timings.append((time.perf_counter() - start) * 1000)
+            assert response.status_code == 201, response.data
+    finally:
+        connections.close_all()
+    return timings
+
+
+class Command(BaseCommand):
+    help = (
+        "Post stock orders from several processes at once, spread over a growing number of "
+        "users, and report throughput. Orders of one user run one at a time (`user_lock`), "
+        "orders of different users in parallel. The data is deleted at the end."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, nargs="+", default=[1, 2, 4, 8])
+        parser.add_argument("--processes", type=int, default=8)
+        parser.add_argument("--orders", type=int, default=400, help="Orders per run.")
+
+    def handle(self, *args, **options):
+        processes = options["processes"]
+        per_process = max(1, options["orders"] // processes)
+        self.stdout.write(f"{processes} processes, {per_process * processes} orders per run")
+
+        stock = Stock.objects.create(symbol=f"STRESS{time.time_ns() % 10**6}", name="Stress")
+        StockPrice.objects.create(stock=stock, value=float(PRICE), date=timezone.now() - timedelta(days=1))
+        try:
+            for user_count in options["users"]:
+                users = [
+                    User.objects.create(
+                        first_name="Stress",
+                        last_name=str(i),
+                        phone_number="000",
+                        email=f"stress-{time.time_ns()}-{i}@example.com",
+                        money=PRICE * per_process * processes,
+                    )
+                    for i in range(user_count)
+                ]
+                user_ids = [user.pk for user in users]
+
+                # Children must not inherit the parent's database connection
+                connections.close_all()
+                start = time.perf_counter()
+                with multiprocessing.get_context("fork").Pool(processes) as pool:
+                    results = pool.starmap(
+                        place_orders,
+                        [(user_ids, stock.pk, per_process, index) for index in range(processes)],
+                    )
+                elapsed = time.perf_counter() - start
+
+                timings = [t for result in results for t in result]
+                spent = sum(
+                    PRICE * per_process * processes - user.money
+                    for user in User.objects.filter(pk__in=user_ids)
+                )
+                self.stdout.write(
+                    f"{user_count:>4} users: {len(timings) / elapsed:8.0f} orders/s, "
+                    f"p50 {statistics.median(timings):7.2f} ms, "
+                    f"p95 {statistics.quantiles(timings, n=20)[-1]:7.2f} ms, "
+                    f"balances {'ok' if spent == PRICE * len(timings) else 'MISMATCH'}"
+                )
+        finally:
+            self.cleanup(stock)
+
+    def cleanup(self, stock):
+        user_ids = list(Order.all_objects.filter(stock=stock).values_list("user_id", flat=True).distinct())
+        CashBalanceCheckpoint.all_objects.filter(user_id__in=user_ids).delete()
+        CashLedgerEntry.all_objects.filter(user_id__in=user_ids).delete()
+        # Lots and positions protect the orders, users and stock they point to
+        LotDisposal.all_objects.filter(lot__user_id__in=user_ids).delete()
+        TaxLot.all_objects.filter(user_id__in=user_ids).delete()
+        Position.all_objects.filter(user_id__in=user_ids).delete()
+        Order.all_objects.filter(stock=stock).delete()
+        User.all_objects.filter(pk__in=user_ids).delete()
+        StockPrice.all_objects.filter(stock=stock).delete()
+        Stock.all_objects.filter(pk=stock.pk).delete()
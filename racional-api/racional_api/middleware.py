@@ -0,0 +1,22 @@
+"""
+Response compression.
+
+`GZipMiddleware` compresses anything from 200 bytes up. List endpoints
+return megabytes of repetitive JSON that shrink several times, but small
+bodies are not worth the CPU, and an event stream must reach the client as
+each event is written, not when a compressor flushes.
+"""
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """`GZipMiddleware` for bodies of at least RESPONSE_COMPRESSION_MIN_SIZE bytes, event streams excluded."""
+
+    def process_response(self, request, response):
+        if response.streaming:
+            if response.get("Content-Type", "").startswith("text/event-stream"):
+                return response
+        elif len(response.content) < settings.RESPONSE_COMPRESSION_MIN_SIZE:
+            return response
+        return super().process_response(request, response)
@@ -1,4 +1,29 @@
-from django.db import models
+import bisect
+from collections import defaultdict
+from decimal import ROUND_HALF_UP, Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models, transaction as db_transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+
+def to_cents(value):
+    """Round a money amount the same way a 2 decimal column stores it."""
+    return Decimal(str(value)).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+
+
+def to_4_places(value):
+    """Round a quantity, price or cost the same way a 4 decimal column stores it."""
+    return Decimal(str(value)).quantize(Decimal("0.0001"), rounding=ROUND_HALF_UP)
+
+
+class AliveManager(models.Manager):
+    """Default manager of soft deletable models: only rows that were not deleted."""
+
+    def get_queryset(self):
+        return super().get_queryset().filter(is_deleted=False)
 
 
 class SoftDeleteModel(models.Model):
@@ -7,6 +32,12 @@ class SoftDeleteModel(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    # `objects` (and reverse relations) skip deleted rows, `all_objects` sees
+    # every row. Forward relations use the base manager, so an order still
+    # reaches a deleted stock.
+    objects = AliveManager()
+    all_objects = models.Manager()
+
     def delete(self, using=None, keep_parents=False):
         """Soft delete instead of removing the row."""
         self.is_deleted = True
@@ -15,6 +46,8 @@ class SoftDeleteModel(models.Model):
         return (1, {self.__class__.__name__: 1})
 
     class Meta:
+        # No index of its own: the primary key serves lookups by id, and the
+        # hot queries of each model have their own partial (live rows) index
         abstract = True
 
 
@@ -50,6 +83,26 @@ class Transaction(SoftDeleteModel):
     execution_date = models.DateField(default=None)
     class Meta(SoftDeleteModel.Meta):
         ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["user", "-created_at"], name="transaction_user_alive", condition=Q(is_deleted=False)),
+            # Newest change of a user's rows, deleted ones included, for conditional GETs
+            models.Index(fields=["user", "-updated_at"], name="transaction_user_updated_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding and not self.is_deleted:
+            CashLedgerEntry.record_transaction(self)
+
+    def delete(self, using=None, keep_parents=False):
+        # The soft delete, the reversal and the balance change commit together
+        with db_transaction.atomic():
+            was_deleted = self.is_deleted
+            result = super().delete(using=using, keep_parents=keep_parents)
+            if not was_deleted:
+                CashLedgerEntry.record_reversal(self.ledger_entries.all())
+        return result
 
 
 class Stock(SoftDeleteModel):
@@ -66,6 +119,45 @@ class StockPrice(SoftDeleteModel):
         related_name="prices",
     )
 
+    class Meta(SoftDeleteModel.Meta):
+        indexes = [
+            # Latest price per stock (DISTINCT ON stock ORDER BY date DESC)
+            models.Index(fields=["stock", "-date"], name="stockprice_stock_date_idx", condition=Q(is_deleted=False)),
+            # Newest row ingested per stock, the conditional GET validator of a user's total
+            models.Index(fields=["stock", "-id"], name="stockprice_stock_newest_idx"),
+        ]
+
+class StockDailyStats(SoftDeleteModel):
+    """
+    Per stock daily return and rolling statistics, derived from StockPrice.
+
+    Filled incrementally by the `compute_stock_stats` command. Rolling fields
+    are null until the window has enough returns.
+    """
+    stock = models.ForeignKey(
+        Stock,
+        on_delete=models.PROTECT,
+        related_name="daily_stats",
+    )
+    date = models.DateField()
+    close = models.FloatField()
+    daily_return = models.FloatField(null=True)
+    log_return = models.FloatField(null=True)
+    # Mean and standard deviation of the daily returns over the last N days
+    mean_20 = models.FloatField(null=True)
+    volatility_20 = models.FloatField(null=True)
+    mean_60 = models.FloatField(null=True)
+    volatility_60 = models.FloatField(null=True)
+    mean_252 = models.FloatField(null=True)
+    volatility_252 = models.FloatField(null=True)
+
+    WINDOWS = (20, 60, 252)
+
+    class Meta(SoftDeleteModel.Meta):
+        unique_together = ("stock", "date")
+        ordering = ["date"]
+
+
 class Portfolio(SoftDeleteModel):
     user = models.ForeignKey(
         User,
@@ -83,7 +175,6 @@ class Portfolio(SoftDeleteModel):
         (HIGH, "High"),
     ]
     risk = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
-    #TODO: Could add a versioning for history tracking
 
 
 class PortfolioComponent(SoftDeleteModel):
@@ -103,6 +194,89 @@ class PortfolioComponent(SoftDeleteModel):
         unique_together = ("portfolio", "stock")
 
 
+class PortfolioVersion(SoftDeleteModel):
+    """
+    Weights of a portfolio's components between `valid_from` and `valid_to`
+    (exclusive, NULL while it is the current composition).
+
+    Versions of a portfolio never overlap: `record` closes the open one when
+    a new one starts. `weights` maps stock ids (as strings) to weights.
+    """
+    portfolio = models.ForeignKey(
+        Portfolio,
+        on_delete=models.PROTECT,
+        related_name="versions",
+    )
+    valid_from = models.DateField()
+    valid_to = models.DateField(null=True, blank=True)
+    weights = models.JSONField()
+
+    class Meta(SoftDeleteModel.Meta):
+        constraints = [
+            # Also the index behind the as-of lookup: newest start at or before a date
+            models.UniqueConstraint(
+                fields=["portfolio", "valid_from"],
+                name="portfolioversion_start_uniq",
+                condition=Q(is_deleted=False),
+            ),
+            models.CheckConstraint(
+                condition=Q(valid_to__isnull=True) | Q(valid_to__gt=F("valid_from")),
+                name="portfolioversion_range_check",
+            ),
+        ]
+
+    @classmethod
+    def as_of(cls, portfolio_id, day):
+        """The version in effect on `day`, or None."""
+        # Versions do not overlap, so only the newest one started by then can apply
+        version = (
+            cls.objects.filter(portfolio_id=portfolio_id, valid_from__lte=day)
+            .order_by("-valid_from")
+            .first()
+        )
+        if version is None or (version.valid_to is not None and version.valid_to <= day):
+            return None
+        return version
+
+    @classmethod
+    def record_initial(cls, portfolio):
+        """
+        Snapshot the current components of a portfolio created before
+        versioning as the version starting on its creation date, so the first
+        change does not leave the days before it without a composition. Call
+        it before changing the components; it does nothing once the portfolio
+        has a version. Returns the version created, or None.
+        """
+        if cls.objects.filter(portfolio=portfolio).exists():
+            return None
+        return cls.record(portfolio, timezone.localdate(portfolio.created_at))
+
+    @classmethod
+    def record(cls, portfolio, day=None):
+        """
+        Snapshot the current components of `portfolio` as the version starting
+        on `day` (today by default). A version that already starts that day is
+        replaced, and later versions are not expected.
+        """
+        day = day or timezone.localdate()
+        weights = {
+            str(stock_id): str(weight)
+            for stock_id, weight in portfolio.components.values_list("stock_id", "weight")
+        }
+        with db_transaction.atomic():
+            cls.objects.filter(portfolio=portfolio, valid_to__isnull=True, valid_from__lt=day).update(
+                valid_to=day, updated_at=timezone.now()
+            )
+            version, _ = cls.objects.update_or_create(
+                portfolio=portfolio,
+                valid_from=day,
+                defaults={"weights": weights, "valid_to": None},
+            )
+            # Cached analytics of the portfolio are keyed on it
+            portfolio.save(update_fields=["updated_at"])
+        return version
+
+
 class Order(SoftDeleteModel):
     ASSET_STOCK = "STOCK"
     ASSET_PORTFOLIO = "PORTFOLIO"
@@ -118,6 +292,17 @@ class Order(SoftDeleteModel):
         (SELL, "Sell"),
     ]
 
+    # Queued orders (ORDER_EXECUTION_MODE = "queued") wait as PENDING until a
+    # worker executes them; only EXECUTED orders count as holdings or cash
+    PENDING = "PENDING"
+    EXECUTED = "EXECUTED"
+    FAILED = "FAILED"
+    STATUS_TYPES = [
+        (PENDING, "Pending"),
+        (EXECUTED, "Executed"),
+        (FAILED, "Failed"),
+    ]
+
     user = models.ForeignKey(
         User,
         on_delete=models.PROTECT,
@@ -152,8 +337,518 @@ class Order(SoftDeleteModel):
         max_digits=14, decimal_places=4, null=True, blank=True
     )
 
+    status = models.CharField(max_length=10, choices=STATUS_TYPES, default=EXECUTED)
+    executed_at = models.DateTimeField(null=True, blank=True)
+    failure_reason = models.CharField(max_length=255, blank=True)
+
     class Meta(SoftDeleteModel.Meta):
         ordering = ["-created_at"]
-        
-        
-##TODO: include a Positions table, to keep track of user holdings
\ No newline at end of file
+        indexes = [
+            # Holdings aggregates and sell checks group a user's live orders by stock
+            models.Index(fields=["user", "stock"], name="order_user_stock_alive", condition=Q(is_deleted=False)),
+            # Queue scan of the workers, only as large as the backlog
+            models.Index(fields=["id"], name="order_pending_idx", condition=Q(status="PENDING", is_deleted=False)),
+            models.Index(fields=["executed_at"], name="order_executed_at_idx"),
+            models.Index(fields=["user", "-updated_at"], name="order_user_updated_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding and self.status == self.EXECUTED and self.executed_at is None:
+            self.executed_at = timezone.now()
+        super().save(*args, **kwargs)
+        if adding and not self.is_deleted:
+            CashLedgerEntry.record_order(self)
+            Position.apply_orders([self])
+
+    def delete(self, using=None, keep_parents=False):
+        # The soft delete, the reversal and the balance change commit together
+        with db_transaction.atomic():
+            was_deleted = self.is_deleted
+            result = super().delete(using=using, keep_parents=keep_parents)
+            if not was_deleted:
+                CashLedgerEntry.record_reversal(self.ledger_entries.all())
+                if self.stock_id and self.status == self.EXECUTED:
+                    Position.rebuild(self.user_id, self.stock_id)
+        return result
+
+    @property
+    def day(self):
+        """Date the order counts from, its creation date when it has no execution date."""
+        return self.execution_date or self.created_at.date()
+
+
+class Position(SoftDeleteModel):
+    """
+    Open quantity, cost basis and realized P&L of a user in one stock.
+
+    Maintained together with the TaxLots behind it as stock orders execute:
+    a BUY opens a lot and a SELL closes the oldest open lots first (FIFO),
+    booking the gain of each LotDisposal in `realized_pnl`. Nothing here is
+    computed by replaying the order log, except by `rebuild`.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.PROTECT,
+        related_name="positions",
+    )
+    stock = models.ForeignKey(
+        Stock,
+        on_delete=models.PROTECT,
+        related_name="positions",
+    )
+    quantity = models.DecimalField(max_digits=14, decimal_places=4, default=0)
+    # What the open lots cost
+    cost_basis = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    realized_pnl = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    # Day of the latest SELL applied; an order dated before it changes which
+    # lots earlier sells closed, so the position is rebuilt
+    last_sold_on = models.DateField(null=True, blank=True)
+
+    class Meta(SoftDeleteModel.Meta):
+        unique_together = ("user", "stock")
+
+    @classmethod
+    def apply_orders(cls, orders):
+        """
+        Update positions and lots with newly executed stock orders, in the given order.
+
+        The positions and open lots of every (user, stock) touched are read
+        in two queries, positions locked, and all changes written in bulk.
+        """
+        orders = [
+            o for o in orders
+            if o.asset_type == Order.ASSET_STOCK
+            and o.status == Order.EXECUTED
+            and o.stock_id
+            and o.quantity
+            and o.execution_price is not None
+        ]
+        if not orders:
+            return
+
+        with db_transaction.atomic():
+            pairs = sorted({(o.user_id, o.stock_id) for o in orders})
+            scope = Q()
+            for user_id, stock_id in pairs:
+                scope |= Q(user_id=user_id, stock_id=stock_id)
+            cls.objects.bulk_create(
+                [cls(user_id=user_id, stock_id=stock_id) for user_id, stock_id in pairs],
+                ignore_conflicts=True,
+            )
+            positions = {
+                (p.user_id, p.stock_id): p
+                for p in cls.objects.select_for_update().filter(scope).order_by("pk")
+            }
+            lots = defaultdict(list)
+            for lot in TaxLot.objects.filter(scope, remaining__gt=0).order_by("acquired_on", "id"):
+                lots[lot.user_id, lot.stock_id].append(lot)
+
+            new_lots, changed_lots, disposals, stale = [], {}, [], set()
+            for order in orders:
+                pair = (order.user_id, order.stock_id)
+                position = positions[pair]
+                if position.last_sold_on and order.day < position.last_sold_on:
+                    stale.add(pair)
+                quantity = to_4_places(order.quantity)
+                price = to_4_places(order.execution_price)
+
+                if order.side == Order.BUY:
+                    lot = TaxLot(
+                        user_id=order.user_id,
+                        stock_id=order.stock_id,
+                        order=order,
+                        acquired_on=order.day,
+                        quantity=quantity,
+                        remaining=quantity,
+                        unit_cost=price,
+                    )
+                    new_lots.append(lot)
+                    bisect.insort(lots[pair], lot, key=lambda lot: lot.acquired_on)
+                    position.quantity += quantity
+                    position.cost_basis += to_4_places(quantity * price)
+                    continue
+
+                to_sell = quantity
+                for lot in lots[pair]:
+                    if not to_sell:
+                        break
+                    if not lot.remaining:
+                        continue
+                    sold = min(lot.remaining, to_sell)
+                    lot.remaining -= sold
+                    to_sell -= sold
+                    if lot.pk:
+                        changed_lots[lot.pk] = lot
+                    cost = to_4_places(sold * lot.unit_cost)
+                    gain = to_4_places(sold * price) - cost
+                    disposals.append(
+                        LotDisposal(
+                            lot=lot,
+                            order=order,
+                            quantity=sold,
+                            unit_price=price,
+                            realized_pnl=gain,
+                            disposed_on=order.day,
+                        )
+                    )
+                    position.quantity -= sold
+                    position.cost_basis -= cost
+                    position.realized_pnl += gain
+                position.last_sold_on = max(filter(None, [position.last_sold_on, order.day]))
+
+            now = timezone.now()
+            for row in [*changed_lots.values(), *positions.values()]:
+                row.updated_at = now
+            TaxLot.objects.bulk_create(new_lots)
+            TaxLot.objects.bulk_update(changed_lots.values(), ["remaining", "updated_at"])
+            LotDisposal.objects.bulk_create(disposals)
+            cls.objects.bulk_update(
+                positions.values(),
+                ["quantity", "cost_basis", "realized_pnl", "last_sold_on", "updated_at"],
+            )
+            for user_id, stock_id in sorted(stale):
+                cls.rebuild(user_id, stock_id)
+
+    @classmethod
+    def rebuild(cls, user_id, stock_id=None):
+        """Recreate the positions and lots of a user (or one stock) from their executed orders."""
+        scope = Q(user_id=user_id)
+        if stock_id is not None:
+            scope &= Q(stock_id=stock_id)
+        with db_transaction.atomic():
+            LotDisposal.all_objects.filter(lot__in=TaxLot.all_objects.filter(scope)).delete()
+            TaxLot.all_objects.filter(scope).delete()
+            cls.all_objects.filter(scope).delete()
+            orders = Order.objects.filter(
+                scope,
+                asset_type=Order.ASSET_STOCK,
+                status=Order.EXECUTED,
+                stock__isnull=False,
+            )
+            cls.apply_orders(sorted(orders, key=lambda o: (o.day, o.pk)))
+
+
+class TaxLot(SoftDeleteModel):
+    """Units bought by one BUY order, `remaining` of them not sold yet."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.PROTECT,
+        related_name="tax_lots",
+    )
+    stock = models.ForeignKey(
+        Stock,
+        on_delete=models.PROTECT,
+        related_name="tax_lots",
+    )
+    order = models.OneToOneField(
+        Order,
+        on_delete=models.PROTECT,
+        related_name="tax_lot",
+    )
+    acquired_on = models.DateField()
+    quantity = models.DecimalField(max_digits=14, decimal_places=4)
+    remaining = models.DecimalField(max_digits=14, decimal_places=4)
+    unit_cost = models.DecimalField(max_digits=14, decimal_places=4)
+
+    class Meta(SoftDeleteModel.Meta):
+        indexes = [
+            # Open lots only, in the order SELLs consume them
+            models.Index(
+                fields=["user", "stock", "acquired_on", "id"],
+                name="taxlot_open_idx",
+                condition=Q(remaining__gt=0, is_deleted=False),
+            ),
+        ]
+
+
+class LotDisposal(SoftDeleteModel):
+    """Part of a TaxLot closed by a SELL order, with the gain it realized."""
+    lot = models.ForeignKey(
+        TaxLot,
+        on_delete=models.PROTECT,
+        related_name="disposals",
+    )
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.PROTECT,
+        related_name="lot_disposals",
+    )
+    quantity = models.DecimalField(max_digits=14, decimal_places=4)
+    unit_price = models.DecimalField(max_digits=14, decimal_places=4)
+    realized_pnl = models.DecimalField(max_digits=18, decimal_places=4)
+    disposed_on = models.DateField()
+
+
+class CashLedgerEntry(SoftDeleteModel):
+    """
+    Append-only journal of every change to a user's cash.
+
+    Entries are written when a Transaction or a stock Order is stored, so the
+    balance no longer has to be rebuilt from the whole history: it is the
+    latest CashBalanceCheckpoint plus the sum of the entries after it.
+    """
+    DEPOSIT = Transaction.DEPOSIT
+    WITHDRAW = Transaction.WITHDRAW
+    BUY = Order.BUY
+    SELL = Order.SELL
+    REVERSAL = "REVERSAL"
+    ENTRY_TYPES = [
+        (DEPOSIT, "Deposit"),
+        (WITHDRAW, "Withdraw"),
+        (BUY, "Buy"),
+        (SELL, "Sell"),
+        (REVERSAL, "Reversal"),
+    ]
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.PROTECT,
+        related_name="cash_ledger",
+    )
+    entry_type = models.CharField(max_length=20, choices=ENTRY_TYPES)
+    # Signed: positive credits the user, negative debits
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    execution_date = models.DateField()
+
+    # The ledger keeps its own copy of amount and date, the links are for auditing
+    transaction = models.ForeignKey(
+        Transaction,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="ledger_entries",
+    )
+    order = models.ForeignKey(
+        Order,
+        null=True,
+        blank=True,
+        on_delete=models.SET_NULL,
+        related_name="ledger_entries",
+    )
+
+    class Meta(SoftDeleteModel.Meta):
+        indexes = [
+            models.Index(fields=["user", "id"], name="ledger_user_id_idx", condition=Q(is_deleted=False)),
+            models.Index(fields=["user", "execution_date"], name="ledger_user_date_idx", condition=Q(is_deleted=False)),
+        ]
+
+    @classmethod
+    def for_transaction(cls, t):
+        """Unsaved entry mirroring a Transaction, or None when it moves no cash."""
+        if not t.amount:
+            return None
+        amount = to_cents(t.amount)
+        return cls(
+            user_id=t.user_id,
+            entry_type=t.transaction_type,
+            amount=-amount if t.transaction_type == Transaction.WITHDRAW else amount,
+            execution_date=t.execution_date or t.created_at.date(),
+            transaction=t,
+        )
+
+    @classmethod
+    def for_order(cls, o):
+        """Unsaved entry mirroring a stock Order, or None when it moves no cash."""
+        if (
+            o.asset_type != Order.ASSET_STOCK
+            or o.status != Order.EXECUTED
+            or not o.quantity
+            or o.execution_price is None
+        ):
+            return None
+        amount = to_cents(Decimal(str(o.quantity)) * Decimal(str(o.execution_price)))
+        return cls(
+            user_id=o.user_id,
+            entry_type=o.side,
+            amount=-amount if o.side == Order.BUY else amount,
+            execution_date=o.execution_date or o.created_at.date(),
+            order=o,
+        )
+
+    @classmethod
+    def record(cls, entry):
+        if entry is None:
+            return None
+        with db_transaction.atomic():
+            # Entries of a user are written one at a time so that a checkpoint
+            # never skips an entry that was not committed yet
+            User.objects.select_for_update().filter(pk=entry.user_id).first()
+            entry.save()
+            CashBalanceCheckpoint.maybe_create(entry.user_id, entry)
+        return entry
+
+    @classmethod
+    def record_many(cls, entries):
+        """Write several entries with one insert and one checkpoint check per user."""
+        entries = [e for e in entries if e is not None]
+        if not entries:
+            return entries
+        with db_transaction.atomic():
+            user_ids = sorted({e.user_id for e in entries})
+            list(User.all_objects.select_for_update().filter(pk__in=user_ids).order_by("pk"))
+            cls.objects.bulk_create(entries)
+            last = {e.user_id: e for e in entries}
+            for user_id in user_ids:
+                CashBalanceCheckpoint.maybe_create(user_id, last[user_id])
+        return entries
+
+    @classmethod
+    def record_transaction(cls, t):
+        return cls.record(cls.for_transaction(t))
+
+    @classmethod
+    def record_order(cls, o):
+        return cls.record(cls.for_order(o))
+
+    @classmethod
+    def record_reversal(cls, entries):
+        """
+        Cancel the given entries, used when their source row is soft deleted.
+        The users' `money` moves by the same amounts, so the ledger still
+        reconciles with it.
+        """
+        with db_transaction.atomic():
+            reversals = [
+                cls.record(
+                    cls(
+                        user_id=e.user_id,
+                        entry_type=cls.REVERSAL,
+                        amount=-e.amount,
+                        execution_date=e.execution_date,
+                        transaction_id=e.transaction_id,
+                        order_id=e.order_id,
+                    )
+                )
+                for e in entries.exclude(entry_type=cls.REVERSAL)
+            ]
+            moved = defaultdict(Decimal)
+            for reversal in reversals:
+                moved[reversal.user_id] += reversal.amount
+            for user_id, amount in moved.items():
+                User.all_objects.filter(pk=user_id).update(money=F("money") + amount, updated_at=timezone.now())
+        return reversals
+
+    @classmethod
+    def last_entry_id(cls, user_id):
+        """Id of the newest entry of a user, it changes whenever their cash or holdings do."""
+        return (
+            cls.objects.filter(user_id=user_id)
+            .order_by("-id")
+            .values_list("id", flat=True)
+            .first()
+        ) or 0
+
+    @classmethod
+    def balance(cls, user_id, as_of=None):
+        """
+        Cash of a user, optionally only counting entries executed up to `as_of`.
+
+        Reads the latest checkpoint and adds the entries written after it. For
+        an `as_of` date, entries before the checkpoint that were executed after
+        that date are taken back out.
+        """
+        checkpoint = CashBalanceCheckpoint.latest_for(user_id)
+        base = checkpoint.balance if checkpoint else Decimal("0.00")
+        last_entry_id = checkpoint.last_entry_id if checkpoint else 0
+
+        entries = cls.objects.filter(user_id=user_id)
+        if as_of is None:
+            tail = entries.filter(id__gt=last_entry_id).aggregate(total=Sum("amount"))
+            return base + (tail["total"] or Decimal("0.00"))
+
+        tail = entries.filter(
+            Q(id__gt=last_entry_id) | Q(execution_date__gt=as_of)
+        ).aggregate(
+            later=Sum("amount", filter=Q(id__gt=last_entry_id, execution_date__lte=as_of)),
+            undo=Sum("amount", filter=Q(id__lte=last_entry_id, execution_date__gt=as_of)),
+        )
+        return base + (tail["later"] or Decimal("0.00")) - (tail["undo"] or Decimal("0.00"))
+
+
+class CashBalanceCheckpoint(SoftDeleteModel):
+    """Running cash balance of a user including every ledger entry up to `last_entry_id`."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.PROTECT,
+        related_name="cash_checkpoints",
+    )
+    last_entry_id = models.BigIntegerField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta(SoftDeleteModel.Meta):
+        indexes = [
+            models.Index(fields=["user", "-last_entry_id"], name="checkpoint_user_entry_idx", condition=Q(is_deleted=False)),
+        ]
+
+    @classmethod
+    def latest_for(cls, user_id):
+        return (
+            cls.objects.filter(user_id=user_id)
+            .order_by("-last_entry_id")
+            .first()
+        )
+
+    @classmethod
+    def maybe_create(cls, user_id, entry):
+        """Store a new checkpoint once enough entries piled up after the last one."""
+        checkpoint = cls.latest_for(user_id)
+        last_entry_id = checkpoint.last_entry_id if checkpoint else 0
+        tail = CashLedgerEntry.objects.filter(
+            user_id=user_id,
+            id__gt=last_entry_id,
+            id__lte=entry.pk,
+        ).aggregate(count=models.Count("id"), total=Sum("amount"))
+
+        if tail["count"] < settings.CASH_LEDGER_CHECKPOINT_INTERVAL:
+            return None
+
+        base = checkpoint.balance if checkpoint else Decimal("0.00")
+        return cls.objects.create(
+            user_id=user_id,
+            last_entry_id=entry.pk,
+            balance=base + tail["total"],
+        )
+
+class ArchivedRecord(models.Model):
+    """
+    Cold copy of a soft deleted row removed from its table by `archive_deleted`.
+
+    `payload` holds the row's fields as Django's python serializer outputs
+    them, so `restore_archived` can put the row back with its original id.
+    """
+    model = models.CharField(max_length=100)
+    object_id = models.BigIntegerField()
+    payload = models.JSONField(encoder=DjangoJSONEncoder)
+    deleted_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["model", "object_id"], name="archive_model_object_uniq"),
+        ]
+
+
+class IdempotencyKey(models.Model):
+    """
+    Response stored for an `Idempotency-Key` header, so a retried request is
+    answered from here instead of running again.
+
+    `fingerprint` is a hash of the request body: reusing a key with a
+    different body is rejected.
+    """
+    scope = models.CharField(max_length=50)
+    key = models.CharField(max_length=255)
+    fingerprint = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    response_body = models.JSONField(encoder=DjangoJSONEncoder, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["scope", "key"], name="idempotency_scope_key_uniq"),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="idempotency_expires_idx"),
+        ]
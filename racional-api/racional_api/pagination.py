@@ -0,0 +1,10 @@
+from rest_framework.pagination import LimitOffsetPagination
+
+
+class OptionalLimitOffsetPagination(LimitOffsetPagination):
+    """
+    `?limit=&offset=` pagination that only kicks in when `limit` is given, so
+    clients reading the plain list keep working.
+    """
+    default_limit = None
+    max_limit = 500
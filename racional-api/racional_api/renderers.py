@@ -0,0 +1,105 @@
+"""
+JSON renderer of the API and columnar renderers for time series endpoints.
+
+`FastJSONRenderer` is the default (see `REST_FRAMEWORK` in settings): the
+same output as DRF's `JSONRenderer`, encoded by orjson.
+
+Views that support them return a flat dict whose series are NumPy arrays of
+the same length (one per column) next to scalar metadata. The default JSON
+renderer gets rows built by the view instead; these renderers ship the
+arrays as they are. NumPy is imported by the renderers when they run, so
+loading this module at startup does not load it.
+"""
+import io
+import sys
+from decimal import Decimal
+
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_SERIALIZE_NUMPY
+
+
+def encode_default(obj, encoder=JSONEncoder()):
+    """What orjson leaves to Python: Decimals as exact strings, the rest as DRF encodes it."""
+    if isinstance(obj, Decimal):
+        return str(obj)
+    return encoder.default(obj)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    `JSONRenderer` encoded with orjson.
+
+    Serializers already hand over strings for decimals and datetimes, so the
+    output is byte for byte DRF's compact one. Decimals reaching the renderer
+    are written as exact strings instead of floats, datetimes and the other
+    types orjson does not know go through DRF's encoder. Requests for an
+    indented response (`Accept: application/json; indent=4`) fall back to DRF.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=encode_default, option=ORJSON_OPTIONS)
+
+
+class ColumnarJSONRenderer(FastJSONRenderer):
+    """Parallel arrays in JSON: `{"date": [...], "close": [...], ...}`. NaN becomes null."""
+
+    media_type = "application/vnd.racional.columnar+json"
+    format = "columnar"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if isinstance(data, dict):
+            data = {key: column_to_list(value) for key, value in data.items()}
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class NpzRenderer(BaseRenderer):
+    """
+    NumPy `.npz` archive, one array per key, readable with `numpy.load`.
+
+    Dates are datetime64[D] arrays and scalar metadata 0-d arrays.
+    """
+
+    media_type = "application/x-npz"
+    format = "npz"
+    charset = None
+    render_style = "binary"
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        if not isinstance(data, dict):
+            data = {"data": data}
+        import numpy as np
+
+        buffer = io.BytesIO()
+        np.savez(buffer, **{key: np.asarray(value) for key, value in data.items()})
+        return buffer.getvalue()
+
+
+COLUMNAR_RENDERERS = [ColumnarJSONRenderer, NpzRenderer]
+SERIES_RENDERER_CLASSES = [*api_settings.DEFAULT_RENDERER_CLASSES, *COLUMNAR_RENDERERS]
+
+
+def wants_columns(request):
+    """Whether the negotiated renderer takes columns instead of rows."""
+    return isinstance(getattr(request, "accepted_renderer", None), tuple(COLUMNAR_RENDERERS))
+
+
+def column_to_list(value):
+    # Without NumPy loaded nothing can be an array
+    np = sys.modules.get("numpy")
+    if np is None or not isinstance(value, np.ndarray):
+        return value
+    if value.dtype.kind == "M":
+        return np.datetime_as_string(value).tolist()
+    if value.dtype.kind == "f" and np.isnan(value).any():
+        return np.where(np.isnan(value), None, value).tolist()
+    return value.tolist()
@@ -0,0 +1,43 @@
+"""
+OpenAPI schema served from memory instead of generated on every request.
+
+The Docker image builds it with `manage.py spectacular` (see Dockerfile) into
+OPENAPI_SCHEMA_FILE. When the file is missing, as with the source mounted
+over /code by docker compose, the first request generates it and the process
+keeps it, so a restart (or `--reload`) picks up changes to the endpoints.
+"""
+import json
+
+from django.conf import settings
+from drf_spectacular.views import SpectacularAPIView
+from rest_framework.response import Response
+
+_schema = None
+
+
+def load_schema(generate):
+    """The prebuilt schema, or `generate()` the first time when there is none."""
+    global _schema
+    if _schema is None:
+        try:
+            with open(settings.OPENAPI_SCHEMA_FILE) as schema_file:
+                _schema = json.load(schema_file)
+        except FileNotFoundError:
+            _schema = generate()
+    return _schema
+
+
+class PrebuiltSchemaView(SpectacularAPIView):
+    """`SpectacularAPIView` answering from `load_schema`, YAML or JSON as negotiated."""
+
+    def _get_schema_response(self, request):
+        version = self.api_version or request.version or self._get_version_parameter(request)
+
+        def generate():
+            generator = self.generator_class(urlconf=self.urlconf, api_version=version, patterns=self.patterns)
+            return generator.get_schema(request=request, public=self.serve_public)
+
+        return Response(
+            data=load_schema(generate),
+            headers={"Content-Disposition": f'inline; filename="{self._get_filename(request, version)}"'},
+        )
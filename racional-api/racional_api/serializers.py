@@ -1,7 +1,24 @@
 from rest_framework import serializers
-from .models import Stock, StockPrice, User, Transaction, Order, Portfolio, PortfolioComponent, Stock
+from rest_framework.validators import UniqueValidator
+from .execution import user_lock
+from .models import Stock, StockDailyStats, StockPrice, User, Transaction, Order, Portfolio, PortfolioComponent, PortfolioVersion, Stock, to_cents
 from decimal import ROUND_DOWN, Decimal
+from django.conf import settings
+from django.db import transaction as db_transaction
 from django.db.models import Sum, Q
+from django.utils import timezone
+
+class ReadOnlyRowSerializer(serializers.Serializer):
+    """
+    Read-only serializer for list endpoints, fed with `.values()` dicts (see
+    `rows`) instead of model instances, or with instances when nesting needs them.
+    """
+
+    @classmethod
+    def rows(cls, queryset):
+        """`queryset` as `.values()` dicts holding just the fields of this serializer."""
+        return queryset.values(*(field.source for field in cls().fields.values()))
+
 
 class UserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -17,6 +34,21 @@ class UserSerializer(serializers.ModelSerializer):
             "updated_at",
         ]
         read_only_fields = ["id", "created_at", "updated_at", "money"]
+        extra_kwargs = {
+            # The column is unique across deleted users too
+            "email": {"validators": [UniqueValidator(queryset=User.all_objects.all())]},
+        }
+
+
+class UserReadSerializer(ReadOnlyRowSerializer):
+    id = serializers.IntegerField()
+    first_name = serializers.CharField()
+    last_name = serializers.CharField()
+    phone_number = serializers.CharField()
+    email = serializers.EmailField()
+    money = serializers.DecimalField(max_digits=14, decimal_places=2)
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
 
 
 class DepositSerializer(serializers.ModelSerializer):
@@ -56,27 +88,40 @@ class DepositSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("transaction_type is required.")
 
         transaction_type_norm = self._normalize_transaction_type(transaction_type_raw)
-        user = User.objects.get(pk=user_id)
-        amount = data.get("amount", 0)
-        if transaction_type_norm == Transaction.DEPOSIT:
-            user.money += amount
-        elif transaction_type_norm == Transaction.WITHDRAW:
-            user.money -= amount
+        with user_lock(user_id):
+            user = User.objects.get(pk=user_id)
+            amount = data.get("amount", 0)
+            if transaction_type_norm == Transaction.DEPOSIT:
+                user.money += amount
+            elif transaction_type_norm == Transaction.WITHDRAW:
+                # Checked again under the lock, a concurrent withdrawal may have run first
+                if amount > user.money:
+                    raise serializers.ValidationError({"amount": ["Insufficient funds."]})
+                user.money -= amount
 
-        user.save(update_fields=["money", "updated_at"])
-        return Transaction.objects.create(
-            user=user,
-            transaction_type=transaction_type_norm,
-            **data,
-        )
+            user.save(update_fields=["money", "updated_at"])
+            return Transaction.objects.create(
+                user=user,
+                transaction_type=transaction_type_norm,
+                **data,
+            )
+
+
+class TransactionReadSerializer(ReadOnlyRowSerializer):
+    id = serializers.IntegerField()
+    transaction_type = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=14, decimal_places=2)
+    created_at = serializers.DateTimeField()
+    updated_at = serializers.DateTimeField()
+    execution_date = serializers.DateField()
 
 
 class StockOrderSerializer(serializers.ModelSerializer):
     user_id = serializers.PrimaryKeyRelatedField(
-        source="user", queryset=User.objects.filter(is_deleted=False), write_only=True
+        source="user", queryset=User.objects.all(), write_only=True
     )
     stock_id = serializers.PrimaryKeyRelatedField(
-        source="stock", queryset=Stock.objects.filter(is_deleted=False), write_only=True
+        source="stock", queryset=Stock.objects.all(), write_only=True
     )
 
     class Meta:
@@ -89,9 +134,11 @@ class StockOrderSerializer(serializers.ModelSerializer):
             "quantity",
             "execution_date",
             "execution_price",
+            "status",
+            "failure_reason",
             "created_at",
         ]
-        read_only_fields = ["asset_type", "execution_price", "created_at"]
+        read_only_fields = ["asset_type", "execution_price", "status", "failure_reason", "created_at"]
 
     def validate(self, data):
         data["asset_type"] = Order.ASSET_STOCK
@@ -104,23 +151,37 @@ class StockOrderSerializer(serializers.ModelSerializer):
         if side not in (Order.BUY, Order.SELL):
             raise serializers.ValidationError("Side must be BUY or SELL.")
 
+        # The price and the holdings are looked up on this date
+        if data.get("execution_date") is None:
+            data["execution_date"] = timezone.localdate()
+
         return data
 
     def create(self, data):
         validated_data = self.validate(data)
-        
+
+        # Queued mode: funds and holdings are checked by the order workers
+        if settings.ORDER_EXECUTION_MODE == "queued":
+            return Order.objects.create(**validated_data, status=Order.PENDING)
+
+        # Orders of one user run one at a time, the balance is read under the lock
+        with user_lock(validated_data["user"].pk):
+            validated_data["user"].refresh_from_db(fields=["money"])
+            return self.execute(validated_data)
+
+    def execute(self, validated_data):
         stock = validated_data["stock"]
         stock_price = StockPrice.objects.filter(
             stock=stock,
             date__lte=validated_data["execution_date"],
         ).order_by('-date').first()
         
-        user =  validated_data["user"]
+        user = validated_data["user"]
         price = Decimal(str(stock_price.value))
 
         # Check the order type and validate funds or stock quantity
+        total_cost = to_cents(price * validated_data["quantity"])
         if validated_data["side"] == Order.BUY:
-            total_cost = price * validated_data["quantity"]
             if user.money < total_cost:
                 raise serializers.ValidationError("Insufficient funds for this purchase.")
 
@@ -130,6 +191,7 @@ class StockOrderSerializer(serializers.ModelSerializer):
             totals = Order.objects.filter(
                 user=user,
                 stock=stock,
+                status=Order.EXECUTED,
                 execution_date__lte=validated_data["execution_date"],
             ).aggregate(
                 total_bought=Sum('quantity', filter=Q(side=Order.BUY)),
@@ -141,30 +203,20 @@ class StockOrderSerializer(serializers.ModelSerializer):
             if net_amount < validated_data["quantity"]:
                 raise serializers.ValidationError("Insufficient stock quantity to sell. Amount of stock available: {}".format(net_amount))
             
-            user.money += price * validated_data["quantity"]
+            user.money += total_cost
             user.save(update_fields=["money", "updated_at"])
             
         validated_data["execution_price"] = price
-        
-        # Execute the order and catch if fails to rollback money changes
-        try:
-            return Order.objects.create(**validated_data)
-        except Exception as e:
-            if validated_data["side"] == Order.BUY:
-                user.money += price * validated_data["quantity"]
-                user.save(update_fields=["money", "updated_at"])
-            elif validated_data["side"] == Order.SELL:
-                user.money -= price * validated_data["quantity"]
-                user.save(update_fields=["money", "updated_at"])
 
-            raise e
+        # Runs inside `user_lock`, a failure here rolls the money change back too
+        return Order.objects.create(**validated_data)
 
 
 class PortfolioComponentInputSerializer(serializers.Serializer):
     symbol = serializers.SlugRelatedField(
         source="stock",
         slug_field="symbol",
-        queryset=Stock.objects.filter(is_deleted=False),
+        queryset=Stock.objects.all(),
     )
     weight = serializers.DecimalField(
         max_digits=6,
@@ -176,7 +228,7 @@ class PortfolioComponentInputSerializer(serializers.Serializer):
 class PortfolioCreateSerializer(serializers.ModelSerializer):
     components = PortfolioComponentInputSerializer(many=True)
     user_id = serializers.PrimaryKeyRelatedField(
-        source="user", queryset=User.objects.filter(is_deleted=False), write_only=True
+        source="user", queryset=User.objects.all(), write_only=True
     )
     
     class Meta:
@@ -215,25 +267,163 @@ class PortfolioCreateSerializer(serializers.ModelSerializer):
                 for comp_data in components_data
             ]
         )
+        PortfolioVersion.record(portfolio)
 
         return portfolio
 
 
+class PortfolioComponentReadSerializer(ReadOnlyRowSerializer):
+    symbol = serializers.CharField(source="stock.symbol")
+    weight = serializers.DecimalField(max_digits=6, decimal_places=4)
+
+
+class PortfolioReadSerializer(ReadOnlyRowSerializer):
+    """Listing shape of `PortfolioCreateSerializer`, for portfolios prefetched with `components__stock`."""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    description = serializers.CharField()
+    risk = serializers.CharField()
+    components = PortfolioComponentReadSerializer(many=True)
+
+
 class PortfolioMetadataSerializer(serializers.ModelSerializer):
     class Meta:
         model = Portfolio
         fields = ["id", "name", "description", "risk"]
         read_only_fields = ["id"]
 
+class ComponentWeightInputSerializer(serializers.Serializer):
+    symbol = serializers.CharField(max_length=20)
+    weight = serializers.DecimalField(
+        max_digits=6,
+        decimal_places=4,
+        min_value=Decimal("0.001"),
+    )
+
+
+class PortfolioComponentsUpdateSerializer(serializers.Serializer):
+    """
+    Replace the composition of a portfolio with `components`.
+
+    Symbols are resolved with one query (not one per component like
+    `PortfolioComponentInputSerializer`) and the change is applied as a diff
+    against the current rows, so the number of queries does not grow with
+    the number of components.
+    """
+    id = serializers.IntegerField(read_only=True)
+    components = ComponentWeightInputSerializer(many=True)
+    added = serializers.ListField(child=serializers.CharField(), read_only=True)
+    updated = serializers.ListField(child=serializers.CharField(), read_only=True)
+    removed = serializers.ListField(child=serializers.CharField(), read_only=True)
+
+    def validate_components(self, components):
+        if not components:
+            raise serializers.ValidationError("Portfolio must have at least one component.")
+
+        symbols = [c["symbol"] for c in components]
+        if len(symbols) != len(set(symbols)):
+            raise serializers.ValidationError("Each stock can appear only once in the portfolio.")
+
+        stock_ids = dict(Stock.objects.filter(symbol__in=symbols).values_list("symbol", "id"))
+        unknown = [symbol for symbol in symbols if symbol not in stock_ids]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown symbols: {', '.join(unknown)}.")
+
+        total_weight = sum((c["weight"] for c in components), Decimal("0"))
+        if total_weight != Decimal("1.0"):
+            raise serializers.ValidationError(
+                f"Weights must sum to 1. Current sum is {total_weight}."
+            )
+
+        return {stock_ids[c["symbol"]]: c["weight"] for c in components}
+
+    def update(self, portfolio, validated_data):
+        target = validated_data["components"]
+        now = timezone.now()
+
+        with db_transaction.atomic():
+            # Concurrent edits of the same portfolio apply one after the other
+            Portfolio.objects.select_for_update().filter(pk=portfolio.pk).first()
+            rows = PortfolioComponent.all_objects.filter(portfolio=portfolio).values_list(
+                "stock_id", "stock__symbol", "weight", "is_deleted"
+            )
+            current, symbols = {}, {}
+            for stock_id, symbol, weight, is_deleted in rows:
+                current[stock_id] = (weight, is_deleted)
+                symbols[stock_id] = symbol
+
+            changed = [
+                PortfolioComponent(
+                    portfolio=portfolio,
+                    stock_id=stock_id,
+                    weight=weight,
+                    is_deleted=False,
+                    created_at=now,
+                    updated_at=now,
+                )
+                for stock_id, weight in target.items()
+                if current.get(stock_id) != (weight, False)
+            ]
+            removed = [
+                stock_id
+                for stock_id, (_, is_deleted) in current.items()
+                if not is_deleted and stock_id not in target
+            ]
+            if changed or removed:
+                # The composition up to now, for portfolios created before versioning
+                PortfolioVersion.record_initial(portfolio)
+
+            # New rows are inserted, rows that exist (deleted or not) are
+            # updated in place, as (portfolio, stock) is unique
+            PortfolioComponent.all_objects.bulk_create(
+                changed,
+                update_conflicts=True,
+                unique_fields=["portfolio", "stock"],
+                update_fields=["weight", "is_deleted", "updated_at"],
+            )
+            PortfolioComponent.objects.filter(portfolio=portfolio, stock_id__in=removed).update(
+                is_deleted=True, updated_at=now
+            )
+
+            if changed or removed:
+                PortfolioVersion.record(portfolio)
+
+        revived_or_new = [c.stock_id for c in changed if current.get(c.stock_id, (None, True))[1]]
+        self.diff = {
+            "added": revived_or_new,
+            "updated": [c.stock_id for c in changed if c.stock_id not in revived_or_new],
+            "removed": [symbols[stock_id] for stock_id in removed],
+        }
+        return portfolio
+
+    def to_representation(self, portfolio):
+        components = list(
+            PortfolioComponent.objects.filter(portfolio=portfolio)
+            .order_by("stock__symbol")
+            .values_list("stock_id", "stock__symbol", "weight")
+        )
+        symbols = {stock_id: symbol for stock_id, symbol, _ in components}
+        diff = getattr(self, "diff", {})
+        return {
+            "id": portfolio.pk,
+            "components": [
+                {"symbol": symbol, "weight": str(weight)} for _, symbol, weight in components
+            ],
+            "added": sorted(symbols[stock_id] for stock_id in diff.get("added", [])),
+            "updated": sorted(symbols[stock_id] for stock_id in diff.get("updated", [])),
+            "removed": sorted(diff.get("removed", [])),
+        }
+
+
 class PortfolioInvestSerializer(serializers.Serializer):
     user_id = serializers.PrimaryKeyRelatedField(
         source="user",
-        queryset=User.objects.filter(is_deleted=False),
+        queryset=User.objects.all(),
         write_only=True,
     )
     portfolio_id = serializers.PrimaryKeyRelatedField(
         source="portfolio",
-        queryset=Portfolio.objects.filter(is_deleted=False),
+        queryset=Portfolio.objects.all(),
         write_only=True,
     )
     amount = serializers.DecimalField(
@@ -252,7 +442,6 @@ class PortfolioInvestSerializer(serializers.Serializer):
 
         components = PortfolioComponent.objects.filter(
             portfolio=portfolio,
-            is_deleted=False,
         ).select_related("stock")
 
         if not components.exists():
@@ -262,6 +451,15 @@ class PortfolioInvestSerializer(serializers.Serializer):
         return attrs
 
     def create(self, validated_data):
+        user = validated_data["user"]
+        # Same lock as stock orders, funds are checked again with the current balance
+        with user_lock(user.pk):
+            user.refresh_from_db(fields=["money"])
+            if user.money < validated_data["amount"]:
+                raise serializers.ValidationError("User does not have enough money to invest that amount.")
+            return self.invest(validated_data)
+
+    def invest(self, validated_data):
         user = validated_data["user"]
         portfolio = validated_data["portfolio"]
         amount = validated_data["amount"]
@@ -311,13 +509,17 @@ class PortfolioInvestSerializer(serializers.Serializer):
             )
             orders.append(order)
 
-        user.money -= amount
-        user.save(update_fields=["money"])
+        # Only debit what the orders actually cost, the rounding leftovers stay as cash
+        amount_invested = sum(
+            (to_cents(o.quantity * o.execution_price) for o in orders), Decimal("0.00")
+        )
+        user.money -= amount_invested
+        user.save(update_fields=["money", "updated_at"])
 
         return {
             "user_id": user.id,
             "portfolio_id": portfolio.id,
-            "amount_invested": amount,
+            "amount_invested": amount_invested,
             "orders": orders,
         }
 
@@ -339,7 +541,7 @@ class PortfolioInvestSerializer(serializers.Serializer):
         }
 
 
-class PositionSerializer(serializers.Serializer):
+class PositionSerializer(ReadOnlyRowSerializer):
     symbol = serializers.CharField()
     quantity = serializers.DecimalField(max_digits=18, decimal_places=4)
     price = serializers.DecimalField(max_digits=18, decimal_places=4)
@@ -348,13 +550,44 @@ class PositionSerializer(serializers.Serializer):
 
 class PortfolioTotalSerializer(serializers.Serializer):
     user_id = serializers.IntegerField()
+    as_of = serializers.DateField(allow_null=True)
     cash = serializers.DecimalField(max_digits=18, decimal_places=2)
     stocks_total = serializers.DecimalField(max_digits=18, decimal_places=2)
     portfolio_total = serializers.DecimalField(max_digits=18, decimal_places=2)
     positions = PositionSerializer(many=True)
 
 
-class MovementSerializer(serializers.Serializer):
+class TaxLotSerializer(serializers.Serializer):
+    order_id = serializers.IntegerField()
+    acquired_on = serializers.DateField()
+    quantity = serializers.DecimalField(max_digits=18, decimal_places=4)
+    unit_cost = serializers.DecimalField(max_digits=18, decimal_places=4)
+    unrealized_pnl = serializers.DecimalField(max_digits=18, decimal_places=2, allow_null=True)
+
+
+class PositionPnlSerializer(serializers.Serializer):
+    symbol = serializers.CharField()
+    quantity = serializers.DecimalField(max_digits=18, decimal_places=4)
+    average_cost = serializers.DecimalField(max_digits=18, decimal_places=4, allow_null=True)
+    cost_basis = serializers.DecimalField(max_digits=18, decimal_places=2)
+    price = serializers.DecimalField(max_digits=18, decimal_places=4, allow_null=True)
+    market_value = serializers.DecimalField(max_digits=18, decimal_places=2, allow_null=True)
+    unrealized_pnl = serializers.DecimalField(max_digits=18, decimal_places=2, allow_null=True)
+    realized_pnl = serializers.DecimalField(max_digits=18, decimal_places=2)
+    lots = TaxLotSerializer(many=True)
+
+
+class ProfitAndLossSerializer(serializers.Serializer):
+    user_id = serializers.IntegerField()
+    cost_basis = serializers.DecimalField(max_digits=18, decimal_places=2)
+    market_value = serializers.DecimalField(max_digits=18, decimal_places=2)
+    unrealized_pnl = serializers.DecimalField(max_digits=18, decimal_places=2)
+    realized_pnl = serializers.DecimalField(max_digits=18, decimal_places=2)
+    total_pnl = serializers.DecimalField(max_digits=18, decimal_places=2)
+    positions = PositionPnlSerializer(many=True)
+
+
+class MovementSerializer(ReadOnlyRowSerializer):
     type = serializers.CharField()
     subtype = serializers.CharField()
     asset_type = serializers.CharField(allow_null=True)
@@ -366,3 +599,143 @@ class MovementSerializer(serializers.Serializer):
     value = serializers.DecimalField(max_digits=18, decimal_places=2, allow_null=True)
     date = serializers.DateField()
     created_at = serializers.DateTimeField()
+
+
+class PerformanceSerializer(serializers.Serializer):
+    time_weighted_return = serializers.FloatField()
+    annualized_volatility = serializers.FloatField()
+    max_drawdown = serializers.FloatField()
+    sharpe_ratio = serializers.FloatField(allow_null=True)
+
+
+class PortfolioAnalyticsSerializer(serializers.Serializer):
+    portfolio_id = serializers.IntegerField()
+    start = serializers.DateField(allow_null=True)
+    end = serializers.DateField(allow_null=True)
+    days = serializers.IntegerField()
+    basket = PerformanceSerializer()
+    holdings = PerformanceSerializer(allow_null=True)
+
+
+class PortfolioSimulationSerializer(serializers.Serializer):
+    years = serializers.IntegerField(min_value=1, max_value=settings.SIMULATION_MAX_YEARS, default=10)
+    initial_amount = serializers.DecimalField(max_digits=14, decimal_places=2, min_value=Decimal("0"))
+    monthly_contribution = serializers.DecimalField(
+        max_digits=14, decimal_places=2, min_value=Decimal("0"), default=Decimal("0.00")
+    )
+    paths = serializers.IntegerField(min_value=100, max_value=settings.SIMULATION_MAX_PATHS, default=10_000)
+    method = serializers.ChoiceField(choices=["bootstrap", "normal"], default="bootstrap")
+    seed = serializers.IntegerField(min_value=0, required=False, allow_null=True, default=None)
+
+    def validate(self, attrs):
+        if not attrs["initial_amount"] and not attrs["monthly_contribution"]:
+            raise serializers.ValidationError("Either initial_amount or monthly_contribution must be positive.")
+        return attrs
+
+
+class SimulationBandSerializer(serializers.Serializer):
+    year = serializers.IntegerField()
+    contributed = serializers.FloatField()
+    p5 = serializers.FloatField()
+    p25 = serializers.FloatField()
+    p50 = serializers.FloatField()
+    p75 = serializers.FloatField()
+    p95 = serializers.FloatField()
+
+
+class PortfolioSimulationResultSerializer(serializers.Serializer):
+    portfolio_id = serializers.IntegerField()
+    risk = serializers.CharField()
+    method = serializers.CharField()
+    paths = serializers.IntegerField()
+    years = serializers.IntegerField()
+    initial_amount = serializers.DecimalField(max_digits=14, decimal_places=2)
+    monthly_contribution = serializers.DecimalField(max_digits=14, decimal_places=2)
+    history_days = serializers.IntegerField()
+    annual_return = serializers.FloatField()
+    annual_volatility = serializers.FloatField()
+    bands = SimulationBandSerializer(many=True)
+    mean_final_value = serializers.FloatField()
+    probability_of_loss = serializers.FloatField()
+
+
+class CompositionWeightSerializer(serializers.Serializer):
+    stock_id = serializers.IntegerField()
+    symbol = serializers.CharField()
+    weight = serializers.DecimalField(max_digits=6, decimal_places=4)
+
+
+class PortfolioCompositionSerializer(serializers.Serializer):
+    portfolio_id = serializers.IntegerField()
+    date = serializers.DateField()
+    valid_from = serializers.DateField(allow_null=True)
+    valid_to = serializers.DateField(allow_null=True)
+    components = CompositionWeightSerializer(many=True)
+
+
+class StockDailyStatsSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = StockDailyStats
+        fields = [
+            "date",
+            "close",
+            "daily_return",
+            "log_return",
+            "mean_20",
+            "volatility_20",
+            "mean_60",
+            "volatility_60",
+            "mean_252",
+            "volatility_252",
+        ]
+
+
+class StockSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Stock
+        fields = ["id", "symbol", "name"]
+
+
+class PricePointSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    open = serializers.FloatField()
+    high = serializers.FloatField()
+    low = serializers.FloatField()
+    close = serializers.FloatField()
+
+
+class PriceHistorySerializer(serializers.Serializer):
+    symbol = serializers.CharField()
+    interval = serializers.ChoiceField(choices=["day", "week", "month"])
+    points = PricePointSerializer(many=True)
+
+
+class OrderQueueStatsSerializer(serializers.Serializer):
+    pending = serializers.IntegerField()
+    oldest_pending_seconds = serializers.FloatField(allow_null=True)
+    window_seconds = serializers.IntegerField()
+    executed = serializers.IntegerField()
+    failed = serializers.IntegerField()
+    executed_per_second = serializers.FloatField()
+
+
+class DashboardUserSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    first_name = serializers.CharField()
+    last_name = serializers.CharField()
+    email = serializers.EmailField()
+
+
+class EvolutionPointSerializer(serializers.Serializer):
+    date = serializers.DateField()
+    cash = serializers.FloatField()
+    stocks_value = serializers.FloatField()
+    total = serializers.FloatField()
+
+
+class DashboardSerializer(serializers.Serializer):
+    """Sections left out with `?include=` are not in the response."""
+    user = DashboardUserSerializer()
+    total = PortfolioTotalSerializer(required=False)
+    movements = MovementSerializer(many=True, required=False)
+    evolution = EvolutionPointSerializer(many=True, required=False)
@@ -0,0 +1,142 @@
+"""
+Monte Carlo projection of a portfolio's value.
+
+The history is the daily return of the portfolio's current basket (rebalanced
+every day to its weights, as in `analytics`) over the days all its stocks
+have a price. Each path draws its months from that history: by default the
+log returns of a month's trading days resampled with replacement
+(bootstrap), or with `method="normal"` a normal log return with the
+history's mean and volatility. Contributions are added at the end of every
+month.
+
+Paths are simulated in chunks of SIMULATION_CHUNK_PATHS with whole array
+operations, no loop over paths or months. With SIMULATION_PROCESSES > 1 the
+chunks run on a process pool. Every chunk gets its own seed spawned from the
+request's, so a seeded projection is the same however it ran. Only NumPy is
+imported at the top: pool workers never load Django.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+METHODS = ("bootstrap", "normal")
+PERCENTILES = (5, 25, 50, 75, 95)
+MONTHS_PER_YEAR = 12
+
+
+def basket_history(portfolio):
+    """Daily log returns of the portfolio's current basket, over the days all its stocks have a price."""
+    from .analytics import basket_returns, price_matrix
+
+    weights = dict(portfolio.components.values_list("stock_id", "weight"))
+    stock_ids = sorted(weights)
+    _, prices = price_matrix(stock_ids)
+    # Prices are carried forward, only days before a stock's first price are NaN
+    prices = prices[~np.isnan(prices).any(axis=1)]
+    if len(prices) < 2:
+        return np.empty(0)
+    return np.log1p(basket_returns(prices, [float(weights[stock_id]) for stock_id in stock_ids]))
+
+
+def simulate_chunk(log_returns, years, initial, contribution, paths, method, seed, days_per_month):
+    """Value of `paths` paths at the start and at the end of every year, a (paths x years + 1) matrix."""
+    rng = np.random.default_rng(seed)
+    months = years * MONTHS_PER_YEAR
+    if method == "bootstrap":
+        draws = rng.integers(0, len(log_returns), size=(paths, months, days_per_month))
+        monthly = log_returns[draws].sum(axis=2)
+    else:
+        monthly = rng.normal(
+            log_returns.mean() * days_per_month,
+            log_returns.std(ddof=1) * np.sqrt(days_per_month),
+            size=(paths, months),
+        )
+
+    # Log growth since the start at the end of each month. A contribution
+    # added at the end of month k grows by e^(G_m - G_k) until month m
+    growth = np.cumsum(monthly, axis=1)
+    values = np.exp(growth) * (initial + contribution * np.cumsum(np.exp(-growth), axis=1))
+    return np.column_stack([np.full(paths, float(initial)), values[:, MONTHS_PER_YEAR - 1 :: MONTHS_PER_YEAR]])
+
+
+_pool = None
+
+
+def get_pool(processes):
+    """Process pool shared by the simulations of this process, started on first use."""
+    global _pool
+    if _pool is None or _pool._max_workers != processes:
+        if _pool is not None:
+            _pool.shutdown()
+        # Spawned, forking a server with threads and open connections is unsafe
+        _pool = ProcessPoolExecutor(processes, mp_context=multiprocessing.get_context("spawn"))
+    return _pool
+
+
+def simulate(log_returns, years, initial, contribution, paths, method="bootstrap", seed=None, processes=1):
+    """Values of `paths` paths at the start and at the end of every year (see `simulate_chunk`)."""
+    from django.conf import settings
+
+    days_per_month = settings.ANALYTICS_PERIODS_PER_YEAR // MONTHS_PER_YEAR
+    chunk_paths = settings.SIMULATION_CHUNK_PATHS
+    sizes = [min(chunk_paths, paths - start) for start in range(0, paths, chunk_paths)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    chunks = [
+        (log_returns, years, float(initial), float(contribution), size, method, chunk_seed, days_per_month)
+        for size, chunk_seed in zip(sizes, seeds)
+    ]
+    if processes > 1 and len(chunks) > 1:
+        results = get_pool(processes).map(simulate_chunk, *zip(*chunks))
+    else:
+        results = (simulate_chunk(*chunk) for chunk in chunks)
+    return np.concatenate(list(results))
+
+
+def simulate_portfolio(portfolio, years, initial_amount, monthly_contribution, paths, method="bootstrap", seed=None):
+    """
+    Percentile bands of the portfolio's projected value at the end of every
+    year, or None when its stocks share less than a month of price history.
+    """
+    from django.conf import settings
+
+    log_returns = basket_history(portfolio)
+    if len(log_returns) < settings.ANALYTICS_PERIODS_PER_YEAR // MONTHS_PER_YEAR:
+        return None
+
+    values = simulate(
+        log_returns,
+        years,
+        initial_amount,
+        monthly_contribution,
+        paths,
+        method,
+        seed,
+        settings.SIMULATION_PROCESSES,
+    )
+    bands = np.percentile(values, PERCENTILES, axis=0)
+    contributed = float(initial_amount) + float(monthly_contribution) * MONTHS_PER_YEAR * np.arange(years + 1)
+    periods = settings.ANALYTICS_PERIODS_PER_YEAR
+
+    return {
+        "portfolio_id": portfolio.pk,
+        "risk": portfolio.risk,
+        "method": method,
+        "paths": paths,
+        "years": years,
+        "initial_amount": initial_amount,
+        "monthly_contribution": monthly_contribution,
+        "history_days": len(log_returns),
+        "annual_return": round(float(np.expm1(log_returns.mean() * periods)), 6),
+        "annual_volatility": round(float(log_returns.std(ddof=1) * np.sqrt(periods)), 6),
+        "bands": [
+            {
+                "year": year,
+                "contributed": round(float(contributed[year]), 2),
+                **{f"p{p}": round(float(band[year]), 2) for p, band in zip(PERCENTILES, bands)},
+            }
+            for year in range(years + 1)
+        ],
+        "mean_final_value": round(float(values[:, -1].mean()), 2),
+        "probability_of_loss": round(float(np.mean(values[:, -1] < contributed[-1])), 4),
+    }
@@ -0,0 +1,213 @@
+"""
+Server-sent events stream of a user's portfolio total.
+
+Every subscriber of the process shares one `PortfolioStreamHub`, which polls
+for changes of all subscribed users at once: one grouped query for their
+newest ledger entry (orders and cash movements all write one) and one primary
+key lookup of the newest stock price. A total is recomputed only for users
+whose ledger moved or whose held stocks got a new price, once per user no
+matter how many connections follow them, and fanned out to each connection.
+
+An idle connection is a suspended coroutine waiting on its queue, so a worker
+holds thousands of them. The endpoint needs an ASGI server (see README).
+"""
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.db.models import Max
+from django.http import JsonResponse, StreamingHttpResponse
+
+from .models import CashLedgerEntry, Order, StockPrice, User
+from .serializers import PortfolioTotalSerializer
+from .valuation import portfolio_total
+
+logger = logging.getLogger(__name__)
+
+
+def ledger_heads(user_ids):
+    """Id of the newest ledger entry of each user, 0 for users without entries."""
+    heads = dict(
+        CashLedgerEntry.objects.filter(user_id__in=user_ids)
+        .order_by()
+        .values("user_id")
+        .annotate(head=Max("id"))
+        .values_list("user_id", "head")
+    )
+    return {user_id: heads.get(user_id, 0) for user_id in user_ids}
+
+
+def last_price_id():
+    return StockPrice.all_objects.aggregate(last=Max("id"))["last"] or 0
+
+
+def repriced_stocks(after_id):
+    """Ids of the stocks with prices ingested after the price row `after_id`."""
+    return set(
+        StockPrice.objects.filter(id__gt=after_id)
+        .order_by()
+        .values_list("stock_id", flat=True)
+        .distinct()
+    )
+
+
+def held_stocks(user_id):
+    """Ids of every stock the user traded, a superset of the ones they hold."""
+    return set(
+        Order.objects.filter(user_id=user_id, status=Order.EXECUTED, stock__isnull=False)
+        .order_by()
+        .values_list("stock_id", flat=True)
+        .distinct()
+    )
+
+
+def total_event(user_id, head):
+    data = PortfolioTotalSerializer(portfolio_total(user_id)).data
+    return f"event: total\nid: {head}\ndata: {json.dumps(data)}\n\n"
+
+
+class PortfolioStreamHub:
+    """
+    Subscriptions and the shared poller of one event loop.
+
+    Database work runs on a single thread owned by the hub, so all the
+    streams of a worker use one connection.
+    """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="portfolio-stream")
+        self.lock = asyncio.Lock()
+        self.subscribers = defaultdict(set)
+        # Last event sent to each user, with the ledger head and traded stocks it reflects
+        self.events = {}
+        self.heads = {}
+        self.stocks = {}
+        self.price_id = None
+        self.poller = None
+
+    async def subscribe(self, user_id):
+        """Register a connection, its queue starts with the current total."""
+        queue = asyncio.Queue(maxsize=1)
+        self.subscribers[user_id].add(queue)
+        if user_id in self.events:
+            queue.put_nowait(self.events[user_id])
+        else:
+            # Connections arriving while the first total is computed get it too
+            await self.refresh()
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.create_task(self.poll())
+        return queue
+
+    def unsubscribe(self, user_id, queue):
+        self.subscribers[user_id].discard(queue)
+        if not self.subscribers[user_id]:
+            del self.subscribers[user_id]
+
+    async def poll(self):
+        while self.subscribers:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                # Keep the streams open, the next tick retries
+                logger.exception("Portfolio stream refresh failed")
+        # Without subscribers the hub gives its database connection back
+        await self.close()
+
+    async def run(self, func, *args):
+        """Run `func` on the hub's database thread."""
+        return await sync_to_async(func, thread_sensitive=False, executor=self.executor)(*args)
+
+    async def close(self):
+        await self.run(connections.close_all)
+
+    async def refresh(self):
+        async with self.lock:
+            for state in (self.events, self.heads, self.stocks):
+                for user_id in [user_id for user_id in state if user_id not in self.subscribers]:
+                    del state[user_id]
+            changes = await self.run(self.changes, list(self.subscribers))
+
+            for user_id, event in changes.items():
+                self.events[user_id] = event
+                for queue in self.subscribers.get(user_id, ()):
+                    # A slow reader only ever gets the latest total
+                    if queue.full():
+                        queue.get_nowait()
+                    queue.put_nowait(event)
+
+    def changes(self, user_ids):
+        """New events for the users whose cash, holdings or traded stock prices changed."""
+        close_old_connections()
+        if not user_ids:
+            return {}
+        heads = ledger_heads(user_ids)
+        price_id = last_price_id()
+        repriced = set()
+        if self.price_id is not None and price_id != self.price_id:
+            repriced = repriced_stocks(self.price_id)
+        self.price_id = price_id
+
+        changed = {}
+        for user_id in user_ids:
+            moved = self.heads.get(user_id) != heads[user_id]
+            if moved:
+                self.heads[user_id] = heads[user_id]
+                self.stocks[user_id] = held_stocks(user_id)
+            if moved or user_id not in self.events or self.stocks[user_id] & repriced:
+                changed[user_id] = total_event(user_id, heads[user_id])
+        return changed
+
+
+_hubs = {}
+
+
+def get_hub():
+    """The hub of the running event loop."""
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        for other in [other for other in _hubs if other.is_closed()]:
+            del _hubs[other]
+        hub = _hubs[loop] = PortfolioStreamHub(settings.PORTFOLIO_STREAM_POLL_INTERVAL)
+    return hub
+
+
+async def stream_events(user_id, hub):
+    queue = await hub.subscribe(user_id)
+    try:
+        while True:
+            try:
+                yield await asyncio.wait_for(queue.get(), settings.PORTFOLIO_STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                # Comment line, keeps proxies from closing an idle connection
+                yield ": keepalive\n\n"
+    finally:
+        hub.unsubscribe(user_id, queue)
+
+
+async def portfolio_stream(request, user_id):
+    """
+    GET /api/users/<int:user_id>/portfolio/stream/
+
+    `text/event-stream` of `total` events, each with the body of
+    /portfolio/total/. The first one is sent on connect and a new one
+    whenever the total may have changed.
+    """
+    hub = get_hub()
+    # On the hub's thread: a connection opened on the request's thread
+    # would stay open as long as the stream does
+    if not await hub.run(User.objects.filter(pk=user_id).exists):
+        return JsonResponse({"detail": "User not found."}, status=404)
+
+    response = StreamingHttpResponse(stream_events(user_id, hub), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Tell nginx not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
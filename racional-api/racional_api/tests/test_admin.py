@@ -0,0 +1,178 @@
+import re
+import pytest
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from racional_api.admin import OrderAdmin
+from racional_api.models import Order, Stock, StockPrice, User
+
+
+@pytest.fixture
+def staff_client():
+    admin_user = get_user_model().objects.create_superuser("ops", "ops@example.com", "secret")
+    client = Client()
+    client.force_login(admin_user)
+    return client
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Admin",
+        last_name="Browsed",
+        phone_number="1",
+        email="admin-browsed@example.com",
+        money=Decimal("1000000.00"),
+    )
+
+
+@pytest.fixture
+def stock():
+    stock = Stock.objects.create(symbol="ADM", name="Admin Corp")
+    StockPrice.objects.create(stock=stock, value=10.0, date=timezone.now())
+    return stock
+
+
+def create_orders(user, stock, count):
+    return Order.objects.bulk_create(
+        [
+            Order(
+                user=user,
+                asset_type=Order.ASSET_STOCK,
+                stock=stock,
+                side=Order.BUY,
+                quantity=Decimal("1"),
+                execution_price=Decimal("10"),
+                execution_date=timezone.localdate(),
+            )
+            for _ in range(count)
+        ]
+    )
+
+
+def listed_ids(resp):
+    return [int(pk) for pk in re.findall(r'<th class="field-id"><a href="[^"]*/(\d+)/change/', resp.content.decode())]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "model",
+    [
+        "user", "transaction", "stock", "stockprice", "stockdailystats", "portfolio", "portfoliocomponent",
+        "portfolioversion", "order", "position", "taxlot", "lotdisposal", "cashledgerentry",
+        "cashbalancecheckpoint", "archivedrecord", "idempotencykey",
+    ],
+)
+def test_every_model_has_a_changelist(staff_client, model):
+    resp = staff_client.get(reverse(f"admin:racional_api_{model}_changelist"))
+    assert resp.status_code == 200
+
+
+@pytest.mark.django_db
+def test_changelist_pages_by_keyset(staff_client, user, stock, monkeypatch):
+    monkeypatch.setattr(OrderAdmin, "list_per_page", 10)
+    ids = sorted((order.pk for order in create_orders(user, stock, 25)), reverse=True)
+    url = reverse("admin:racional_api_order_changelist")
+
+    pages = []
+    with CaptureQueriesContext(connection) as ctx:
+        resp = staff_client.get(url)
+        while True:
+            assert resp.status_code == 200
+            pages.append(listed_ids(resp))
+            next_page = resp.context["cl"].next_page_url
+            if next_page is None:
+                break
+            resp = staff_client.get(url + next_page)
+
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert sum(pages, []) == ids
+    assert not any("OFFSET" in q["sql"] for q in ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_changelist_queries_do_not_grow_with_rows(staff_client, user, stock, settings):
+    url = reverse("admin:racional_api_order_changelist")
+
+    def count_queries():
+        with CaptureQueriesContext(connection) as ctx:
+            assert staff_client.get(url).status_code == 200
+        return ctx.captured_queries
+
+    create_orders(user, stock, 2)
+    few = count_queries()
+    create_orders(user, stock, 50)
+    many = count_queries()
+
+    assert len(many) == len(few)
+    # Orders are listed with their user and stock in one query
+    assert sum("racional_api_stock" in q["sql"] and "racional_api_user" in q["sql"] for q in many) == 1
+
+
+@pytest.mark.django_db
+def test_large_table_count_is_the_planner_estimate(staff_client, user, stock, settings):
+    settings.ADMIN_COUNT_LIMIT = 10
+    create_orders(user, stock, 30)
+    with connection.cursor() as cursor:
+        cursor.execute("ANALYZE racional_api_order")
+
+    with CaptureQueriesContext(connection) as ctx:
+        resp = staff_client.get(reverse("admin:racional_api_order_changelist"))
+
+    assert resp.status_code == 200
+    assert resp.context["cl"].paginator.label == "~30"
+    assert not any("COUNT(" in q["sql"] for q in ctx.captured_queries)
+
+
+@pytest.mark.django_db
+def test_filtered_count_stops_at_the_limit(staff_client, user, stock, settings):
+    settings.ADMIN_COUNT_LIMIT = 10
+    create_orders(user, stock, 15)
+
+    resp = staff_client.get(reverse("admin:racional_api_order_changelist"), {"user": user.pk, "status": "EXECUTED"})
+
+    assert resp.status_code == 200
+    assert resp.context["cl"].paginator.label == "10+"
+    assert len(listed_ids(resp)) == 15
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("params", [{"after": "x"}, {"user": "x"}])
+def test_invalid_cursor_or_id_filter_is_rejected(staff_client, params):
+    resp = staff_client.get(reverse("admin:racional_api_order_changelist"), params)
+
+    assert resp.status_code == 302
+    assert "e=1" in resp["Location"]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "model",
+    ["transaction", "order", "position", "taxlot", "lotdisposal", "cashledgerentry", "cashbalancecheckpoint"],
+)
+def test_money_moving_models_are_read_only(staff_client, model):
+    assert staff_client.get(reverse(f"admin:racional_api_{model}_add")).status_code == 403
+
+
+@pytest.mark.django_db
+def test_orders_and_balances_cannot_be_edited(staff_client, user, stock):
+    (order,) = create_orders(user, stock, 1)
+    url = reverse("admin:racional_api_order_change", args=[order.pk])
+
+    assert staff_client.get(url).status_code == 200
+    assert staff_client.post(url, {"quantity": "1000"}).status_code == 403
+    order.refresh_from_db()
+    assert order.quantity == Decimal("1")
+
+    url = reverse("admin:racional_api_user_change", args=[user.pk])
+    form = {"first_name": "Renamed", "last_name": user.last_name, "phone_number": "1", "email": user.email, "money": "0"}
+    assert staff_client.post(url, form).status_code == 302
+    user.refresh_from_db()
+    assert user.first_name == "Renamed"
+    assert user.money == Decimal("1000000.00")
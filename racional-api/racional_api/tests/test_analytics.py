@@ -0,0 +1,134 @@
+import pytest
+from decimal import Decimal
+from datetime import date, timedelta
+from django.core.cache import cache
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.models import Order, Portfolio, PortfolioComponent, Stock, StockPrice, User
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Ana",
+        last_name="Lytics",
+        phone_number="101",
+        email="analytics@example.com",
+        is_deleted=False,
+    )
+
+
+@pytest.fixture
+def start_day():
+    return date.today() - timedelta(days=4)
+
+
+@pytest.fixture
+def portfolio(user, start_day):
+    """Two stocks over five days: UP goes 100 -> 120, DOWN goes 100 -> 80 -> 90."""
+    midnight = timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    first = midnight - timedelta(days=4)
+    up = Stock.objects.create(symbol="UP", name="Up Corp")
+    down = Stock.objects.create(symbol="DOWN", name="Down Corp")
+    for day, (up_price, down_price) in enumerate([(100, 100), (105, 90), (110, 80), (115, 85), (120, 90)]):
+        StockPrice.objects.create(stock=up, value=up_price, date=first + timedelta(days=day))
+        StockPrice.objects.create(stock=down, value=down_price, date=first + timedelta(days=day))
+
+    p = Portfolio.objects.create(user=user, name="Half", description="", risk=Portfolio.MEDIUM)
+    PortfolioComponent.objects.create(portfolio=p, stock=up, weight=Decimal("0.5"))
+    PortfolioComponent.objects.create(portfolio=p, stock=down, weight=Decimal("0.5"))
+    return p
+
+
+@pytest.mark.django_db
+def test_basket_analytics(api_client, portfolio):
+    resp = api_client.get(reverse("portfolio-analytics", args=[portfolio.pk]), format="json")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.data["days"] == 5
+    assert resp.data["holdings"] is None
+
+    basket = resp.data["basket"]
+    daily = [
+        0.5 * (105 / 100 - 1) + 0.5 * (90 / 100 - 1),
+        0.5 * (110 / 105 - 1) + 0.5 * (80 / 90 - 1),
+        0.5 * (115 / 110 - 1) + 0.5 * (85 / 80 - 1),
+        0.5 * (120 / 115 - 1) + 0.5 * (90 / 85 - 1),
+    ]
+    wealth, peak, drawdown = 1.0, 1.0, 0.0
+    for r in daily:
+        wealth *= 1 + r
+        peak = max(peak, wealth)
+        drawdown = min(drawdown, wealth / peak - 1)
+    assert basket["time_weighted_return"] == pytest.approx(wealth - 1, abs=1e-6)
+    assert basket["max_drawdown"] == pytest.approx(drawdown, abs=1e-6)
+    assert basket["annualized_volatility"] > 0
+    assert basket["sharpe_ratio"] is not None
+
+
+@pytest.mark.django_db
+def test_cached_analytics_follow_new_prices(api_client, portfolio):
+    url = reverse("portfolio-analytics", args=[portfolio.pk])
+    before = api_client.get(url).data["basket"]["time_weighted_return"]
+    assert api_client.get(url).data["basket"]["time_weighted_return"] == before
+
+    # A correction of today's price for UP
+    StockPrice.objects.create(stock=Stock.objects.get(symbol="UP"), value=150, date=timezone.now())
+
+    assert api_client.get(url).data["basket"]["time_weighted_return"] > before
+
+
+@pytest.mark.django_db
+def test_holdings_return_ignores_cash_flows(api_client, user, portfolio, start_day):
+    up = Stock.objects.get(symbol="UP")
+    # A second, bigger purchase half way must not count as performance
+    for qty, days in [("1", 0), ("10", 2)]:
+        Order.objects.create(
+            user=user,
+            stock=up,
+            side=Order.BUY,
+            asset_type=Order.ASSET_STOCK,
+            quantity=Decimal(qty),
+            execution_price=Decimal("100"),
+            execution_date=start_day + timedelta(days=days),
+        )
+
+    resp = api_client.get(reverse("portfolio-analytics", args=[portfolio.pk]), format="json")
+    holdings = resp.data["holdings"]
+    assert holdings["time_weighted_return"] == pytest.approx(120 / 100 - 1, abs=1e-6)
+    assert holdings["max_drawdown"] == 0.0
+
+
+@pytest.mark.django_db
+def test_analytics_date_range_and_validation(api_client, portfolio, start_day):
+    url = reverse("portfolio-analytics", args=[portfolio.pk])
+    resp = api_client.get(url, {"from": str(start_day + timedelta(days=2))}, format="json")
+    assert resp.data["days"] == 3
+    assert resp.data["start"] == str(start_day + timedelta(days=2))
+
+    resp = api_client.get(url, {"from": str(start_day), "to": str(start_day - timedelta(days=1))}, format="json")
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+
+    resp = api_client.get(reverse("portfolio-analytics", args=[99999]), format="json")
+    assert resp.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_analytics_of_portfolio_without_prices(api_client, user):
+    p = Portfolio.objects.create(user=user, name="Empty", description="", risk=Portfolio.LOW)
+    resp = api_client.get(reverse("portfolio-analytics", args=[p.pk]), format="json")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.data["days"] == 0
+    assert resp.data["basket"]["time_weighted_return"] == 0.0
@@ -0,0 +1,106 @@
+import pytest
+from decimal import Decimal
+from datetime import date, timedelta
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+
+from racional_api.models import (
+    ArchivedRecord,
+    CashLedgerEntry,
+    Order,
+    Portfolio,
+    PortfolioComponent,
+    Stock,
+    User,
+)
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Cold",
+        last_name="Storage",
+        phone_number="900",
+        email="cold@example.com",
+    )
+
+
+@pytest.fixture
+def stock():
+    return Stock.objects.create(symbol="COLD", name="Cold Corp")
+
+
+def buy(user, stock):
+    return Order.objects.create(
+        user=user,
+        stock=stock,
+        side=Order.BUY,
+        asset_type=Order.ASSET_STOCK,
+        quantity=Decimal("2.0000"),
+        execution_price=Decimal("10.5000"),
+        execution_date=date(2024, 1, 2),
+    )
+
+
+def delete_long_ago(row, days=365):
+    row.delete()
+    type(row).all_objects.filter(pk=row.pk).update(updated_at=timezone.now() - timedelta(days=days))
+
+
+@pytest.mark.django_db
+def test_archive_moves_old_deleted_rows_only(user, stock):
+    old = buy(user, stock)
+    recent = buy(user, stock)
+    live = buy(user, stock)
+    delete_long_ago(old)
+    recent.delete()
+
+    call_command("archive_deleted", "--days", "90", "--batch-size", "1")
+
+    assert not Order.all_objects.filter(pk=old.pk).exists()
+    assert set(Order.all_objects.values_list("pk", flat=True)) == {recent.pk, live.pk}
+
+    record = ArchivedRecord.objects.get(model="racional_api.order", object_id=old.pk)
+    assert record.payload["user"] == user.pk
+    assert record.payload["is_deleted"] is True
+    # Ledger history stays, only the link to the archived order is cleared
+    assert CashLedgerEntry.objects.filter(user=user, order=None).count() == 2
+
+
+@pytest.mark.django_db
+def test_archive_keeps_rows_still_referenced(user, stock):
+    portfolio = Portfolio.objects.create(user=user, name="P", description="", risk=Portfolio.LOW)
+    PortfolioComponent.objects.create(portfolio=portfolio, stock=stock, weight=Decimal("1.0"))
+    delete_long_ago(portfolio)
+
+    call_command("archive_deleted")
+    assert Portfolio.all_objects.filter(pk=portfolio.pk).exists()
+
+    # Once its component is deleted too, both go, component first
+    delete_long_ago(PortfolioComponent.objects.get(portfolio=portfolio))
+    call_command("archive_deleted")
+    assert not Portfolio.all_objects.filter(pk=portfolio.pk).exists()
+    assert ArchivedRecord.objects.filter(model="racional_api.portfoliocomponent").count() == 1
+
+
+@pytest.mark.django_db
+def test_restore_archived_rows(user, stock):
+    order = buy(user, stock)
+    delete_long_ago(order)
+    call_command("archive_deleted", "--model", "order")
+
+    call_command("restore_archived", "order", str(order.pk))
+
+    restored = Order.all_objects.get(pk=order.pk)
+    assert restored.is_deleted
+    assert restored.user_id == user.pk
+    assert restored.quantity == Decimal("2.0000")
+    assert restored.execution_date == date(2024, 1, 2)
+    assert not ArchivedRecord.objects.exists()
+
+
+@pytest.mark.django_db
+def test_archive_rejects_unknown_model():
+    with pytest.raises(CommandError):
+        call_command("archive_deleted", "--model", "nope")
@@ -0,0 +1,168 @@
+import pytest
+from decimal import Decimal
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.models import Order, Stock, StockPrice, Transaction, User
+
+
+TODAY = timezone.localdate()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Etag",
+        last_name="Poller",
+        phone_number="404",
+        email="etag@example.com",
+    )
+
+
+@pytest.fixture
+def stock(user):
+    stock = Stock.objects.create(symbol="ETG", name="Etag Corp")
+    StockPrice.objects.create(stock=stock, value=10.0, date=timezone.now() - timedelta(days=2))
+    Transaction.objects.create(
+        user=user,
+        transaction_type=Transaction.DEPOSIT,
+        amount=Decimal("500.00"),
+        execution_date=TODAY,
+    )
+    Order.objects.create(
+        user=user,
+        asset_type=Order.ASSET_STOCK,
+        stock=stock,
+        side=Order.BUY,
+        quantity=Decimal("5"),
+        execution_price=Decimal("10.00"),
+        execution_date=TODAY,
+    )
+    return stock
+
+
+def url(name, user):
+    return reverse(name, args=[user.pk])
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("name", ["user-portfolio-total", "user-last-movements", "transaction-list"])
+def test_unchanged_response_is_a_304_from_one_query(api_client, user, stock, name):
+    first = api_client.get(url(name, user))
+    assert first.status_code == status.HTTP_200_OK
+    assert first["ETag"]
+    assert "no-cache" in first["Cache-Control"]
+
+    with CaptureQueriesContext(connection) as ctx:
+        second = api_client.get(url(name, user), HTTP_IF_NONE_MATCH=first["ETag"])
+
+    assert second.status_code == status.HTTP_304_NOT_MODIFIED
+    assert second["ETag"] == first["ETag"]
+    assert len(ctx.captured_queries) == 1
+
+
+@pytest.mark.django_db
+def test_if_modified_since(api_client, user, stock):
+    first = api_client.get(url("user-last-movements", user))
+
+    second = api_client.get(url("user-last-movements", user), HTTP_IF_MODIFIED_SINCE=first["Last-Modified"])
+
+    assert second.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.django_db
+def test_total_etag_changes_with_cash_and_held_prices(api_client, user, stock):
+    def etag():
+        return api_client.get(url("user-portfolio-total", user))["ETag"]
+
+    before = etag()
+    Transaction.objects.create(
+        user=user, transaction_type=Transaction.DEPOSIT, amount=Decimal("1.00"), execution_date=TODAY
+    )
+    after_deposit = etag()
+    assert after_deposit != before
+
+    # A price of a stock the user never traded does not change the total
+    other = Stock.objects.create(symbol="OTH", name="Other Corp")
+    StockPrice.objects.create(stock=other, value=99.0, date=timezone.now())
+    assert etag() == after_deposit
+
+    StockPrice.objects.create(stock=stock, value=12.0, date=timezone.now())
+    assert etag() != after_deposit
+
+
+@pytest.mark.django_db
+def test_total_etag_changes_with_a_price_older_than_another_held_one(api_client, user, stock):
+    other = Stock.objects.create(symbol="ETH", name="Etag Two")
+    Order.objects.create(
+        user=user,
+        asset_type=Order.ASSET_STOCK,
+        stock=other,
+        side=Order.BUY,
+        quantity=Decimal("5"),
+        execution_price=Decimal("10.00"),
+        execution_date=TODAY,
+    )
+    midnight = timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    StockPrice.objects.create(stock=other, value=4.0, date=midnight)
+    first = api_client.get(url("user-portfolio-total", user))
+    assert first.data["stocks_total"] == "70.00"
+
+    # Same date as the newest price of OTHER, so the newest date does not move
+    StockPrice.objects.create(stock=stock, value=2.0, date=midnight)
+
+    second = api_client.get(url("user-portfolio-total", user), HTTP_IF_NONE_MATCH=first["ETag"])
+    assert second.status_code == status.HTTP_200_OK
+    assert second.data["stocks_total"] == "30.00"
+
+
+@pytest.mark.django_db
+def test_movements_etag_changes_with_pending_orders(api_client, user, stock):
+    before = api_client.get(url("user-last-movements", user))["ETag"]
+    Order.objects.create(
+        user=user,
+        asset_type=Order.ASSET_STOCK,
+        stock=stock,
+        side=Order.BUY,
+        quantity=Decimal("1"),
+        execution_date=TODAY,
+        status=Order.PENDING,
+    )
+
+    resp = api_client.get(url("user-last-movements", user), HTTP_IF_NONE_MATCH=before)
+
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp["ETag"] != before
+
+
+@pytest.mark.django_db
+def test_etag_depends_on_query_string(api_client, user, stock):
+    plain = api_client.get(url("user-portfolio-total", user))["ETag"]
+    past = api_client.get(url("user-portfolio-total", user), {"as_of": str(TODAY - timedelta(days=1))})
+
+    assert past["ETag"] != plain
+
+
+@pytest.mark.django_db
+def test_unknown_user_is_not_conditional(api_client):
+    resp = api_client.get(reverse("user-portfolio-total", args=[999999]), HTTP_IF_NONE_MATCH='"x"')
+
+    assert resp.status_code == status.HTTP_404_NOT_FOUND
+    assert not resp.has_header("ETag")
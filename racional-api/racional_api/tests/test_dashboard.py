@@ -0,0 +1,156 @@
+import pytest
+from decimal import Decimal
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.models import Order, Stock, StockPrice, Transaction, User
+
+
+TODAY = timezone.localdate()
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    user = User.objects.create(
+        first_name="Dash",
+        last_name="Board",
+        phone_number="321",
+        email="dash@example.com",
+    )
+    Transaction.objects.create(
+        user=user,
+        transaction_type=Transaction.DEPOSIT,
+        amount=Decimal("1000.00"),
+        execution_date=TODAY - timedelta(days=40),
+    )
+    return user
+
+
+def midnight(days_ago):
+    return timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days_ago)
+
+
+def add_stock(user, symbol, quantity="2"):
+    stock = Stock.objects.create(symbol=symbol, name=f"{symbol} Corp")
+    # One price well before the default range and one inside it
+    StockPrice.objects.create(stock=stock, value=10.0, date=midnight(400))
+    StockPrice.objects.create(stock=stock, value=15.0, date=midnight(5))
+    Order.objects.create(
+        user=user,
+        asset_type=Order.ASSET_STOCK,
+        stock=stock,
+        side=Order.BUY,
+        quantity=Decimal(quantity),
+        execution_price=Decimal("10.00"),
+        execution_date=TODAY - timedelta(days=30),
+    )
+    return stock
+
+
+def dashboard(api_client, user, **params):
+    return api_client.get(reverse("user-dashboard", args=[user.pk]), params)
+
+
+@pytest.mark.django_db
+def test_dashboard_matches_the_separate_endpoints(api_client, user):
+    add_stock(user, "DSH")
+
+    resp = dashboard(api_client, user)
+
+    assert resp.status_code == status.HTTP_200_OK
+    data = resp.json()
+    assert data["user"] == {"id": user.pk, "first_name": "Dash", "last_name": "Board", "email": "dash@example.com"}
+    assert data["total"] == api_client.get(reverse("user-portfolio-total", args=[user.pk])).json()
+    assert data["movements"] == api_client.get(reverse("user-last-movements", args=[user.pk])).json()
+
+    evolution = data["evolution"]
+    assert len(evolution) == 100
+    assert evolution[-1]["date"] == str(TODAY)
+    assert evolution[-1]["total"] == float(data["total"]["portfolio_total"])
+    # Before the purchase only cash, then the 2 units at the price carried in from before the range
+    assert evolution[0] == {"date": str(TODAY - timedelta(days=364)), "cash": 0.0, "stocks_value": 0.0, "total": 0.0}
+    day_after_buy = next(p for p in evolution if p["date"] > str(TODAY - timedelta(days=30)))
+    assert day_after_buy["stocks_value"] == 20.0
+    assert day_after_buy["cash"] == 980.0
+
+
+@pytest.mark.django_db
+def test_dashboard_include_selects_sections(api_client, user):
+    resp = dashboard(api_client, user, include="movements")
+
+    assert resp.status_code == status.HTTP_200_OK
+    assert set(resp.json()) == {"user", "movements"}
+
+
+@pytest.mark.django_db
+def test_dashboard_evolution_range_and_points(api_client, user):
+    add_stock(user, "RNG")
+
+    resp = dashboard(
+        api_client,
+        user,
+        include="evolution",
+        **{"from": str(TODAY - timedelta(days=9)), "to": str(TODAY), "points": 4},
+    )
+
+    evolution = resp.json()["evolution"]
+    assert [p["date"] for p in evolution] == [
+        str(TODAY - timedelta(days=days)) for days in (9, 6, 3, 0)
+    ]
+    assert [p["stocks_value"] for p in evolution] == [20.0, 20.0, 30.0, 30.0]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "params, field",
+    [
+        ({"include": "total,charts"}, "include"),
+        ({"points": "1"}, "points"),
+        ({"from": str(TODAY), "to": str(TODAY - timedelta(days=1))}, "from"),
+        ({"from": str(TODAY + timedelta(days=1))}, "from"),
+    ],
+)
+def test_dashboard_rejects_invalid_params(api_client, user, params, field):
+    resp = dashboard(api_client, user, **params)
+
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+    assert field in resp.json()
+
+
+@pytest.mark.django_db
+def test_dashboard_unknown_user_returns_404(api_client):
+    resp = api_client.get(reverse("user-dashboard", args=[999999]))
+    assert resp.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_dashboard_queries_do_not_grow_with_holdings(api_client, user):
+    def count_queries():
+        with CaptureQueriesContext(connection) as ctx:
+            assert dashboard(api_client, user).status_code == 200
+        return len(ctx.captured_queries)
+
+    add_stock(user, "AAA")
+    few = count_queries()
+    for symbol in ("BBB", "CCC", "DDD", "EEE"):
+        add_stock(user, symbol)
+
+    # User, movements (2), orders, ledger and prices
+    assert count_queries() == few == 6
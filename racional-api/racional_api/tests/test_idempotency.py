@@ -0,0 +1,112 @@
+import threading
+import pytest
+from decimal import Decimal
+from datetime import date, timedelta
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.models import IdempotencyKey, Transaction, User
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Retry",
+        last_name="Client",
+        phone_number="503",
+        email="retry@example.com",
+        money=Decimal("100.00"),
+    )
+
+
+def payload(user, amount="50.00"):
+    return {"user_id": user.pk, "amount": amount, "execution_date": str(date.today())}
+
+
+@pytest.mark.django_db
+def test_retried_deposit_is_replayed(api_client, user):
+    url = reverse("deposit-create")
+    first = api_client.post(url, payload(user), format="json", HTTP_IDEMPOTENCY_KEY="dep-1")
+    retry = api_client.post(url, payload(user), format="json", HTTP_IDEMPOTENCY_KEY="dep-1")
+
+    assert first.status_code == retry.status_code == status.HTTP_201_CREATED
+    assert retry["Idempotent-Replayed"] == "true"
+    assert retry.json() == first.json()
+    assert Transaction.objects.filter(user=user).count() == 1
+    user.refresh_from_db()
+    assert user.money == Decimal("150.00")
+
+    # Without a key every request runs
+    api_client.post(url, payload(user), format="json")
+    assert Transaction.objects.filter(user=user).count() == 2
+
+
+@pytest.mark.django_db
+def test_key_reused_with_other_body_is_rejected(api_client, user):
+    url = reverse("deposit-create")
+    api_client.post(url, payload(user), format="json", HTTP_IDEMPOTENCY_KEY="dep-2")
+    resp = api_client.post(url, payload(user, "60.00"), format="json", HTTP_IDEMPOTENCY_KEY="dep-2")
+    assert resp.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+    assert Transaction.objects.filter(user=user).count() == 1
+
+
+@pytest.mark.django_db
+def test_failed_withdraw_does_not_burn_the_key(api_client, user):
+    url = reverse("withdraw-create")
+    resp = api_client.post(url, payload(user, "500.00"), format="json", HTTP_IDEMPOTENCY_KEY="wd-1")
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+    assert not IdempotencyKey.objects.exists()
+
+    api_client.post(reverse("deposit-create"), payload(user, "400.00"), format="json")
+    resp = api_client.post(url, payload(user, "500.00"), format="json", HTTP_IDEMPOTENCY_KEY="wd-1")
+    assert resp.status_code == status.HTTP_201_CREATED
+    user.refresh_from_db()
+    assert user.money == Decimal("0.00")
+
+
+@pytest.mark.django_db
+def test_expired_keys_are_purged_and_reusable(api_client, user):
+    url = reverse("deposit-create")
+    api_client.post(url, payload(user), format="json", HTTP_IDEMPOTENCY_KEY="dep-3")
+    IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+
+    resp = api_client.post(url, payload(user), format="json", HTTP_IDEMPOTENCY_KEY="dep-3")
+    assert "Idempotent-Replayed" not in resp
+    assert Transaction.objects.filter(user=user).count() == 2
+
+    IdempotencyKey.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+    call_command("purge_idempotency_keys")
+    assert not IdempotencyKey.objects.exists()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_retries_run_once(user):
+    url = reverse("deposit-create")
+    codes = []
+
+    def post():
+        try:
+            resp = APIClient().post(url, payload(user), format="json", HTTP_IDEMPOTENCY_KEY="dep-race")
+            codes.append(resp.status_code)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=post) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert codes == [status.HTTP_201_CREATED] * 4
+    assert Transaction.objects.filter(user=user).count() == 1
+    user.refresh_from_db()
+    assert user.money == Decimal("150.00")
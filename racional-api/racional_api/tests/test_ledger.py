@@ -0,0 +1,163 @@
+import pytest
+from decimal import Decimal
+from datetime import date, timedelta
+from django.core.management import CommandError, call_command
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.models import (
+    CashBalanceCheckpoint,
+    CashLedgerEntry,
+    Order,
+    Stock,
+    StockPrice,
+    Transaction,
+    User,
+)
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Ledger",
+        last_name="User",
+        phone_number="123",
+        email="ledger@example.com",
+        is_deleted=False,
+    )
+
+
+@pytest.fixture
+def stock():
+    s = Stock.objects.create(symbol="LDG", name="Ledger Corp")
+    today_midnight = timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    StockPrice.objects.create(stock=s, value=Decimal("10.00"), date=today_midnight - timedelta(days=1))
+    StockPrice.objects.create(stock=s, value=Decimal("12.50"), date=today_midnight)
+    return s
+
+
+@pytest.mark.django_db
+def test_ledger_matches_money_after_api_operations(api_client, user, stock):
+    today = str(date.today())
+    api_client.post(reverse("deposit-create"), {"user_id": user.pk, "amount": "1000.00", "execution_date": today}, format="json")
+    api_client.post(reverse("withdraw-create"), {"user_id": user.pk, "amount": "100.00", "execution_date": today}, format="json")
+    api_client.post(
+        reverse("stock-order-create"),
+        {"user_id": user.pk, "stock_id": stock.pk, "side": "BUY", "quantity": "10", "execution_date": today},
+        format="json",
+    )
+    resp = api_client.post(
+        reverse("stock-order-create"),
+        {"user_id": user.pk, "stock_id": stock.pk, "side": "SELL", "quantity": "4", "execution_date": today},
+        format="json",
+    )
+    assert resp.status_code == status.HTTP_201_CREATED
+
+    user.refresh_from_db()
+    # 1000 - 100 - 10 * 12.50 + 4 * 12.50
+    assert user.money == Decimal("825.00")
+    assert CashLedgerEntry.balance(user.pk) == user.money
+
+    # SELL proceeds are part of the cash of the total endpoint
+    resp = api_client.get(reverse("user-portfolio-total", args=[user.pk]), format="json")
+    assert Decimal(resp.data["cash"]) == Decimal("825.00")
+
+    call_command("reconcile_cash", user_id=user.pk)
+
+
+@pytest.mark.django_db
+def test_checkpoints_and_as_of_balance(settings, user):
+    settings.CASH_LEDGER_CHECKPOINT_INTERVAL = 3
+    start = date.today() - timedelta(days=10)
+    for day in range(7):
+        Transaction.objects.create(
+            user=user,
+            transaction_type=Transaction.DEPOSIT,
+            amount=Decimal("10.00"),
+            execution_date=start + timedelta(days=day),
+        )
+    # A backdated withdraw, written after the checkpoints
+    Transaction.objects.create(
+        user=user,
+        transaction_type=Transaction.WITHDRAW,
+        amount=Decimal("5.00"),
+        execution_date=start,
+    )
+
+    assert CashBalanceCheckpoint.objects.filter(user=user).count() == 2
+    assert CashLedgerEntry.balance(user.pk) == Decimal("65.00")
+    assert CashLedgerEntry.balance(user.pk, as_of=start) == Decimal("5.00")
+    assert CashLedgerEntry.balance(user.pk, as_of=start + timedelta(days=3)) == Decimal("35.00")
+    assert CashLedgerEntry.balance(user.pk, as_of=start - timedelta(days=1)) == Decimal("0.00")
+
+
+@pytest.mark.django_db
+def test_soft_deleted_transaction_is_reversed(user):
+    t = Transaction.objects.create(
+        user=user,
+        transaction_type=Transaction.DEPOSIT,
+        amount=Decimal("50.00"),
+        execution_date=date.today(),
+    )
+    assert CashLedgerEntry.balance(user.pk) == Decimal("50.00")
+
+    t.delete()
+    t.delete()
+    assert CashLedgerEntry.balance(user.pk) == Decimal("0.00")
+
+
+@pytest.mark.django_db
+def test_cash_reconciles_after_deletes(api_client, user, stock):
+    today = str(date.today())
+    api_client.post(reverse("deposit-create"), {"user_id": user.pk, "amount": "50.00", "execution_date": today}, format="json")
+    api_client.post(reverse("deposit-create"), {"user_id": user.pk, "amount": "100.00", "execution_date": today}, format="json")
+    api_client.post(
+        reverse("stock-order-create"),
+        {"user_id": user.pk, "stock_id": stock.pk, "side": "BUY", "quantity": "2", "execution_date": today},
+        format="json",
+    )
+
+    Transaction.objects.get(amount=Decimal("50.00")).delete()
+    Order.objects.get(user=user).delete()
+
+    user.refresh_from_db()
+    assert user.money == Decimal("100.00")
+    call_command("reconcile_cash", user_id=user.pk)
+    call_command("reconcile_cash", user_id=user.pk, rebuild=True)
+
+
+@pytest.mark.django_db
+def test_reconcile_cash_reports_mismatch_and_rebuilds(settings, user, stock):
+    settings.CASH_LEDGER_CHECKPOINT_INTERVAL = 2
+    Transaction.objects.create(
+        user=user,
+        transaction_type=Transaction.DEPOSIT,
+        amount=Decimal("300.00"),
+        execution_date=date.today(),
+    )
+    Order.objects.create(
+        user=user,
+        stock=stock,
+        side=Order.BUY,
+        asset_type=Order.ASSET_STOCK,
+        quantity=Decimal("3"),
+        execution_price=Decimal("12.50"),
+        execution_date=date.today(),
+    )
+
+    # User.money was never updated by the rows above
+    with pytest.raises(CommandError):
+        call_command("reconcile_cash", user_id=user.pk)
+
+    User.objects.filter(pk=user.pk).update(money=Decimal("262.50"))
+    CashLedgerEntry.objects.filter(user=user).delete()
+    call_command("reconcile_cash", user_id=user.pk, rebuild=True)
+    assert CashLedgerEntry.objects.filter(user=user).count() == 2
+    assert CashBalanceCheckpoint.objects.get(user=user).balance == Decimal("262.50")
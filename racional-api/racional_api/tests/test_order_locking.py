@@ -0,0 +1,117 @@
+import threading
+import pytest
+from decimal import Decimal
+from datetime import date, timedelta
+
+from django.core.management import call_command
+from django.db import connection
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.execution import execute_pending, try_user_locks, user_lock
+from racional_api.models import Order, Position, Stock, StockPrice, TaxLot, User
+
+
+def make_user(name, money="30.00"):
+    return User.objects.create(
+        first_name=name,
+        last_name="Lock",
+        phone_number="1",
+        email=f"{name}@example.com",
+        money=Decimal(money),
+    )
+
+
+@pytest.fixture
+def stock():
+    s = Stock.objects.create(symbol="LCK", name="Lock Corp")
+    StockPrice.objects.create(stock=s, value=Decimal("10.0"), date=timezone.now() - timedelta(days=1))
+    return s
+
+
+def buy(user, stock):
+    return APIClient().post(
+        reverse("stock-order-create"),
+        {
+            "user_id": user.pk,
+            "stock_id": stock.pk,
+            "side": "BUY",
+            "quantity": "1",
+            "execution_date": str(date.today()),
+        },
+        format="json",
+    )
+
+
+def in_thread(target):
+    result = {}
+
+    def run():
+        try:
+            result["value"] = target()
+        finally:
+            connection.close()
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    thread.join()
+    return result.get("value")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_orders_of_one_user_do_not_overspend(stock):
+    user = make_user("spender")  # enough for 3 orders
+    codes = []
+
+    def post():
+        try:
+            codes.append(buy(user, stock).status_code)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=post) for _ in range(6)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert sorted(codes) == [status.HTTP_201_CREATED] * 3 + [status.HTTP_400_BAD_REQUEST] * 3
+    user.refresh_from_db()
+    assert user.money == Decimal("0.00")
+    assert Order.objects.filter(user=user).count() == 3
+
+
+@pytest.mark.django_db(transaction=True)
+def test_user_lock_only_blocks_the_same_user():
+    alice, bob = make_user("alice"), make_user("bob")
+
+    with user_lock(alice.pk):
+        assert in_thread(lambda: try_user_locks([alice.pk, bob.pk])) == {bob.pk}
+    assert in_thread(lambda: try_user_locks([alice.pk])) == {alice.pk}
+
+
+@pytest.mark.django_db(transaction=True)
+def test_worker_skips_users_with_a_request_in_flight(stock, settings):
+    settings.ORDER_EXECUTION_MODE = "queued"
+    user = make_user("busy")
+    buy(user, stock)
+
+    with user_lock(user.pk):
+        assert in_thread(execute_pending) == (0, 0)
+    assert Order.objects.get(user=user).status == Order.PENDING
+
+    assert execute_pending() == (1, 0)
+
+
+@pytest.mark.django_db(transaction=True)
+def test_stress_orders_cleans_up_after_itself(capsys):
+    call_command("stress_orders", "--users", "1", "2", "--processes", "2", "--orders", "4")
+
+    assert capsys.readouterr().out.count("balances ok") == 2
+    assert not Stock.all_objects.filter(symbol__startswith="STRESS").exists()
+    assert not User.all_objects.filter(first_name="Stress").exists()
+    assert not Order.all_objects.exists()
+    assert not TaxLot.all_objects.exists()
+    assert not Position.all_objects.exists()
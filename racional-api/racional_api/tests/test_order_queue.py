@@ -0,0 +1,179 @@
+import pytest
+from decimal import Decimal
+from datetime import date, timedelta
+
+from django.core.management import call_command
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.execution import execute_pending
+from racional_api.models import CashLedgerEntry, Order, Stock, StockPrice, User
+
+
+@pytest.fixture(autouse=True)
+def queued(settings):
+    settings.ORDER_EXECUTION_MODE = "queued"
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Queue",
+        last_name="Buyer",
+        phone_number="777",
+        email="queue@example.com",
+        money=Decimal("1000.00"),
+    )
+
+
+@pytest.fixture
+def stock():
+    s = Stock.objects.create(symbol="QUE", name="Queue Corp")
+    StockPrice.objects.create(stock=s, value=Decimal("50.0"), date=timezone.now() - timedelta(days=2))
+    return s
+
+
+def order(api_client, user, stock, side="BUY", quantity="10"):
+    return api_client.post(
+        reverse("stock-order-create"),
+        {
+            "user_id": user.pk,
+            "stock_id": stock.pk,
+            "side": side,
+            "quantity": quantity,
+            "execution_date": str(date.today()),
+        },
+        format="json",
+    )
+
+
+@pytest.mark.django_db
+def test_queued_order_is_accepted_then_executed(api_client, user, stock):
+    resp = order(api_client, user, stock)
+    assert resp.status_code == status.HTTP_202_ACCEPTED
+    assert resp.json()["status"] == Order.PENDING
+    assert resp.json()["execution_price"] is None
+
+    user.refresh_from_db()
+    assert user.money == Decimal("1000.00")
+    assert not CashLedgerEntry.objects.filter(user=user, order__isnull=False).exists()
+
+    assert execute_pending() == (1, 0)
+
+    placed = Order.objects.get(user=user)
+    assert placed.status == Order.EXECUTED
+    assert placed.execution_price == Decimal("50.0")
+    assert placed.executed_at is not None
+    user.refresh_from_db()
+    assert user.money == Decimal("500.00")
+    assert CashLedgerEntry.objects.get(order=placed).amount == Decimal("-500.00")
+
+
+@pytest.mark.django_db
+def test_worker_fails_orders_it_cannot_cover(api_client, user, stock):
+    order(api_client, user, stock, quantity="15")  # 750
+    order(api_client, user, stock, quantity="10")  # 500, over what is left
+    order(api_client, user, stock, side="SELL", quantity="20")  # holds only 15
+
+    assert execute_pending() == (1, 2)
+
+    failed = Order.objects.filter(status=Order.FAILED).order_by("id")
+    assert [o.failure_reason for o in failed] == [
+        "Insufficient funds for this purchase.",
+        "Insufficient stock quantity to sell. Amount of stock available: 15.0000",
+    ]
+    user.refresh_from_db()
+    assert user.money == Decimal("250.00")
+
+
+@pytest.mark.django_db
+def test_pending_orders_do_not_count_as_holdings(api_client, user, stock, settings):
+    order(api_client, user, stock)
+    # In sync mode a sell can only use executed buys
+    settings.ORDER_EXECUTION_MODE = "sync"
+    resp = order(api_client, user, stock, side="SELL", quantity="5")
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_orders_of_deleted_users_fail(api_client, user, stock):
+    order(api_client, user, stock)
+    user.delete()
+    assert execute_pending() == (0, 1)
+    assert Order.objects.get().failure_reason == "User not found or deleted."
+
+
+@pytest.mark.django_db
+def test_order_without_execution_date_runs_today(api_client, user, stock):
+    resp = api_client.post(
+        reverse("stock-order-create"),
+        {"user_id": user.pk, "stock_id": stock.pk, "side": "BUY", "quantity": "1"},
+        format="json",
+    )
+    assert resp.status_code == status.HTTP_202_ACCEPTED
+    assert Order.objects.get().execution_date == timezone.localdate()
+
+
+@pytest.mark.django_db
+def test_an_order_that_raises_fails_alone(api_client, user, stock):
+    other = User.objects.create(
+        first_name="Next",
+        last_name="Inline",
+        phone_number="778",
+        email="next@example.com",
+        money=Decimal("100.00"),
+    )
+    # A row the serializer no longer lets in, queued ahead of a good one
+    bad = Order.objects.create(
+        user=user, stock=stock, asset_type=Order.ASSET_STOCK, side=Order.BUY, quantity=1, status=Order.PENDING
+    )
+    order(api_client, other, stock, quantity="1")
+
+    assert execute_pending() == (1, 1)
+
+    bad.refresh_from_db()
+    assert bad.status == Order.FAILED
+    assert bad.failure_reason.startswith("Execution error:")
+    assert Order.objects.get(user=other).status == Order.EXECUTED
+    other.refresh_from_db()
+    assert other.money == Decimal("50.00")
+    user.refresh_from_db()
+    assert user.money == Decimal("1000.00")
+
+
+@pytest.mark.django_db(transaction=True)
+def test_worker_pool_drains_the_queue(api_client, user, stock):
+    for _ in range(6):
+        order(api_client, user, stock, quantity="1")
+
+    call_command("run_order_workers", "--processes", "2", "--batch-size", "2", "--once")
+
+    assert Order.objects.filter(status=Order.EXECUTED).count() == 6
+    user.refresh_from_db()
+    assert user.money == Decimal("700.00")
+
+
+@pytest.mark.django_db
+def test_queue_stats(api_client, user, stock):
+    order(api_client, user, stock)
+    order(api_client, user, stock)
+
+    stats = api_client.get(reverse("order-queue-stats")).json()
+    assert stats["pending"] == 2
+    assert stats["oldest_pending_seconds"] >= 0
+
+    execute_pending(batch_size=1)
+    stats = api_client.get(reverse("order-queue-stats"), {"window": 10}).json()
+    assert stats["pending"] == 1
+    assert stats["executed"] == 1
+    assert stats["executed_per_second"] == 0.1
+
+    resp = api_client.get(reverse("order-queue-stats"), {"window": "x"})
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
@@ -0,0 +1,126 @@
+import pytest
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.models import Portfolio, PortfolioComponent, PortfolioVersion, Stock, User
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def portfolio():
+    user = User.objects.create(
+        first_name="Reba",
+        last_name="Lance",
+        phone_number="42",
+        email="rebalance@example.com",
+    )
+    p = Portfolio.objects.create(user=user, name="P", description="", risk=Portfolio.LOW)
+    for symbol, weight in [("AAA", "0.5"), ("BBB", "0.3"), ("CCC", "0.2")]:
+        stock = Stock.objects.create(symbol=symbol, name=symbol)
+        PortfolioComponent.objects.create(portfolio=p, stock=stock, weight=Decimal(weight))
+    Stock.objects.create(symbol="DDD", name="DDD")
+    return p
+
+
+def patch(api_client, portfolio, components):
+    return api_client.patch(
+        reverse("portfolio-components-update", args=[portfolio.pk]),
+        {"components": [{"symbol": s, "weight": w} for s, w in components]},
+        format="json",
+    )
+
+
+def alive_weights(portfolio):
+    return dict(
+        PortfolioComponent.objects.filter(portfolio=portfolio).values_list("stock__symbol", "weight")
+    )
+
+
+@pytest.mark.django_db
+def test_components_are_diffed(api_client, portfolio):
+    before = portfolio.updated_at
+    resp = patch(api_client, portfolio, [("AAA", "0.5"), ("BBB", "0.2"), ("DDD", "0.3")])
+
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.data["added"] == ["DDD"]
+    assert resp.data["updated"] == ["BBB"]
+    assert resp.data["removed"] == ["CCC"]
+    assert alive_weights(portfolio) == {
+        "AAA": Decimal("0.5000"),
+        "BBB": Decimal("0.2000"),
+        "DDD": Decimal("0.3000"),
+    }
+    # The unchanged row was not rewritten
+    aaa = PortfolioComponent.objects.get(portfolio=portfolio, stock__symbol="AAA")
+    assert aaa.updated_at < PortfolioComponent.objects.get(portfolio=portfolio, stock__symbol="BBB").updated_at
+
+    portfolio.refresh_from_db()
+    assert portfolio.updated_at > before
+    version = PortfolioVersion.as_of(portfolio.pk, timezone.localdate())
+    assert sorted(version.weights.values()) == ["0.2000", "0.3000", "0.5000"]
+
+
+@pytest.mark.django_db
+def test_removed_component_is_revived_in_place(api_client, portfolio):
+    patch(api_client, portfolio, [("AAA", "0.5"), ("BBB", "0.5")])
+    ccc = PortfolioComponent.all_objects.get(portfolio=portfolio, stock__symbol="CCC")
+    assert ccc.is_deleted
+
+    resp = patch(api_client, portfolio, [("AAA", "0.5"), ("BBB", "0.3"), ("CCC", "0.2")])
+    assert resp.data["added"] == ["CCC"]
+    revived = PortfolioComponent.all_objects.get(portfolio=portfolio, stock__symbol="CCC")
+    assert revived.pk == ccc.pk
+    assert not revived.is_deleted
+    assert PortfolioComponent.all_objects.filter(portfolio=portfolio).count() == 3
+
+
+@pytest.mark.django_db
+def test_unchanged_composition_writes_nothing(api_client, portfolio):
+    resp = patch(api_client, portfolio, [("AAA", "0.5"), ("BBB", "0.3"), ("CCC", "0.2")])
+    assert resp.data["added"] == resp.data["updated"] == resp.data["removed"] == []
+    assert not PortfolioVersion.objects.filter(portfolio=portfolio).exists()
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize(
+    "components, message",
+    [
+        ([], "at least one"),
+        ([("AAA", "0.5"), ("AAA", "0.5")], "only once"),
+        ([("AAA", "0.5"), ("ZZZ", "0.5")], "Unknown symbols: ZZZ"),
+        ([("AAA", "0.5"), ("BBB", "0.4")], "sum to 1"),
+    ],
+)
+def test_invalid_compositions_are_rejected(api_client, portfolio, components, message):
+    resp = patch(api_client, portfolio, components)
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+    assert message in str(resp.data["components"])
+    assert len(alive_weights(portfolio)) == 3
+
+
+@pytest.mark.django_db
+def test_query_count_does_not_grow_with_components(api_client, portfolio):
+    stocks = Stock.objects.bulk_create([Stock(symbol=f"S{i:03}", name="S") for i in range(408)])
+
+    def queries(chosen, weight):
+        with CaptureQueriesContext(connection) as captured:
+            resp = patch(api_client, portfolio, [(s.symbol, weight) for s in chosen])
+            assert resp.status_code == status.HTTP_200_OK
+        return len(captured)
+
+    # The first change of the day creates the version row, later ones update it
+    queries(stocks[:4], "0.25")
+    small = queries(stocks[4:8], "0.25")
+    # 400 components added and 4 removed, then the other way around
+    assert queries(stocks[8:], "0.0025") == small
+    assert len(alive_weights(portfolio)) == 400
+    assert queries(stocks[4:8], "0.25") == small
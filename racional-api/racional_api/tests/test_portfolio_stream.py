@@ -0,0 +1,169 @@
+import asyncio
+import json
+from decimal import Decimal
+
+import pytest
+from asgiref.sync import async_to_sync, sync_to_async
+from django.core.cache import cache
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from racional_api.models import Order, Stock, StockPrice, Transaction, User
+from racional_api.stream import PortfolioStreamHub, get_hub
+
+# The hub reads from its own thread and connection, so data must be committed
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def user():
+    user = User.objects.create(
+        first_name="Live",
+        last_name="Stream",
+        phone_number="123",
+        email="live@example.com",
+    )
+    deposit(user, "1000.00")
+    return user
+
+
+@pytest.fixture
+def stock():
+    stock = Stock.objects.create(symbol="STR", name="Stream Corp")
+    StockPrice.objects.create(stock=stock, value=10.0, date=timezone.now())
+    return stock
+
+
+def deposit(user, amount):
+    Transaction.objects.create(
+        user=user,
+        transaction_type=Transaction.DEPOSIT,
+        amount=Decimal(amount),
+        execution_date=timezone.localdate(),
+    )
+
+
+def buy(user, stock, quantity):
+    Order.objects.create(
+        user=user,
+        asset_type=Order.ASSET_STOCK,
+        stock=stock,
+        side=Order.BUY,
+        quantity=Decimal(quantity),
+        execution_price=Decimal("10.00"),
+        execution_date=timezone.localdate(),
+        status=Order.EXECUTED,
+    )
+
+
+def parse(event):
+    fields = dict(line.split(": ", 1) for line in event.strip().splitlines())
+    return fields["event"], json.loads(fields["data"])
+
+
+async def next_event(queue):
+    return parse(await asyncio.wait_for(queue.get(), 5))
+
+
+def test_stream_unknown_user_returns_404():
+    async def run():
+        response = await AsyncClient().get(reverse("user-portfolio-stream", args=[999999]))
+        await get_hub().close()
+        return response
+
+    assert async_to_sync(run)().status_code == 404
+
+
+@override_settings(PORTFOLIO_STREAM_POLL_INTERVAL=0.05)
+def test_stream_sends_total_on_connect_and_after_deposit(user):
+    async def run():
+        response = await AsyncClient().get(reverse("user-portfolio-stream", args=[user.pk]))
+        assert response["Content-Type"] == "text/event-stream"
+        received = asyncio.Queue()
+
+        async def read():
+            async for chunk in response.streaming_content:
+                await received.put(chunk.decode())
+
+        reader = asyncio.create_task(read())
+        first = parse(await asyncio.wait_for(received.get(), 5))
+        await sync_to_async(deposit)(user, "250.00")
+        second = parse(await asyncio.wait_for(received.get(), 5))
+        # What the ASGI handler does when the client disconnects, then the
+        # poller stops and closes its connection
+        reader.cancel()
+        await asyncio.sleep(0.2)
+        return first, second
+
+    first, second = async_to_sync(run)()
+
+    assert first[0] == second[0] == "total"
+    assert Decimal(first[1]["cash"]) == Decimal("1000.00")
+    assert Decimal(second[1]["cash"]) == Decimal("1250.00")
+
+
+def test_hub_sends_new_total_when_held_stock_is_priced(user, stock):
+    buy(user, stock, "2")
+    other = Stock.objects.create(symbol="OTH", name="Other Corp")
+
+    async def run():
+        hub = PortfolioStreamHub(interval=60)
+        queue = await hub.subscribe(user.pk)
+        first = await next_event(queue)
+
+        # Prices of stocks the user never traded do not trigger a recompute
+        await sync_to_async(StockPrice.objects.create)(stock=other, value=99.0, date=timezone.now())
+        await hub.refresh()
+        assert queue.empty()
+
+        await sync_to_async(StockPrice.objects.create)(stock=stock, value=15.0, date=timezone.now())
+        await hub.refresh()
+        second = await next_event(queue)
+        hub.unsubscribe(user.pk, queue)
+        await hub.close()
+        return first, second
+
+    first, second = async_to_sync(run)()
+
+    assert Decimal(first[1]["stocks_total"]) == Decimal("20.00")
+    assert Decimal(second[1]["stocks_total"]) == Decimal("30.00")
+
+
+def test_hub_computes_once_for_all_subscribers(user, monkeypatch):
+    calls = []
+    real_changes = PortfolioStreamHub.changes
+
+    def counting(hub, user_ids):
+        changed = real_changes(hub, user_ids)
+        calls.extend(changed)
+        return changed
+
+    monkeypatch.setattr(PortfolioStreamHub, "changes", counting)
+
+    async def run():
+        hub = PortfolioStreamHub(interval=60)
+        queues = await asyncio.gather(*(hub.subscribe(user.pk) for _ in range(50)))
+        firsts = [await next_event(queue) for queue in queues]
+
+        await sync_to_async(deposit)(user, "5.00")
+        await hub.refresh()
+        # Nothing changed since, no new events
+        await hub.refresh()
+        seconds = [await next_event(queue) for queue in queues]
+        assert all(queue.empty() for queue in queues)
+        for queue in queues:
+            hub.unsubscribe(user.pk, queue)
+        await hub.close()
+        return firsts, seconds
+
+    firsts, seconds = async_to_sync(run)()
+
+    assert calls == [user.pk, user.pk]
+    assert {Decimal(data["cash"]) for _, data in firsts} == {Decimal("1000.00")}
+    assert {Decimal(data["cash"]) for _, data in seconds} == {Decimal("1005.00")}
@@ -0,0 +1,193 @@
+import pytest
+import numpy as np
+from decimal import Decimal
+from datetime import date, timedelta
+from django.core.cache import cache
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.analytics import basket_returns, composition_versions, price_matrix, weight_matrix
+from racional_api.models import Portfolio, PortfolioComponent, PortfolioVersion, Stock, StockPrice, User
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Vera",
+        last_name="Sion",
+        phone_number="41",
+        email="versions@example.com",
+    )
+
+
+@pytest.fixture
+def stocks():
+    """UP gains 10% a day over five days, FLAT stays at 100."""
+    midnight = timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    up = Stock.objects.create(symbol="UP", name="Up Corp")
+    flat = Stock.objects.create(symbol="FLAT", name="Flat Corp")
+    for day in range(5):
+        when = midnight - timedelta(days=4 - day)
+        StockPrice.objects.create(stock=up, value=100 * 1.1**day, date=when)
+        StockPrice.objects.create(stock=flat, value=100, date=when)
+    return up, flat
+
+
+def set_components(portfolio, weights, day):
+    PortfolioComponent.all_objects.filter(portfolio=portfolio).delete()
+    for stock, weight in weights.items():
+        PortfolioComponent.objects.create(portfolio=portfolio, stock=stock, weight=Decimal(weight))
+    return PortfolioVersion.record(portfolio, day)
+
+
+@pytest.mark.django_db
+def test_created_portfolio_has_a_current_version(api_client, user, stocks):
+    up, flat = stocks
+    resp = api_client.post(
+        reverse("portfolio-create"),
+        {
+            "user_id": user.pk,
+            "name": "Mix",
+            "description": "",
+            "risk": "LOW",
+            "components": [{"symbol": "UP", "weight": "0.6"}, {"symbol": "FLAT", "weight": "0.4"}],
+        },
+        format="json",
+    )
+    assert resp.status_code == status.HTTP_201_CREATED
+
+    version = PortfolioVersion.objects.get(portfolio_id=resp.data["id"])
+    assert version.valid_from == timezone.localdate()
+    assert version.valid_to is None
+
+    resp = api_client.get(reverse("portfolio-composition", args=[resp.data["id"]]))
+    assert resp.status_code == status.HTTP_200_OK
+    assert [(c["symbol"], c["weight"]) for c in resp.data["components"]] == [
+        ("UP", "0.6000"),
+        ("FLAT", "0.4000"),
+    ]
+
+
+@pytest.mark.django_db
+def test_weights_as_of_a_date(api_client, user, stocks):
+    up, flat = stocks
+    portfolio = Portfolio.objects.create(user=user, name="P", description="", risk=Portfolio.LOW)
+    jan, mar = date(2024, 1, 1), date(2024, 3, 1)
+    first = set_components(portfolio, {up: "1.0"}, jan)
+    second = set_components(portfolio, {up: "0.5", flat: "0.5"}, mar)
+
+    first.refresh_from_db()
+    assert first.valid_to == mar
+    assert PortfolioVersion.as_of(portfolio.pk, date(2023, 12, 31)) is None
+    assert PortfolioVersion.as_of(portfolio.pk, jan) == first
+    assert PortfolioVersion.as_of(portfolio.pk, date(2024, 2, 29)) == first
+    assert PortfolioVersion.as_of(portfolio.pk, mar) == second
+
+    # A second change the same day replaces that day's version
+    third = set_components(portfolio, {flat: "1.0"}, mar)
+    assert third.pk == second.pk
+    assert PortfolioVersion.objects.filter(portfolio=portfolio).count() == 2
+
+    url = reverse("portfolio-composition", args=[portfolio.pk])
+    resp = api_client.get(url, {"date": "2024-02-01"})
+    assert resp.data["valid_from"] == "2024-01-01"
+    assert resp.data["valid_to"] == "2024-03-01"
+    assert [c["symbol"] for c in resp.data["components"]] == ["UP"]
+
+    assert api_client.get(url, {"date": "2023-06-01"}).status_code == status.HTTP_404_NOT_FOUND
+    assert api_client.get(url, {"date": "nope"}).status_code == status.HTTP_400_BAD_REQUEST
+
+
+def test_weight_matrix_picks_the_version_of_each_day():
+    days = np.arange("2024-01-01", "2024-01-08", dtype="datetime64[D]")
+    versions = [
+        (date(2024, 1, 2), date(2024, 1, 4), {"1": "1.0"}),
+        (date(2024, 1, 4), date(2024, 1, 6), {"1": "0.5", "2": "0.5"}),
+        # Gap on the 6th
+        (date(2024, 1, 7), None, {"2": "1.0"}),
+    ]
+    weights = weight_matrix(versions, [1, 2], days)
+    assert weights.tolist() == [
+        [0, 0],
+        [1, 0],
+        [1, 0],
+        [0.5, 0.5],
+        [0.5, 0.5],
+        [0, 0],
+        [0, 1],
+    ]
+
+
+@pytest.mark.django_db
+def test_basket_follows_the_composition_in_effect(api_client, user, stocks):
+    up, flat = stocks
+    portfolio = Portfolio.objects.create(user=user, name="P", description="", risk=Portfolio.LOW)
+    today = timezone.localdate()
+    set_components(portfolio, {up: "1.0"}, today - timedelta(days=10))
+    # From two days ago the basket holds only FLAT
+    set_components(portfolio, {flat: "1.0"}, today - timedelta(days=2))
+
+    versions = composition_versions(portfolio)
+    days, prices = price_matrix([up.pk, flat.pk])
+    returns = basket_returns(prices, weight_matrix(versions, [up.pk, flat.pk], days))
+    assert np.allclose(returns, [0.1, 0.1, 0.0, 0.0])
+
+    resp = api_client.get(reverse("portfolio-analytics", args=[portfolio.pk]))
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.data["basket"]["time_weighted_return"] == pytest.approx(0.21)
+
+
+@pytest.mark.django_db
+def test_unversioned_portfolio_uses_its_components(api_client, user, stocks):
+    up, flat = stocks
+    portfolio = Portfolio.objects.create(user=user, name="Old", description="", risk=Portfolio.LOW)
+    PortfolioComponent.objects.create(portfolio=portfolio, stock=up, weight=Decimal("1.0"))
+
+    resp = api_client.get(reverse("portfolio-composition", args=[portfolio.pk]), {"date": "2000-01-01"})
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.data["valid_from"] is None
+    assert [c["symbol"] for c in resp.data["components"]] == ["UP"]
+
+    resp = api_client.get(reverse("portfolio-analytics", args=[portfolio.pk]))
+    assert resp.data["basket"]["time_weighted_return"] == pytest.approx(0.4641)
+
+
+@pytest.mark.django_db
+def test_first_update_of_an_unversioned_portfolio_keeps_its_history(api_client, user, stocks):
+    up, flat = stocks
+    portfolio = Portfolio.objects.create(user=user, name="Old", description="", risk=Portfolio.LOW)
+    PortfolioComponent.objects.create(portfolio=portfolio, stock=up, weight=Decimal("1.0"))
+    created = timezone.now() - timedelta(days=10)
+    Portfolio.objects.filter(pk=portfolio.pk).update(created_at=created)
+    portfolio.refresh_from_db()
+
+    resp = api_client.patch(
+        reverse("portfolio-components-update", args=[portfolio.pk]),
+        {"components": [{"symbol": "FLAT", "weight": "1.0"}]},
+        format="json",
+    )
+    assert resp.status_code == status.HTTP_200_OK
+
+    today = timezone.localdate()
+    versions = list(PortfolioVersion.objects.filter(portfolio=portfolio).order_by("valid_from"))
+    assert [(v.valid_from, v.valid_to, v.weights) for v in versions] == [
+        (timezone.localdate(created), today, {str(up.pk): "1.0000"}),
+        (today, None, {str(flat.pk): "1.0000"}),
+    ]
+
+    # UP is held until today, when FLAT replaces it
+    past = {"from": str(today - timedelta(days=4)), "to": str(today - timedelta(days=1))}
+    resp = api_client.get(reverse("portfolio-analytics", args=[portfolio.pk]), past)
+    assert resp.data["basket"]["time_weighted_return"] == pytest.approx(0.331)
@@ -15,6 +15,7 @@ from racional_api.models import (
     Transaction,
     Order,
 )
+from racional_api.serializers import PortfolioCreateSerializer
 
 @pytest.fixture
 def api_client():
@@ -189,3 +190,71 @@ def test_user_portfolio_total_values(api_client, user, stocks_and_prices):
     # positions should include the AAA position with quantity 10
     positions = resp.data["positions"]
     assert any(p["symbol"] == s1.symbol and Decimal(p["quantity"]) == Decimal("10") for p in positions)
+
+
+@pytest.mark.django_db
+def test_user_portfolio_total_nets_sells_in_constant_queries(api_client, user, stocks_and_prices, django_assert_max_num_queries):
+    s1, s2 = stocks_and_prices
+    for side, stock, qty in [
+        (Order.BUY, s1, "10"),
+        (Order.SELL, s1, "4"),
+        (Order.BUY, s2, "2"),
+        (Order.SELL, s2, "2"),
+    ]:
+        Order.objects.create(
+            user=user,
+            stock=stock,
+            side=side,
+            quantity=Decimal(qty),
+            execution_price=Decimal("10.00"),
+            execution_date=date.today(),
+            asset_type=Order.ASSET_STOCK,
+        )
+
+    url = reverse("user-portfolio-total", args=[user.pk])
+    with django_assert_max_num_queries(5):
+        resp = api_client.get(url, format="json")
+    assert resp.status_code == status.HTTP_200_OK
+
+    # BBB was fully sold, AAA keeps 6 units valued at the latest price (11.00)
+    positions = resp.data["positions"]
+    assert [p["symbol"] for p in positions] == ["AAA"]
+    assert Decimal(positions[0]["quantity"]) == Decimal("6")
+    assert Decimal(resp.data["stocks_total"]) == Decimal("66.00")
+
+@pytest.mark.django_db
+def test_user_portfolios_listing_shape_and_queries(api_client, user, stocks_and_prices, django_assert_num_queries):
+    portfolios = Portfolio.objects.bulk_create(
+        Portfolio(user=user, name=f"P{i}", description="d", risk=Portfolio.LOW) for i in range(200)
+    )
+    PortfolioComponent.objects.bulk_create(
+        PortfolioComponent(portfolio=p, stock=stock, weight=weight)
+        for p in portfolios
+        for stock, weight in zip(stocks_and_prices, [Decimal("0.4"), Decimal("0.6")])
+    )
+
+    url = reverse("portfolio-list", args=[user.pk])
+    # User check, portfolios, components joined with their stocks
+    with django_assert_num_queries(3):
+        resp = api_client.get(url, format="json")
+
+    assert len(resp.json()) == 200
+    expected = PortfolioCreateSerializer(portfolios[:3], many=True).data
+    assert resp.json()[:3] == [dict(p) for p in expected]
+
+
+@pytest.mark.django_db
+def test_user_portfolios_listing_skips_deleted_components_and_paginates(api_client, user, stocks_and_prices):
+    for i in range(3):
+        p = Portfolio.objects.create(user=user, name=f"P{i}", description="d", risk=Portfolio.LOW)
+        PortfolioComponent.objects.create(portfolio=p, stock=stocks_and_prices[0], weight=Decimal("1.0"))
+        PortfolioComponent.objects.create(portfolio=p, stock=stocks_and_prices[1], weight=Decimal("0.5"), is_deleted=True)
+
+    url = reverse("portfolio-list", args=[user.pk])
+    resp = api_client.get(url, {"limit": 2, "offset": 1}, format="json")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.data["count"] == 3
+    assert [p["name"] for p in resp.data["results"]] == ["P1", "P2"]
+    assert all(
+        [c["symbol"] for c in p["components"]] == ["AAA"] for p in resp.data["results"]
+    )
@@ -0,0 +1,110 @@
+import gzip
+import json
+import pytest
+from decimal import Decimal
+
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from racional_api.models import Transaction, User
+from racional_api.renderers import FastJSONRenderer
+from racional_api.serializers import MovementSerializer
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Wire",
+        last_name="Bytes",
+        phone_number="200",
+        email="wire@example.com",
+    )
+
+
+def deposit(user, amount):
+    return Transaction.objects.create(
+        user=user,
+        transaction_type=Transaction.DEPOSIT,
+        amount=Decimal(amount),
+        execution_date=timezone.localdate(),
+    )
+
+
+def test_row_serializer_renders_missing_nullable_keys_as_null():
+    row = {
+        "type": "TRANSACTION",
+        "subtype": "DEPOSIT",
+        "amount": Decimal("10"),
+        "date": timezone.localdate(),
+        "created_at": timezone.now(),
+    }
+    data = MovementSerializer(row).data
+
+    assert data["amount"] == "10.00"
+    assert data["symbol"] is None
+    assert data["execution_price"] is None
+
+
+def test_fast_renderer_matches_drf_on_serializer_output():
+    now = timezone.now()
+    movements = [
+        {
+            "type": "ORDER",
+            "subtype": "BUY",
+            "asset_type": "STOCK",
+            "symbol": "ÑU",
+            "portfolio_id": None,
+            "amount": None,
+            "quantity": Decimal("1.5"),
+            "execution_price": Decimal("12.34567"),
+            "value": Decimal("18.52"),
+            "date": now.date(),
+            "created_at": now,
+        }
+    ]
+    data = MovementSerializer(movements, many=True).data
+
+    assert FastJSONRenderer().render(data) == JSONRenderer().render(data)
+
+
+def test_fast_renderer_writes_decimals_as_exact_strings():
+    rendered = FastJSONRenderer().render({"value": Decimal("0.10000000000000000001"), 1: None})
+    assert json.loads(rendered) == {"value": "0.10000000000000000001", "1": None}
+
+
+@pytest.mark.django_db
+def test_large_responses_are_gzipped(api_client, user):
+    for i in range(50):
+        deposit(user, f"{i}.00")
+
+    resp = api_client.get(reverse("transaction-list", args=[user.pk]), HTTP_ACCEPT_ENCODING="gzip")
+
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in resp["Vary"]
+    assert len(json.loads(gzip.decompress(resp.content))) == 50
+
+    # The weakened ETag still validates the compressed response
+    again = api_client.get(
+        reverse("transaction-list", args=[user.pk]), HTTP_ACCEPT_ENCODING="gzip", HTTP_IF_NONE_MATCH=resp["ETag"]
+    )
+    assert again.status_code == status.HTTP_304_NOT_MODIFIED
+
+
+@pytest.mark.django_db
+def test_small_responses_are_not_compressed(api_client, user):
+    deposit(user, "10.00")
+
+    resp = api_client.get(reverse("transaction-list", args=[user.pk]), HTTP_ACCEPT_ENCODING="gzip")
+
+    assert resp.status_code == status.HTTP_200_OK
+    assert not resp.has_header("Content-Encoding")
+    assert len(resp.json()) == 1
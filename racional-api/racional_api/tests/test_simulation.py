@@ -0,0 +1,160 @@
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pytest
+from decimal import Decimal
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api import simulation
+from racional_api.models import Portfolio, PortfolioComponent, Stock, StockPrice, User
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Monte",
+        last_name="Carlo",
+        phone_number="777",
+        email="montecarlo@example.com",
+    )
+
+
+def priced_portfolio(user, series, risk=Portfolio.MEDIUM):
+    """Portfolio with one stock per price series, equally weighted, one price per day up to today."""
+    midnight = timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    portfolio = Portfolio.objects.create(user=user, name="Sim", description="", risk=risk)
+    for i, prices in enumerate(series):
+        stock = Stock.objects.create(symbol=f"SIM{i}", name=f"Sim {i}")
+        first = midnight - timedelta(days=len(prices) - 1)
+        StockPrice.objects.bulk_create(
+            [StockPrice(stock=stock, value=float(price), date=first + timedelta(days=day)) for day, price in enumerate(prices)]
+        )
+        PortfolioComponent.objects.create(portfolio=portfolio, stock=stock, weight=Decimal(1) / len(series))
+    return portfolio
+
+
+def random_walk(seed, days=300):
+    return 100 * np.cumprod(1 + np.random.default_rng(seed).normal(0.0005, 0.01, days))
+
+
+def simulate(api_client, portfolio, **body):
+    return api_client.post(reverse("portfolio-simulate", args=[portfolio.pk]), body, format="json")
+
+
+@pytest.mark.django_db
+def test_constant_growth_has_one_outcome(api_client, user):
+    portfolio = priced_portfolio(user, [100 * 1.001 ** np.arange(60)])
+
+    resp = simulate(api_client, portfolio, years=2, initial_amount="1000.00", monthly_contribution="100.00", paths=500)
+
+    assert resp.status_code == status.HTTP_200_OK
+    month = 1.001 ** 21
+    expected = 1000 * month ** 12 + 100 * sum(month ** (12 - k) for k in range(1, 13))
+    year_one = resp.data["bands"][1]
+    assert year_one["contributed"] == pytest.approx(2200.0)
+    for p in ("p5", "p50", "p95"):
+        assert year_one[p] == pytest.approx(expected, abs=0.01)
+    assert [band["year"] for band in resp.data["bands"]] == [0, 1, 2]
+    assert resp.data["bands"][0]["p50"] == pytest.approx(1000.0)
+    assert resp.data["probability_of_loss"] == 0.0
+    assert resp.data["history_days"] == 59
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("method", ["bootstrap", "normal"])
+def test_bands_are_ordered_and_widen(api_client, user, method):
+    portfolio = priced_portfolio(user, [random_walk(1), random_walk(2)])
+
+    resp = simulate(api_client, portfolio, years=5, initial_amount="10000.00", paths=2000, method=method, seed=7)
+
+    assert resp.status_code == status.HTTP_200_OK
+    bands = resp.data["bands"]
+    assert all(b["p5"] <= b["p25"] <= b["p50"] <= b["p75"] <= b["p95"] for b in bands)
+    spreads = [b["p95"] - b["p5"] for b in bands]
+    assert spreads == sorted(spreads)
+    assert resp.data["annual_volatility"] > 0
+
+
+@pytest.mark.django_db
+def test_seeded_result_does_not_depend_on_processes(user, settings):
+    portfolio = priced_portfolio(user, [random_walk(3)])
+    settings.SIMULATION_CHUNK_PATHS = 250
+    params = dict(years=3, initial_amount=Decimal("500"), monthly_contribution=Decimal("50"), paths=1000, seed=11)
+
+    settings.SIMULATION_PROCESSES = 1
+    single = simulation.simulate_portfolio(portfolio, **params)
+    settings.SIMULATION_PROCESSES = 2
+    try:
+        pooled = simulation.simulate_portfolio(portfolio, **params)
+    finally:
+        simulation._pool.shutdown()
+        simulation._pool = None
+
+    assert pooled == single
+
+
+def test_pool_workers_do_not_load_django():
+    script = "import sys, racional_api.simulation; print(any(name.startswith('django') for name in sys.modules))"
+    env = {key: value for key, value in os.environ.items() if key != "DJANGO_SETTINGS_MODULE"}
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+
+    assert output.strip() == "False"
+
+
+@pytest.mark.django_db
+def test_results_are_cached_until_a_new_price(api_client, user, monkeypatch):
+    portfolio = priced_portfolio(user, [random_walk(4)])
+    calls = []
+    real = simulation.simulate_portfolio
+    monkeypatch.setattr(simulation, "simulate_portfolio", lambda *a, **kw: calls.append(1) or real(*a, **kw))
+    body = dict(years=10, initial_amount="1000.00", monthly_contribution="10.00")
+
+    first = simulate(api_client, portfolio, **body)
+    with CaptureQueriesContext(connection) as ctx:
+        second = simulate(api_client, portfolio, **body)
+    cached_queries = len(ctx.captured_queries)
+    # Other contributions are another projection
+    simulate(api_client, portfolio, **{**body, "monthly_contribution": "20.00"})
+
+    assert first.status_code == second.status_code == status.HTTP_200_OK
+    assert second.data == first.data
+    assert cached_queries == 2
+    assert len(calls) == 2
+
+    StockPrice.objects.create(stock=portfolio.components.get().stock, value=1.0, date=timezone.now())
+    simulate(api_client, portfolio, **body)
+    assert len(calls) == 3
+
+
+@pytest.mark.django_db
+def test_simulation_validation(api_client, user):
+    short = priced_portfolio(user, [[100, 101, 102]])
+
+    assert simulate(api_client, short, initial_amount="1000.00").status_code == status.HTTP_400_BAD_REQUEST
+    assert simulate(api_client, short, initial_amount="0").status_code == status.HTTP_400_BAD_REQUEST
+    assert simulate(api_client, short, initial_amount="10", paths=10).status_code == status.HTTP_400_BAD_REQUEST
+    resp = api_client.post(reverse("portfolio-simulate", args=[999999]), {"initial_amount": "10"}, format="json")
+    assert resp.status_code == status.HTTP_404_NOT_FOUND
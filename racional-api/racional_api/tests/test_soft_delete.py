@@ -0,0 +1,106 @@
+import pytest
+from decimal import Decimal
+from datetime import date, timedelta
+from django.db import connection
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.models import Order, Portfolio, PortfolioComponent, Stock, StockPrice, Transaction, User
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Soft",
+        last_name="Delete",
+        phone_number="404",
+        email="soft@example.com",
+        money=Decimal("1000.00"),
+    )
+
+
+@pytest.fixture
+def stock():
+    s = Stock.objects.create(symbol="SOFT", name="Soft Corp")
+    StockPrice.objects.create(stock=s, value=10.0, date=timezone.now() - timedelta(days=1))
+    return s
+
+
+@pytest.mark.django_db
+def test_default_manager_skips_deleted_rows(user, stock):
+    portfolio = Portfolio.objects.create(user=user, name="P", description="", risk=Portfolio.LOW)
+    kept = PortfolioComponent.objects.create(portfolio=portfolio, stock=stock, weight=Decimal("1.0"))
+    other = Stock.objects.create(symbol="GONE", name="Gone Corp")
+    removed = PortfolioComponent.objects.create(portfolio=portfolio, stock=other, weight=Decimal("0.5"))
+    removed.delete()
+    other.delete()
+
+    assert list(Stock.objects.all()) == [stock]
+    assert Stock.all_objects.count() == 2
+    assert list(portfolio.components.all()) == [kept]
+    # Forward relations still reach deleted rows
+    assert PortfolioComponent.all_objects.get(pk=removed.pk).stock == other
+
+
+@pytest.mark.django_db
+def test_transaction_list_skips_deleted_transactions(api_client, user):
+    kept = Transaction.objects.create(
+        user=user, transaction_type=Transaction.DEPOSIT, amount=Decimal("10.00"), execution_date=date.today()
+    )
+    Transaction.objects.create(
+        user=user, transaction_type=Transaction.DEPOSIT, amount=Decimal("20.00"), execution_date=date.today()
+    ).delete()
+
+    resp = api_client.get(reverse("transaction-list", args=[user.pk]), format="json")
+    assert [t["id"] for t in resp.data] == [kept.pk]
+
+
+@pytest.mark.django_db
+def test_sell_ignores_deleted_buys(api_client, user, stock):
+    Order.objects.create(
+        user=user,
+        stock=stock,
+        side=Order.BUY,
+        asset_type=Order.ASSET_STOCK,
+        quantity=Decimal("5"),
+        execution_price=Decimal("10"),
+        execution_date=date.today(),
+    ).delete()
+
+    payload = {
+        "user_id": user.pk,
+        "stock_id": stock.pk,
+        "side": Order.SELL,
+        "quantity": "1",
+        "execution_date": str(date.today()),
+    }
+    resp = api_client.post(reverse("stock-order-create"), payload, format="json")
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+
+
+@pytest.mark.django_db
+def test_email_of_deleted_user_is_still_taken(api_client, user):
+    user.delete()
+    payload = {"email": user.email, "first_name": "New", "last_name": "User", "phone_number": "1"}
+    resp = api_client.post(reverse("user-list"), payload, format="json")
+    assert resp.status_code == status.HTTP_400_BAD_REQUEST
+    assert "email" in resp.data
+
+
+@pytest.mark.django_db
+def test_alive_partial_indexes_exist():
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, Order._meta.db_table)
+    assert "order_user_stock_alive" in constraints
+    # Lookups by id use the primary key, there is no second index on it
+    assert "order_alive" not in constraints
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT indexdef FROM pg_indexes WHERE indexname = 'order_user_stock_alive'")
+        assert "WHERE (NOT is_deleted)" in cursor.fetchone()[0]
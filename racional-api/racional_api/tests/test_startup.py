@@ -0,0 +1,86 @@
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+import httpx
+import pytest
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from racional_api import schema
+from racional_api.schema import PrebuiltSchemaView
+
+
+@pytest.fixture(autouse=True)
+def fresh_schema(monkeypatch):
+    monkeypatch.setattr(schema, "_schema", None)
+
+
+def test_startup_does_not_import_numpy():
+    script = (
+        "import sys, django; django.setup()\n"
+        "from django.urls import get_resolver; get_resolver().url_patterns\n"
+        "print('numpy' in sys.modules)"
+    )
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": "project.settings"}
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+
+    assert output.strip() == "False"
+
+
+def test_schema_is_served_from_the_prebuilt_file(tmp_path, settings):
+    prebuilt = {"openapi": "3.0.3", "info": {"title": "Prebuilt", "version": "1.0.0"}, "paths": {}}
+    settings.OPENAPI_SCHEMA_FILE = tmp_path / "openapi.json"
+    settings.OPENAPI_SCHEMA_FILE.write_text(json.dumps(prebuilt))
+
+    resp = APIClient().get(reverse("schema"), HTTP_ACCEPT="application/vnd.oai.openapi+json")
+
+    assert resp.status_code == 200
+    assert json.loads(resp.content) == prebuilt
+
+
+def test_schema_is_generated_once_without_the_file(tmp_path, settings, monkeypatch):
+    settings.OPENAPI_SCHEMA_FILE = tmp_path / "missing.json"
+    calls = []
+    real_get_schema = PrebuiltSchemaView.generator_class.get_schema
+
+    def counting(generator, *args, **kwargs):
+        calls.append(1)
+        return real_get_schema(generator, *args, **kwargs)
+
+    monkeypatch.setattr(PrebuiltSchemaView.generator_class, "get_schema", counting)
+    client = APIClient()
+
+    first = client.get(reverse("schema"), HTTP_ACCEPT="application/vnd.oai.openapi+json")
+    second = client.get(reverse("schema"), HTTP_ACCEPT="application/vnd.oai.openapi+json")
+
+    assert first.status_code == second.status_code == 200
+    assert "/api/users/{user_id}/dashboard/" in json.loads(first.content)["paths"]
+    assert second.content == first.content
+    assert len(calls) == 1
+
+
+def test_development_server_serves_static_files(settings):
+    import project.asgi
+
+    settings.DEBUG = True
+    try:
+        application = importlib.reload(project.asgi).application
+    finally:
+        settings.DEBUG = False
+        importlib.reload(project.asgi)
+
+    async def get(path):
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://localhost") as client:
+            return await client.get(path)
+
+    resp = async_to_sync(get)(f"{settings.STATIC_URL}admin/css/base.css")
+    assert resp.status_code == 200
+    assert resp.headers["content-type"].startswith("text/css")
@@ -0,0 +1,115 @@
+import io
+import numpy as np
+import pytest
+from datetime import date, datetime, timedelta
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.models import Stock, StockPrice
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def stock():
+    """Daily prices for January and February 2025, 1.0 on Jan 1st up to 59.0 on Feb 28th."""
+    s = Stock.objects.create(symbol="CHRT", name="Chart Corp")
+    first = timezone.make_aware(datetime(2025, 1, 1, 12))
+    StockPrice.objects.bulk_create(
+        StockPrice(stock=s, value=float(day + 1), date=first + timedelta(days=day))
+        for day in range(59)
+    )
+    return s
+
+
+@pytest.mark.django_db
+def test_stock_list(api_client, stock):
+    Stock.objects.create(symbol="GONE", name="Gone Corp", is_deleted=True)
+    resp = api_client.get(reverse("stock-list"), format="json")
+    assert resp.status_code == status.HTTP_200_OK
+    assert [s["symbol"] for s in resp.data] == ["CHRT"]
+
+
+@pytest.mark.django_db
+def test_daily_prices_with_range(api_client, stock):
+    url = reverse("stock-price-history", args=["chrt"])
+    resp = api_client.get(url, {"from": "2025-01-10", "to": "2025-01-12"}, format="json")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp.data["symbol"] == "CHRT"
+    assert [p["date"] for p in resp.data["points"]] == ["2025-01-10", "2025-01-11", "2025-01-12"]
+    assert [p["close"] for p in resp.data["points"]] == [10.0, 11.0, 12.0]
+
+
+@pytest.mark.django_db
+def test_monthly_ohlc_buckets(api_client, stock):
+    resp = api_client.get(reverse("stock-price-history", args=["CHRT"]), {"interval": "month"}, format="json")
+    assert resp.data["points"] == [
+        {"date": "2025-01-01", "open": 1.0, "high": 31.0, "low": 1.0, "close": 31.0},
+        {"date": "2025-02-01", "open": 32.0, "high": 59.0, "low": 32.0, "close": 59.0},
+    ]
+
+    resp = api_client.get(reverse("stock-price-history", args=["CHRT"]), {"interval": "week"}, format="json")
+    # Weeks start on Monday: Dec 30th 2024 holds Jan 1st to 5th
+    assert resp.data["points"][0] == {"date": "2024-12-30", "open": 1.0, "high": 5.0, "low": 1.0, "close": 5.0}
+
+
+@pytest.mark.django_db
+def test_max_points_merges_buckets(api_client, stock):
+    resp = api_client.get(reverse("stock-price-history", args=["CHRT"]), {"max_points": 10}, format="json")
+    points = resp.data["points"]
+    assert len(points) == 10
+    assert points[0]["open"] == 1.0 and points[-1]["close"] == 59.0
+    assert max(p["high"] for p in points) == 59.0
+    assert min(p["low"] for p in points) == 1.0
+
+
+@pytest.mark.django_db
+def test_price_history_validation(api_client, stock):
+    url = reverse("stock-price-history", args=["CHRT"])
+    for params, field in [
+        ({"interval": "hour"}, "interval"),
+        ({"max_points": "1"}, "max_points"),
+        ({"max_points": "many"}, "max_points"),
+        ({"from": "2025-02-01", "to": "2025-01-01"}, "from"),
+    ]:
+        resp = api_client.get(url, params, format="json")
+        assert resp.status_code == status.HTTP_400_BAD_REQUEST
+        assert field in resp.data
+
+    resp = api_client.get(reverse("stock-price-history", args=["NOPE"]), format="json")
+    assert resp.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_columnar_formats(api_client, stock):
+    url = reverse("stock-price-history", args=["CHRT"])
+    params = {"from": "2025-01-10", "to": "2025-01-12"}
+
+    resp = api_client.get(url, params, HTTP_ACCEPT="application/vnd.racional.columnar+json")
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp["Content-Type"].startswith("application/vnd.racional.columnar+json")
+    assert resp.json() == {
+        "symbol": "CHRT",
+        "interval": "day",
+        "date": ["2025-01-10", "2025-01-11", "2025-01-12"],
+        "open": [10.0, 11.0, 12.0],
+        "high": [10.0, 11.0, 12.0],
+        "low": [10.0, 11.0, 12.0],
+        "close": [10.0, 11.0, 12.0],
+    }
+
+    resp = api_client.get(url, {**params, "format": "npz"})
+    assert resp.status_code == status.HTTP_200_OK
+    assert resp["Content-Type"] == "application/x-npz"
+    archive = np.load(io.BytesIO(resp.content))
+    assert str(archive["symbol"]) == "CHRT"
+    assert archive["date"].dtype == np.dtype("datetime64[D]")
+    assert archive["close"].tolist() == [10.0, 11.0, 12.0]
+
+    resp = api_client.get(url, {"format": "columnar", "from": "2030-01-01"})
+    assert resp.json()["date"] == []
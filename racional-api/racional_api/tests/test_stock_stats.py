@@ -0,0 +1,95 @@
+import math
+import pytest
+from datetime import timedelta
+from django.core.management import call_command
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.models import Stock, StockDailyStats, StockPrice
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def first_day():
+    return timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=60)
+
+
+@pytest.fixture
+def stock():
+    return Stock.objects.create(symbol="STAT", name="Stats Corp")
+
+
+def add_prices(stock, first_day, values, offset=0):
+    for day, value in enumerate(values, start=offset):
+        StockPrice.objects.create(stock=stock, value=value, date=first_day + timedelta(days=day))
+
+
+@pytest.mark.django_db
+def test_compute_stock_stats_is_incremental(stock, first_day):
+    closes = [100 + (i % 7) - (i % 3) for i in range(30)]
+    add_prices(stock, first_day, closes[:25])
+    call_command("compute_stock_stats")
+    assert StockDailyStats.objects.filter(stock=stock).count() == 25
+
+    add_prices(stock, first_day, closes[25:], offset=25)
+    call_command("compute_stock_stats")
+    stats = list(StockDailyStats.objects.filter(stock=stock).order_by("date"))
+    assert len(stats) == 30
+
+    assert stats[0].daily_return is None
+    assert stats[1].daily_return == pytest.approx(closes[1] / closes[0] - 1)
+    assert stats[1].log_return == pytest.approx(math.log(closes[1] / closes[0]))
+    assert stats[19].mean_20 is None
+    assert stats[-1].volatility_60 is None
+
+    # Rows added by the second run match a computation over the whole series
+    returns = [closes[i] / closes[i - 1] - 1 for i in range(1, 30)]
+    window = returns[-20:]
+    mean = sum(window) / 20
+    std = math.sqrt(sum((r - mean) ** 2 for r in window) / 19)
+    assert stats[-1].mean_20 == pytest.approx(mean)
+    assert stats[-1].volatility_20 == pytest.approx(std)
+
+    # Nothing new to process
+    call_command("compute_stock_stats")
+    assert StockDailyStats.objects.filter(stock=stock).count() == 30
+
+
+@pytest.mark.django_db
+def test_stock_stats_endpoint(api_client, stock, first_day):
+    add_prices(stock, first_day, [10, 11, 12, 13])
+    call_command("compute_stock_stats")
+
+    url = reverse("stock-stats", args=[stock.pk])
+    resp = api_client.get(url, format="json")
+    assert resp.status_code == status.HTTP_200_OK
+    assert [row["close"] for row in resp.data] == [10, 11, 12, 13]
+
+    second = (first_day + timedelta(days=1)).date()
+    resp = api_client.get(url, {"from": str(second), "to": str(second)}, format="json")
+    assert len(resp.data) == 1
+    assert resp.data[0]["daily_return"] == pytest.approx(0.1)
+
+    resp = api_client.get(reverse("stock-stats", args=[99999]), format="json")
+    assert resp.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_stock_stats_columnar(api_client, stock, first_day):
+    add_prices(stock, first_day, [10, 11, 12, 13])
+    call_command("compute_stock_stats")
+
+    resp = api_client.get(reverse("stock-stats", args=[stock.pk]), {"format": "columnar"})
+    assert resp.status_code == status.HTTP_200_OK
+    data = resp.json()
+    assert data["close"] == [10, 11, 12, 13]
+    assert data["daily_return"][0] is None
+    assert data["daily_return"][1] == pytest.approx(0.1)
+    assert data["date"][0] == str(first_day.date())
+    assert data["mean_20"] == [None] * 4
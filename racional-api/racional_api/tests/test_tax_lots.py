@@ -0,0 +1,178 @@
+import pytest
+from decimal import Decimal
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.execution import execute_pending
+from racional_api.models import LotDisposal, Order, Position, Stock, StockPrice, TaxLot, User
+
+
+TODAY = timezone.localdate()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Lot",
+        last_name="Holder",
+        phone_number="555",
+        email="lots@example.com",
+        money=Decimal("100000.00"),
+    )
+
+
+@pytest.fixture
+def stock():
+    s = Stock.objects.create(symbol="LOT", name="Lot Corp")
+    StockPrice.objects.create(stock=s, value=30.0, date=timezone.now())
+    return s
+
+
+def trade(user, stock, side, quantity, price, days_ago, **extra):
+    return Order.objects.create(
+        user=user,
+        asset_type=Order.ASSET_STOCK,
+        stock=stock,
+        side=side,
+        quantity=Decimal(quantity),
+        execution_price=Decimal(price),
+        execution_date=TODAY - timedelta(days=days_ago),
+        **extra,
+    )
+
+
+def lots_state(user):
+    position = Position.objects.get(user=user)
+    lots = list(
+        TaxLot.objects.filter(user=user).order_by("acquired_on", "id").values_list("quantity", "remaining", "unit_cost")
+    )
+    return position.quantity, position.cost_basis, position.realized_pnl, lots
+
+
+@pytest.mark.django_db
+def test_sell_consumes_oldest_lots_first(user, stock):
+    first = trade(user, stock, Order.BUY, "10", "10", days_ago=3)
+    second = trade(user, stock, Order.BUY, "10", "20", days_ago=2)
+    sell = trade(user, stock, Order.SELL, "15", "30", days_ago=1)
+
+    disposals = list(LotDisposal.objects.filter(order=sell).order_by("id"))
+    assert [(d.lot.order_id, d.quantity, d.realized_pnl) for d in disposals] == [
+        (first.pk, Decimal("10"), Decimal("200")),
+        (second.pk, Decimal("5"), Decimal("50")),
+    ]
+    quantity, cost_basis, realized, lots = lots_state(user)
+    assert (quantity, cost_basis, realized) == (Decimal("5"), Decimal("100"), Decimal("250"))
+    assert lots == [
+        (Decimal("10"), Decimal("0"), Decimal("10")),
+        (Decimal("10"), Decimal("5"), Decimal("20")),
+    ]
+
+
+@pytest.mark.django_db
+def test_pnl_endpoint(api_client, user, stock):
+    trade(user, stock, Order.BUY, "10", "10", days_ago=3)
+    trade(user, stock, Order.BUY, "10", "20", days_ago=2)
+    trade(user, stock, Order.SELL, "15", "30", days_ago=1)
+
+    resp = api_client.get(reverse("user-pnl", args=[user.pk]))
+
+    assert resp.status_code == status.HTTP_200_OK
+    data = resp.json()
+    assert Decimal(data["realized_pnl"]) == Decimal("250.00")
+    assert Decimal(data["unrealized_pnl"]) == Decimal("50.00")
+    assert Decimal(data["total_pnl"]) == Decimal("300.00")
+    [position] = data["positions"]
+    assert position["symbol"] == "LOT"
+    assert Decimal(position["average_cost"]) == Decimal("20")
+    assert Decimal(position["market_value"]) == Decimal("150.00")
+    assert [(Decimal(lot["quantity"]), Decimal(lot["unit_cost"])) for lot in position["lots"]] == [
+        (Decimal("5"), Decimal("20"))
+    ]
+
+
+@pytest.mark.django_db
+def test_pnl_unknown_user_returns_404(api_client):
+    resp = api_client.get(reverse("user-pnl", args=[999999]))
+    assert resp.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_pnl_queries_do_not_grow_with_order_history(api_client, user, stock):
+    def count_queries():
+        with CaptureQueriesContext(connection) as ctx:
+            assert api_client.get(reverse("user-pnl", args=[user.pk])).status_code == 200
+        return len(ctx.captured_queries)
+
+    trade(user, stock, Order.BUY, "1", "10", days_ago=30)
+    few = count_queries()
+    for day in range(29, 0, -1):
+        trade(user, stock, Order.BUY, "2", "10", days_ago=day)
+        trade(user, stock, Order.SELL, "1", "12", days_ago=day)
+
+    assert count_queries() == few
+
+
+@pytest.mark.django_db
+def test_backdated_order_rebuilds_the_position(user, stock):
+    trade(user, stock, Order.BUY, "10", "10", days_ago=5)
+    trade(user, stock, Order.SELL, "5", "30", days_ago=1)
+    # Bought before the sell, FIFO now has the sell close this cheaper lot
+    trade(user, stock, Order.BUY, "5", "4", days_ago=8)
+
+    incremental = lots_state(user)
+    assert incremental[2] == Decimal("130")
+
+    Position.rebuild(user.pk)
+    assert lots_state(user) == incremental
+
+
+@pytest.mark.django_db
+def test_deleting_an_order_rebuilds_the_position(user, stock):
+    buy = trade(user, stock, Order.BUY, "10", "10", days_ago=3)
+    trade(user, stock, Order.BUY, "10", "20", days_ago=2)
+    trade(user, stock, Order.SELL, "5", "30", days_ago=1)
+
+    buy.delete()
+
+    quantity, cost_basis, realized, lots = lots_state(user)
+    assert (quantity, cost_basis, realized) == (Decimal("5"), Decimal("100"), Decimal("50"))
+    assert lots == [(Decimal("10"), Decimal("5"), Decimal("20"))]
+
+
+@pytest.mark.django_db
+def test_queued_orders_update_lots(settings, user, stock):
+    settings.ORDER_EXECUTION_MODE = "queued"
+    StockPrice.objects.create(stock=stock, value=30.0, date=timezone.now() - timedelta(days=1))
+    trade(user, stock, Order.BUY, "4", "10", days_ago=1)
+    trade(user, stock, Order.SELL, "3", "0", days_ago=0, status=Order.PENDING)
+
+    assert execute_pending() == (1, 0)
+
+    quantity, cost_basis, realized, _ = lots_state(user)
+    assert (quantity, cost_basis, realized) == (Decimal("1"), Decimal("10"), Decimal("60"))
+
+
+@pytest.mark.django_db
+def test_rebuild_lots_command_backfills_positions(user, stock):
+    trade(user, stock, Order.BUY, "10", "10", days_ago=3)
+    trade(user, stock, Order.SELL, "4", "30", days_ago=1)
+    expected = lots_state(user)
+    LotDisposal.objects.all().delete()
+    TaxLot.objects.all().delete()
+    Position.objects.all().delete()
+
+    call_command("rebuild_lots")
+
+    assert lots_state(user) == expected
@@ -3,8 +3,10 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from datetime import date
+from decimal import Decimal
 
 from racional_api.models import Transaction, User
+from racional_api.serializers import DepositSerializer
 
 
 @pytest.fixture
@@ -295,3 +297,14 @@ def test_withdraw_more_than_balance(api_client, user):
     user.refresh_from_db()
     assert float(user.money) == 1000.00
 
+
+@pytest.mark.django_db
+def test_transaction_list_matches_deposit_serializer(api_client, user):
+    t = Transaction.objects.create(
+        user=user,
+        transaction_type=Transaction.DEPOSIT,
+        amount=Decimal("12.50"),
+        execution_date=date.today(),
+    )
+    response = api_client.get(reverse("transaction-list", args=[user.pk]), format="json")
+    assert response.json() == [dict(DepositSerializer(t).data)]
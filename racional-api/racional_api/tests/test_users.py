@@ -4,6 +4,7 @@ from rest_framework.test import APIClient
 from rest_framework import status
 
 from racional_api.models import User
+from racional_api.serializers import UserSerializer
 
 
 @pytest.fixture
@@ -147,3 +148,9 @@ def test_deleted_user_cannot_be_retrieved_after_delete(api_client, user):
     # Try to get again
     get_response = api_client.get(url, format="json")
     assert get_response.status_code == status.HTTP_404_NOT_FOUND
+
+
+@pytest.mark.django_db
+def test_list_users_matches_user_serializer(api_client, user):
+    response = api_client.get(reverse("user-list"), format="json")
+    assert response.json() == [dict(UserSerializer(user).data)]
@@ -0,0 +1,123 @@
+import pytest
+from decimal import Decimal
+from datetime import date, timedelta
+from django.core.cache import cache
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+
+from racional_api.models import User, Stock, StockPrice, Transaction, Order
+from racional_api.valuation import portfolio_total
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    cache.clear()
+
+
+@pytest.fixture
+def api_client():
+    return APIClient()
+
+
+@pytest.fixture
+def user():
+    return User.objects.create(
+        first_name="Past",
+        last_name="Value",
+        phone_number="777",
+        email="past@example.com",
+        is_deleted=False,
+    )
+
+
+@pytest.fixture
+def stock():
+    s = Stock.objects.create(symbol="HIS", name="History Corp")
+    today_midnight = timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0)
+    for days_ago, value in [(10, "10.00"), (5, "20.00"), (0, "30.00")]:
+        StockPrice.objects.create(stock=s, value=Decimal(value), date=today_midnight - timedelta(days=days_ago))
+    return s
+
+
+def buy(user, stock, qty, price, days_ago):
+    return Order.objects.create(
+        user=user,
+        stock=stock,
+        side=Order.BUY,
+        quantity=Decimal(qty),
+        execution_price=Decimal(price),
+        execution_date=date.today() - timedelta(days=days_ago),
+        asset_type=Order.ASSET_STOCK,
+    )
+
+
+@pytest.fixture
+def history(user, stock):
+    Transaction.objects.create(
+        user=user,
+        transaction_type=Transaction.DEPOSIT,
+        amount=Decimal("1000.00"),
+        execution_date=date.today() - timedelta(days=10),
+    )
+    buy(user, stock, "10", "10.00", days_ago=8)
+    buy(user, stock, "5", "20.00", days_ago=2)
+
+
+@pytest.mark.django_db
+def test_portfolio_total_as_of_past_date(api_client, user, history):
+    as_of = date.today() - timedelta(days=4)
+    url = reverse("user-portfolio-total", args=[user.pk])
+    resp = api_client.get(url, {"as_of": str(as_of)}, format="json")
+    assert resp.status_code == status.HTTP_200_OK
+
+    # Only the first BUY happened, valued with the price of 5 days ago
+    assert resp.data["as_of"] == str(as_of)
+    assert Decimal(resp.data["cash"]) == Decimal("900.00")
+    assert Decimal(resp.data["stocks_total"]) == Decimal("200.00")
+    assert Decimal(resp.data["portfolio_total"]) == Decimal("1100.00")
+
+    # Before any activity
+    resp = api_client.get(url, {"as_of": str(date.today() - timedelta(days=20))}, format="json")
+    assert Decimal(resp.data["portfolio_total"]) == Decimal("0.00")
+    assert resp.data["positions"] == []
+
+
+@pytest.mark.django_db
+def test_portfolio_total_as_of_is_cached_until_a_backdated_order(api_client, user, stock, history, django_assert_max_num_queries):
+    url = reverse("user-portfolio-total", args=[user.pk])
+    params = {"as_of": str(date.today() - timedelta(days=4))}
+    api_client.get(url, params, format="json")
+
+    # User lookup and ledger head only
+    with django_assert_max_num_queries(2):
+        resp = api_client.get(url, params, format="json")
+    assert Decimal(resp.data["stocks_total"]) == Decimal("200.00")
+
+    buy(user, stock, "1", "20.00", days_ago=6)
+    resp = api_client.get(url, params, format="json")
+    assert Decimal(resp.data["stocks_total"]) == Decimal("220.00")
+
+
+@pytest.mark.django_db
+def test_portfolio_total_as_of_is_cached_until_a_backfilled_price(api_client, user, stock, history):
+    url = reverse("user-portfolio-total", args=[user.pk])
+    as_of = date.today() - timedelta(days=4)
+    assert Decimal(api_client.get(url, {"as_of": str(as_of)}).data["stocks_total"]) == Decimal("200.00")
+
+    # A price missing for that day, loaded later
+    day = timezone.localtime(timezone.now()).replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=4)
+    StockPrice.objects.create(stock=stock, value=Decimal("25.00"), date=day)
+
+    assert Decimal(api_client.get(url, {"as_of": str(as_of)}).data["stocks_total"]) == Decimal("250.00")
+    assert Decimal(portfolio_total(user.pk, as_of)["stocks_total"]) == Decimal("250.00")
+
+
+@pytest.mark.django_db
+def test_portfolio_total_invalid_as_of(api_client, user):
+    url = reverse("user-portfolio-total", args=[user.pk])
+    for value in ["yesterday", "2025-02-30"]:
+        resp = api_client.get(url, {"as_of": value}, format="json")
+        assert resp.status_code == status.HTTP_400_BAD_REQUEST
+        assert "as_of" in resp.data
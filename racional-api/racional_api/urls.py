@@ -1,5 +1,6 @@
 from django.urls import path
-from .views import PortfolioCreateView, PortfolioInvestView, PortfolioListView, PortfolioMetadataUpdateView, StockOrderCreateView, TransactionListView, UserLastMovementsView, UserPortfolioTotalView, WithdrawCreateView, DepositCreateView, UserDetailView, UserListCreateView
+from .stream import portfolio_stream
+from .views import OrderQueueStatsView, PortfolioAnalyticsView, PortfolioComponentsUpdateView, PortfolioCompositionView, StockListView, StockPriceHistoryView, StockStatsView, PortfolioCreateView, PortfolioInvestView, PortfolioListView, PortfolioMetadataUpdateView, PortfolioSimulationView, StockOrderCreateView, TransactionListView, UserLastMovementsView, UserPortfolioTotalView, UserProfitAndLossView, WithdrawCreateView, DepositCreateView, UserDashboardView, UserDetailView, UserListCreateView
 
 
 user_urls = [
@@ -10,6 +11,13 @@ user_urls = [
         UserPortfolioTotalView.as_view(),
         name="user-portfolio-total",
     ),
+    path(
+        "users/<int:user_id>/portfolio/stream/",
+        portfolio_stream,
+        name="user-portfolio-stream",
+    ),
+    path("users/<int:user_id>/pnl/", UserProfitAndLossView.as_view(), name="user-pnl"),
+    path("users/<int:user_id>/dashboard/", UserDashboardView.as_view(), name="user-dashboard"),
         path(
         "users/<int:user_id>/movements/",
         UserLastMovementsView.as_view(),
@@ -25,11 +33,22 @@ transaction_urls = [
 
 orders_urls = [
     path("orders/stocks/", StockOrderCreateView.as_view(), name="stock-order-create"),
+    path("orders/queue/", OrderQueueStatsView.as_view(), name="order-queue-stats"),
+]
+
+stocks_urls = [
+    path("stocks/", StockListView.as_view(), name="stock-list"),
+    path("stocks/<str:symbol>/prices/", StockPriceHistoryView.as_view(), name="stock-price-history"),
+    path("stocks/<int:pk>/stats/", StockStatsView.as_view(), name="stock-stats"),
 ]
 
 portfolios_urls = [
     path("portfolios/", PortfolioCreateView.as_view(), name="portfolio-create"),
     path("portfolios/<int:pk>/", PortfolioMetadataUpdateView.as_view(), name="portfolio-metadata-update"),
+    path("portfolios/<int:pk>/analytics/", PortfolioAnalyticsView.as_view(), name="portfolio-analytics"),
+    path("portfolios/<int:pk>/simulate/", PortfolioSimulationView.as_view(), name="portfolio-simulate"),
+    path("portfolios/<int:pk>/composition/", PortfolioCompositionView.as_view(), name="portfolio-composition"),
+    path("portfolios/<int:pk>/components/", PortfolioComponentsUpdateView.as_view(), name="portfolio-components-update"),
     path("users/<int:user_id>/portfolios/", PortfolioListView.as_view(), name="portfolio-list"),
     path( "portfolios/invest/", PortfolioInvestView.as_view(), name="portfolio-invest",
     ),
@@ -40,5 +59,6 @@ urlpatterns = [
     *user_urls,
     *transaction_urls, 
     *orders_urls,
+    *stocks_urls,
     *portfolios_urls
 ]
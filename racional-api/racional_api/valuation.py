@@ -0,0 +1,196 @@
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .conditional import user_versions
+from .models import CashLedgerEntry, Order, Position, StockPrice, TaxLot, to_cents
+
+
+def end_of_day(day):
+    """First instant after `day` in the current timezone, to compare against StockPrice.date."""
+    return timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+
+
+def net_quantities(user_id, as_of=None):
+    """
+    Net quantity (BUY - SELL) of every stock a user holds, aggregated in SQL.
+
+    With `as_of`, only orders executed up to that date are counted. Returns a
+    list of dicts with `stock_id`, `symbol` and `quantity`.
+    """
+    orders = Order.objects.filter(
+        user_id=user_id,
+        asset_type=Order.ASSET_STOCK,
+        status=Order.EXECUTED,
+        stock__isnull=False,
+    )
+    if as_of is not None:
+        orders = orders.filter(
+            Q(execution_date__lte=as_of)
+            | Q(execution_date__isnull=True, created_at__lt=end_of_day(as_of))
+        )
+
+    zero = Decimal("0.0000")
+    return list(
+        orders.order_by()
+        .values("stock_id", symbol=F("stock__symbol"))
+        .annotate(
+            quantity=Coalesce(Sum("quantity", filter=Q(side=Order.BUY)), zero)
+            - Coalesce(Sum("quantity", filter=~Q(side=Order.BUY)), zero)
+        )
+        .filter(quantity__gt=0)
+        .order_by("symbol")
+    )
+
+
+def latest_prices(stock_ids, as_of=None):
+    """Latest price of each stock (up to `as_of` if given), fetched in one DISTINCT ON query."""
+    prices = StockPrice.objects.filter(stock_id__in=stock_ids)
+    if as_of is not None:
+        prices = prices.filter(date__lt=end_of_day(as_of))
+
+    rows = (
+        prices.order_by("stock_id", "-date")
+        .distinct("stock_id")
+        .values_list("stock_id", "value")
+    )
+    return {stock_id: Decimal(str(value)) for stock_id, value in rows}
+
+
+def portfolio_total(user_id, as_of=None, last_entry_id=None, last_price_id=None):
+    """
+    Cash, positions and total value of a user, as rendered by PortfolioTotalSerializer.
+
+    Totals for past dates are cached. Orders can be backdated and prices
+    backfilled or corrected, so the key also carries the user's last ledger
+    entry id and the newest price row of the stocks they traded: a new order
+    or price invalidates it. Callers that already read them (the conditional
+    GET validators "ledger" and "prices") can pass them in.
+    """
+    if as_of is None or as_of >= timezone.localdate():
+        return compute_portfolio_total(user_id, as_of)
+
+    if last_entry_id is None or last_price_id is None:
+        versions = user_versions(user_id, ("ledger", "prices")) or {}
+        last_entry_id = versions.get("ledger") or 0
+        last_price_id = versions.get("prices") or 0
+    key = f"portfolio-total:{user_id}:{as_of.isoformat()}:{last_entry_id}:{last_price_id}"
+    data = cache.get(key)
+    if data is None:
+        data = compute_portfolio_total(user_id, as_of)
+        cache.set(key, data, settings.PORTFOLIO_AS_OF_CACHE_TIMEOUT)
+    return data
+
+
+def compute_portfolio_total(user_id, as_of=None):
+    cash = CashLedgerEntry.balance(user_id, as_of=as_of)
+    holdings = net_quantities(user_id, as_of=as_of)
+    prices = latest_prices([h["stock_id"] for h in holdings], as_of=as_of)
+    return summarize_total(user_id, as_of, cash, holdings, prices)
+
+
+def summarize_total(user_id, as_of, cash, holdings, prices):
+    """Total in the shape of PortfolioTotalSerializer, from cash, `net_quantities` rows and prices by stock id."""
+    positions = []
+    stocks_total = Decimal("0.00")
+    for holding in holdings:
+        qty = holding["quantity"]
+        price = prices.get(holding["stock_id"], Decimal("0"))
+        value = (qty * price).quantize(Decimal("0.01"))
+
+        positions.append(
+            {
+                "symbol": holding["symbol"],
+                "quantity": qty.quantize(Decimal("0.0001")),
+                "price": price.quantize(Decimal("0.0001")),
+                "value": value,
+            }
+        )
+        stocks_total += value
+
+    return {
+        "user_id": user_id,
+        "as_of": as_of,
+        "cash": cash.quantize(Decimal("0.01")),
+        "stocks_total": stocks_total.quantize(Decimal("0.01")),
+        "portfolio_total": (cash + stocks_total).quantize(Decimal("0.01")),
+        "positions": positions,
+    }
+
+
+def profit_and_loss(user_id):
+    """
+    Cost basis, realized and unrealized P&L of a user per stock, with the open FIFO lots.
+
+    Read from the Position and TaxLot tables (kept up to date as orders
+    execute) and the latest prices: three queries, no matter how long the
+    user's order history is. Stocks without a price have no unrealized P&L.
+    """
+    positions = list(
+        Position.objects.filter(user_id=user_id)
+        .exclude(quantity=0, realized_pnl=0)
+        .values("stock_id", "quantity", "cost_basis", "realized_pnl", symbol=F("stock__symbol"))
+        .order_by("symbol")
+    )
+    lots = defaultdict(list)
+    for lot in (
+        TaxLot.objects.filter(user_id=user_id, remaining__gt=0)
+        .order_by("acquired_on", "id")
+        .values("stock_id", "order_id", "acquired_on", "remaining", "unit_cost")
+    ):
+        lots[lot["stock_id"]].append(lot)
+    prices = latest_prices([p["stock_id"] for p in positions if p["quantity"]])
+
+    totals = defaultdict(lambda: Decimal("0.00"))
+    rows = []
+    for position in positions:
+        price = prices.get(position["stock_id"])
+        quantity = position["quantity"]
+        if not quantity:
+            market_value = unrealized = Decimal("0.00")
+        elif price is None:
+            market_value = unrealized = None
+        else:
+            market_value = to_cents(quantity * price)
+            unrealized = market_value - to_cents(position["cost_basis"])
+        row = {
+            "symbol": position["symbol"],
+            "quantity": quantity,
+            "average_cost": (position["cost_basis"] / quantity).quantize(Decimal("0.0001")) if quantity else None,
+            "cost_basis": to_cents(position["cost_basis"]),
+            "price": price,
+            "market_value": market_value,
+            "unrealized_pnl": unrealized,
+            "realized_pnl": to_cents(position["realized_pnl"]),
+            "lots": [
+                {
+                    "order_id": lot["order_id"],
+                    "acquired_on": lot["acquired_on"],
+                    "quantity": lot["remaining"],
+                    "unit_cost": lot["unit_cost"],
+                    "unrealized_pnl": (
+                        None if price is None else to_cents(lot["remaining"] * (price - lot["unit_cost"]))
+                    ),
+                }
+                for lot in lots[position["stock_id"]]
+            ],
+        }
+        rows.append(row)
+        for key in ("cost_basis", "market_value", "unrealized_pnl", "realized_pnl"):
+            totals[key] += row[key] or 0
+
+    return {
+        "user_id": user_id,
+        "cost_basis": totals["cost_basis"],
+        "market_value": totals["market_value"],
+        "unrealized_pnl": totals["unrealized_pnl"],
+        "realized_pnl": totals["realized_pnl"],
+        "total_pnl": totals["unrealized_pnl"] + totals["realized_pnl"],
+        "positions": rows,
+    }
@@ -1,19 +1,46 @@
-from collections import defaultdict
-from .models import Order, Portfolio, Transaction, User, Stock, StockPrice
-from .serializers import DepositSerializer, MovementSerializer, PortfolioCreateSerializer, PortfolioInvestSerializer, PortfolioMetadataSerializer, PortfolioTotalSerializer, StockOrderSerializer, UserSerializer
+from .models import CashLedgerEntry, Order, Portfolio, PortfolioComponent, PortfolioVersion, Transaction, User, Stock, StockDailyStats, StockPrice
+from .conditional import ConditionalGetMixin
+from .dashboard import SECTIONS, last_movements, user_dashboard
+from .execution import queue_stats
+from .idempotency import IDEMPOTENCY_KEY_PARAMETER, IdempotentCreateMixin
+from .pagination import OptionalLimitOffsetPagination
+from .renderers import SERIES_RENDERER_CLASSES, wants_columns
+from .valuation import portfolio_total, profit_and_loss
+from .serializers import DashboardSerializer, DepositSerializer, MovementSerializer, OrderQueueStatsSerializer, PortfolioAnalyticsSerializer, PortfolioComponentsUpdateSerializer, PortfolioCompositionSerializer, PortfolioCreateSerializer, PortfolioInvestSerializer, PortfolioMetadataSerializer, PortfolioReadSerializer, PortfolioSimulationResultSerializer, PortfolioSimulationSerializer, PortfolioTotalSerializer, PriceHistorySerializer, ProfitAndLossSerializer, StockDailyStatsSerializer, StockOrderSerializer, StockSerializer, TransactionReadSerializer, UserReadSerializer, UserSerializer
 from rest_framework import generics, status
-from drf_spectacular.utils import extend_schema, extend_schema_view
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import OpenApiParameter, extend_schema, extend_schema_view
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
 from rest_framework.views import APIView   
 from decimal import Decimal, InvalidOperation
-from django.db.models import Sum, Q
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Max, Prefetch, Sum, Q
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+
+def date_query_param(request, name):
+    """Optional YYYY-MM-DD query parameter, answers 400 when it is malformed."""
+    value = request.query_params.get(name)
+    if value is None:
+        return None
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValidationError({name: ["Invalid date, expected YYYY-MM-DD."]})
+    return parsed
 
 
 @extend_schema_view(
     get=extend_schema(
         summary="Get all users",
         description="Get all non deleted users",
-        responses=UserSerializer(many=True),
+        responses=UserReadSerializer(many=True),
     ),
     post=extend_schema(
         summary="Create a user",
@@ -23,9 +50,13 @@ from django.db.models import Sum, Q
     ),
 )
 class UserListCreateView(generics.ListCreateAPIView):
-    queryset = User.objects.filter(is_deleted=False)
+    queryset = User.objects.all()
     serializer_class = UserSerializer
 
+    def list(self, request, *args, **kwargs):
+        rows = UserReadSerializer.rows(self.get_queryset())
+        return Response(UserReadSerializer(rows, many=True).data)
+
 
 @extend_schema(
     summary="Retrieve, update or delete the user",
@@ -38,7 +69,7 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
     GET/PUT/PATCH/DELETE /api/users/<int:pk>/
     Combined endpoint for retrieve, update and delete.
     """
-    queryset = User.objects.filter(is_deleted=False)
+    queryset = User.objects.all()
     serializer_class = UserSerializer
 
     def put(self, request, *args, **kwargs):
@@ -46,10 +77,10 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
 
     def delete(self, request, *args, **kwargs):
         user = self.get_object()
-        stocks_id = Stock.objects.filter(is_deleted=False).values_list('pk', flat=True)
+        stocks_id = Stock.objects.values_list('pk', flat=True)
         stock_quantities = {}
         for stock_id in stocks_id:
-            totals = Order.objects.filter(user=user, stock_id=stock_id, is_deleted=False).aggregate(
+            totals = Order.objects.filter(user=user, stock_id=stock_id, status=Order.EXECUTED).aggregate(
                 total_bought=Sum('quantity', filter=Q(side=Order.BUY)),
                 total_sold=Sum('quantity', filter=Q(side=Order.SELL)),
             )
@@ -79,13 +110,18 @@ class UserDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 @extend_schema(
     summary="Register a cash deposit",
-    description="Creates a cash deposit order for a given user.",
+    description=(
+        "Creates a cash deposit order for a given user. "
+        "Con el header `Idempotency-Key`, los reintentos devuelven la respuesta original sin repetir el depósito."
+    ),
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
     request=DepositSerializer,
     responses={201: DepositSerializer},
 )
-class DepositCreateView(generics.CreateAPIView):
+class DepositCreateView(IdempotentCreateMixin, generics.CreateAPIView):
     queryset = Transaction.objects.all()
     serializer_class = DepositSerializer
+    idempotency_scope = "deposit"
 
     def create(self, request, *args, **kwargs):
         data = request.data.copy()
@@ -94,7 +130,7 @@ class DepositCreateView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
 
         user_id = data.get("user_id")
-        if not User.objects.filter(pk=user_id, is_deleted=False).exists():
+        if not User.objects.filter(pk=user_id).exists():
             return Response(
                 {"user_id": ["Invalid user ID."]},
                 status=status.HTTP_400_BAD_REQUEST
@@ -115,13 +151,18 @@ class DepositCreateView(generics.CreateAPIView):
 
 @extend_schema(
     summary="Register a cash withdrawal",
-    description="Creates a cash withdrawal order for a given user.",
+    description=(
+        "Creates a cash withdrawal order for a given user. "
+        "Con el header `Idempotency-Key`, los reintentos devuelven la respuesta original sin repetir el retiro."
+    ),
+    parameters=[IDEMPOTENCY_KEY_PARAMETER],
     request=DepositSerializer,
     responses={201: DepositSerializer},
 )
-class WithdrawCreateView(generics.CreateAPIView):
+class WithdrawCreateView(IdempotentCreateMixin, generics.CreateAPIView):
     queryset = Transaction.objects.all()
     serializer_class = DepositSerializer
+    idempotency_scope = "withdraw"
 
     def create(self, request, *args, **kwargs):
         data = request.data.copy()
@@ -130,7 +171,7 @@ class WithdrawCreateView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
 
         user_id = data.get("user_id")
-        if not User.objects.filter(pk=user_id, is_deleted=False).exists():
+        if not User.objects.filter(pk=user_id).exists():
             return Response(
                 {"user_id": ["Invalid user ID."]},
                 status=status.HTTP_400_BAD_REQUEST
@@ -155,18 +196,23 @@ class WithdrawCreateView(generics.CreateAPIView):
 @extend_schema(
     summary="Get all transactions for a user",
     description="Given a user, gets all transactions.",
-    request=DepositSerializer,
-    responses={201: DepositSerializer},
+    responses={200: TransactionReadSerializer(many=True)},
 )
-class TransactionListView(generics.ListAPIView):
-    serializer_class = DepositSerializer
+class TransactionListView(ConditionalGetMixin, generics.ListAPIView):
+    serializer_class = TransactionReadSerializer
+    versions = ("transactions_at",)
+
+    def list(self, request, *args, **kwargs):
+        rows = TransactionReadSerializer.rows(self.get_queryset())
+        return Response(TransactionReadSerializer(rows, many=True).data)
 
     def get_queryset(self):
         user_id = self.kwargs['user_id']
         if not user_id:
             return Transaction.objects.none()
 
-        if not User.objects.filter(pk=user_id, is_deleted=False).exists():
+        # Looked up with the conditional GET validators
+        if self.user_versions is None:
             return Transaction.objects.none()
         return Transaction.objects.filter(user_id=user_id).order_by('-created_at')
 
@@ -175,10 +221,12 @@ class TransactionListView(generics.ListAPIView):
     summary="Register a BUY or SELL order for a Stock",
     description=(
         "Creates an order of type BUY or SELL for a user on a specific stock. "
-        "This endpoint handles only stock trades (not portfolios)."
+        "This endpoint handles only stock trades (not portfolios). "
+        "Con `ORDER_EXECUTION_MODE=queued` la orden queda en estado PENDING (respuesta 202) "
+        "y la ejecutan los workers de `run_order_workers`."
     ),
     request=StockOrderSerializer,
-    responses={201: StockOrderSerializer},
+    responses={201: StockOrderSerializer, 202: StockOrderSerializer},
 )
 class StockOrderCreateView(generics.CreateAPIView):
     serializer_class = StockOrderSerializer
@@ -186,7 +234,7 @@ class StockOrderCreateView(generics.CreateAPIView):
     def create(self, request, *args, **kwargs):
         user_id = request.data.get("user_id")
 
-        if not User.objects.filter(pk=user_id, is_deleted=False).exists():
+        if not User.objects.filter(pk=user_id).exists():
             return Response(
                 {"detail": "User not found or deleted."},
                 status=status.HTTP_400_BAD_REQUEST,
@@ -197,7 +245,156 @@ class StockOrderCreateView(generics.CreateAPIView):
         serializer.is_valid(raise_exception=True)
         self.perform_create(serializer)
         headers = self.get_success_headers(serializer.data)
-        return Response(serializer.data, status=status.HTTP_201_CREATED, headers=headers)
+        code = (
+            status.HTTP_202_ACCEPTED
+            if serializer.instance.status == Order.PENDING
+            else status.HTTP_201_CREATED
+        )
+        return Response(serializer.data, status=code, headers=headers)
+
+
+@extend_schema(
+    summary="Get the order execution queue status",
+    description=(
+        "Devuelve cuántas órdenes están pendientes, la antigüedad de la más antigua y "
+        "cuántas se ejecutaron o fallaron en los últimos `?window=` segundos (60 por defecto)."
+    ),
+    parameters=[OpenApiParameter("window", OpenApiTypes.INT, required=False)],
+    responses={200: OrderQueueStatsSerializer},
+)
+class OrderQueueStatsView(APIView):
+    """
+    GET /api/orders/queue/
+    """
+    def get(self, request):
+        try:
+            window = int(request.query_params.get("window", 60))
+        except ValueError:
+            raise ValidationError({"window": "Must be an integer."})
+        if window < 1:
+            raise ValidationError({"window": "Must be greater than 0."})
+        return Response(OrderQueueStatsSerializer(queue_stats(window)).data)
+
+
+@extend_schema(
+    summary="List stocks",
+    description="Devuelve el catálogo de acciones disponibles.",
+    responses={200: StockSerializer(many=True)},
+)
+class StockListView(generics.ListAPIView):
+    """
+    GET /api/stocks/
+    """
+    queryset = Stock.objects.order_by("symbol")
+    serializer_class = StockSerializer
+
+
+@extend_schema(
+    summary="Get the price history of a stock",
+    description=(
+        "Devuelve el historial de precios de una acción agrupado en velas OHLC "
+        "(apertura, máximo, mínimo y cierre) por día, semana o mes (`?interval=`). "
+        "Con `?max_points=N` las velas consecutivas se combinan para devolver a lo más N puntos, "
+        "conservando máximos y mínimos. Se puede acotar el rango con `?from=YYYY-MM-DD&to=YYYY-MM-DD`. "
+        "Con `Accept: application/vnd.racional.columnar+json` (o `?format=columnar`) responde arreglos "
+        "paralelos por columna, y con `Accept: application/x-npz` (o `?format=npz`) un archivo `.npz` de NumPy."
+    ),
+    parameters=[
+        OpenApiParameter("from", OpenApiTypes.DATE, description="Fecha inicial (incluida)."),
+        OpenApiParameter("to", OpenApiTypes.DATE, description="Fecha final (incluida)."),
+        OpenApiParameter("interval", OpenApiTypes.STR, enum=["day", "week", "month"], description="Tamaño de cada vela. Por defecto `day`."),
+        OpenApiParameter("max_points", OpenApiTypes.INT, description=f"Cantidad máxima de puntos (2 a {settings.PRICE_HISTORY_MAX_POINTS})."),
+    ],
+    responses={200: PriceHistorySerializer},
+)
+class StockPriceHistoryView(APIView):
+    """
+    GET /api/stocks/<symbol>/prices/?from=YYYY-MM-DD&to=YYYY-MM-DD&interval=day|week|month&max_points=N
+    """
+    renderer_classes = SERIES_RENDERER_CLASSES
+
+    def get(self, request, symbol: str):
+        stock = Stock.objects.filter(symbol=symbol.upper()).first()
+        if stock is None:
+            return Response(
+                {"detail": "Stock not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        start = date_query_param(request, "from")
+        end = date_query_param(request, "to")
+        if start and end and start > end:
+            raise ValidationError({"from": ["Must be before or equal to `to`."]})
+
+        interval = request.query_params.get("interval", "day")
+        if interval not in ("day", "week", "month"):
+            raise ValidationError({"interval": ["Must be one of day, week or month."]})
+
+        max_points = request.query_params.get("max_points")
+        if max_points is not None:
+            try:
+                max_points = int(max_points)
+            except ValueError:
+                max_points = 0
+            if not 2 <= max_points <= settings.PRICE_HISTORY_MAX_POINTS:
+                raise ValidationError(
+                    {"max_points": [f"Must be an integer between 2 and {settings.PRICE_HISTORY_MAX_POINTS}."]}
+                )
+
+        # Deferred, NumPy is loaded by the first analytics request instead of at startup
+        from .analytics import price_history, to_rows
+
+        columns = price_history(stock.pk, start, end, interval, max_points)
+        if wants_columns(request):
+            return Response({"symbol": stock.symbol, "interval": interval, **columns})
+
+        data = {"symbol": stock.symbol, "interval": interval, "points": to_rows(columns)}
+        serializer = PriceHistorySerializer(data)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    summary="Get daily return statistics of a stock",
+    description=(
+        "Devuelve, por día, el cierre, el retorno simple y logarítmico, y la media y "
+        "volatilidad (desviación estándar de los retornos diarios) móviles de 20, 60 y 252 días. "
+        "Los datos se precalculan con el comando `compute_stock_stats`. "
+        "Se puede acotar el rango con `?from=YYYY-MM-DD&to=YYYY-MM-DD`. "
+        "Acepta los mismos formatos columnares que el historial de precios (`?format=columnar|npz`)."
+    ),
+    parameters=[
+        OpenApiParameter("from", OpenApiTypes.DATE, description="Fecha inicial (incluida)."),
+        OpenApiParameter("to", OpenApiTypes.DATE, description="Fecha final (incluida)."),
+    ],
+    responses={200: StockDailyStatsSerializer(many=True)},
+)
+class StockStatsView(generics.ListAPIView):
+    """
+    GET /api/stocks/<int:pk>/stats/?from=YYYY-MM-DD&to=YYYY-MM-DD
+    """
+    serializer_class = StockDailyStatsSerializer
+    renderer_classes = SERIES_RENDERER_CLASSES
+
+    def list(self, request, *args, **kwargs):
+        if not wants_columns(request):
+            return super().list(request, *args, **kwargs)
+        from .analytics import fetch_columns
+
+        # Straight from the cursor into arrays, no model instances
+        fields = StockDailyStatsSerializer.Meta.fields
+        return Response(fetch_columns(self.get_queryset(), fields))
+
+    def get_queryset(self):
+        stock = get_object_or_404(Stock, pk=self.kwargs["pk"])
+        stats = StockDailyStats.objects.filter(stock=stock)
+
+        start = date_query_param(self.request, "from")
+        end = date_query_param(self.request, "to")
+        if start:
+            stats = stats.filter(date__gte=start)
+        if end:
+            stats = stats.filter(date__lte=end)
+        return stats.order_by("date")
 
 
 @extend_schema(
@@ -210,48 +407,80 @@ class StockOrderCreateView(generics.CreateAPIView):
     responses={201: PortfolioCreateSerializer},
 )
 class PortfolioCreateView(generics.CreateAPIView):
-    queryset = Portfolio.objects.filter(is_deleted=False)
+    queryset = Portfolio.objects.all()
     serializer_class = PortfolioCreateSerializer
 
 
 @extend_schema(
     summary="Get all portfolios of a user",
-    description="Given a user, gets all portfolios.",
-    request=PortfolioCreateSerializer,
-    responses={201: PortfolioCreateSerializer},
+    description=(
+        "Given a user, gets all portfolios with their (non deleted) components. "
+        "Optional `?limit=&offset=` pagination; without `limit` the full list is returned."
+    ),
+    responses={200: PortfolioReadSerializer(many=True)},
 )
 class PortfolioListView(generics.ListAPIView):
-    serializer_class = PortfolioCreateSerializer
+    serializer_class = PortfolioReadSerializer
+    pagination_class = OptionalLimitOffsetPagination
 
     def get_queryset(self):
         user_id = self.kwargs['user_id']
         if not user_id:
             return Transaction.objects.none()
 
-        if not User.objects.filter(pk=user_id, is_deleted=False).exists():
+        if not User.objects.filter(pk=user_id).exists():
             return Portfolio.objects.none()
-        return Portfolio.objects.filter(user_id=user_id, is_deleted=False)
+        # One query for every component and its stock, whatever the number of portfolios
+        components = Prefetch(
+            "components",
+            queryset=PortfolioComponent.objects.select_related("stock").order_by("pk"),
+        )
+        return (
+            Portfolio.objects.filter(user_id=user_id)
+            .prefetch_related(components)
+            .order_by("pk")
+        )
 
 
 @extend_schema(
     summary="Edit portfolio metadata",
     description=(
         "Edita la información de un portafolio existente: nombre, descripción y nivel de riesgo. "
-        "Este endpoint **no** modifica la composición (stocks/pesos) del portafolio."
+        "La composición (stocks/pesos) se cambia con `PATCH /api/portfolios/<id>/components/`."
     ),
     request=PortfolioMetadataSerializer,
     responses={200: PortfolioMetadataSerializer},
 )
 class PortfolioMetadataUpdateView(generics.RetrieveUpdateAPIView):
-    # TODO: Implement portfolio composition modification.
     """
     GET    /api/portfolios/<id>/  Obtiene los metadatos del portafolio
     PUT    /api/portfolios/<id>/  Reemplaza los metadatos (name, description, risk)
     PATCH  /api/portfolios/<id>/  Actualiza los metadatos parcialmente
     """
-    queryset = Portfolio.objects.filter(is_deleted=False)
+    queryset = Portfolio.objects.all()
     serializer_class = PortfolioMetadataSerializer
 
+@extend_schema(
+    summary="Change the components of a portfolio",
+    description=(
+        "Reemplaza la composición del portafolio por `components` (símbolo y peso, los pesos deben "
+        "sumar 1). Se aplica como diferencia contra la composición actual: agrega, actualiza o "
+        "elimina solo lo que cambió, con un número fijo de consultas sin importar cuántas acciones "
+        "tenga. Crea una nueva versión de la composición vigente desde hoy. "
+        "La respuesta incluye los símbolos agregados (`added`), con peso nuevo (`updated`) y eliminados (`removed`)."
+    ),
+    request=PortfolioComponentsUpdateSerializer,
+    responses={200: PortfolioComponentsUpdateSerializer},
+)
+class PortfolioComponentsUpdateView(generics.UpdateAPIView):
+    """
+    PATCH /api/portfolios/<id>/components/
+    """
+    queryset = Portfolio.objects.all()
+    serializer_class = PortfolioComponentsUpdateSerializer
+    http_method_names = ["patch", "options"]
+
+
 @extend_schema(
     summary="Invest an amount of money into a portfolio",
     description=(
@@ -268,97 +497,310 @@ class PortfolioInvestView(generics.CreateAPIView):
     queryset = Order.objects.none()
 
 
+@extend_schema(
+    summary="Get performance analytics of a portfolio",
+    description=(
+        "Calcula el retorno ponderado por tiempo (TWR), la volatilidad anualizada, el máximo "
+        "drawdown y el ratio de Sharpe de la canasta ponderada del portafolio (rebalanceada "
+        "diariamente a sus pesos) y de las posiciones reales del dueño del portafolio. "
+        "Se puede acotar el rango con `?from=YYYY-MM-DD&to=YYYY-MM-DD`."
+    ),
+    parameters=[
+        OpenApiParameter("from", OpenApiTypes.DATE, description="Fecha inicial (incluida)."),
+        OpenApiParameter("to", OpenApiTypes.DATE, description="Fecha final (incluida)."),
+    ],
+    responses={200: PortfolioAnalyticsSerializer},
+)
+class PortfolioAnalyticsView(APIView):
+    """
+    GET /api/portfolios/<int:pk>/analytics/?from=YYYY-MM-DD&to=YYYY-MM-DD
+    """
+
+    def get(self, request, pk: int):
+        try:
+            portfolio = Portfolio.objects.get(pk=pk)
+        except Portfolio.DoesNotExist:
+            return Response(
+                {"detail": "Portfolio not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        start = date_query_param(request, "from")
+        end = date_query_param(request, "to")
+        if start and end and start > end:
+            raise ValidationError({"from": ["Must be before or equal to `to`."]})
+
+        # Holdings change with the owner's ledger, the basket with the portfolio and both with every new price
+        key = "portfolio-analytics:{}:{}:{}:{}:{}:{}".format(
+            portfolio.pk,
+            start,
+            end,
+            portfolio.updated_at.timestamp(),
+            CashLedgerEntry.last_entry_id(portfolio.user_id),
+            StockPrice.all_objects.aggregate(last=Max("id"))["last"],
+        )
+        data = cache.get(key)
+        if data is None:
+            from .analytics import portfolio_analytics
+
+            data = portfolio_analytics(portfolio, start, end)
+            cache.set(key, data, settings.ANALYTICS_CACHE_TIMEOUT)
+
+        serializer = PortfolioAnalyticsSerializer(data)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    summary="Simulate the future value of a portfolio",
+    description=(
+        "Proyecta el valor del portafolio con Monte Carlo a partir de los retornos diarios "
+        "históricos de su composición actual en `StockPrice`: `bootstrap` remuestrea días "
+        "históricos y `normal` usa una distribución normal con su media y volatilidad. "
+        "Cada camino parte de `initial_amount` y suma `monthly_contribution` al final de cada mes. "
+        "Devuelve los percentiles 5, 25, 50, 75 y 95 del valor al final de cada año. "
+        "Con `seed` el resultado es reproducible. Los resultados quedan en caché por portafolio, "
+        "horizonte y aportes hasta que cambie la composición o lleguen precios nuevos."
+    ),
+    request=PortfolioSimulationSerializer,
+    responses={200: PortfolioSimulationResultSerializer},
+)
+class PortfolioSimulationView(APIView):
+    """
+    POST /api/portfolios/<int:pk>/simulate/
+    """
+
+    def post(self, request, pk: int):
+        try:
+            portfolio = Portfolio.objects.get(pk=pk)
+        except Portfolio.DoesNotExist:
+            return Response(
+                {"detail": "Portfolio not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        serializer = PortfolioSimulationSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+
+        # The history changes with the composition and with every new price
+        key = "portfolio-simulation:{}:{}:{}:{}:{}:{}:{}:{}:{}".format(
+            portfolio.pk,
+            portfolio.updated_at.timestamp(),
+            StockPrice.all_objects.aggregate(last=Max("id"))["last"],
+            params["years"],
+            params["initial_amount"],
+            params["monthly_contribution"],
+            params["paths"],
+            params["method"],
+            params["seed"],
+        )
+        data = cache.get(key)
+        if data is None:
+            from .simulation import simulate_portfolio
+
+            data = simulate_portfolio(portfolio, **params)
+            if data is None:
+                raise ValidationError(
+                    {"portfolio": ["Its stocks need at least a month of common price history to simulate."]}
+                )
+            cache.set(key, data, settings.ANALYTICS_CACHE_TIMEOUT)
+
+        return Response(PortfolioSimulationResultSerializer(data).data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    summary="Get the composition of a portfolio on a date",
+    description=(
+        "Devuelve los pesos de los componentes del portafolio vigentes en `?date=YYYY-MM-DD` "
+        "(hoy por defecto) y el periodo de vigencia de esa versión (`valid_to` excluido, "
+        "nulo si sigue vigente). Cada cambio de componentes crea una nueva versión."
+    ),
+    parameters=[
+        OpenApiParameter("date", OpenApiTypes.DATE, description="Fecha de la composición (YYYY-MM-DD)."),
+    ],
+    responses={200: PortfolioCompositionSerializer},
+)
+class PortfolioCompositionView(APIView):
+    """
+    GET /api/portfolios/<int:pk>/composition/?date=YYYY-MM-DD
+    """
+
+    def get(self, request, pk: int):
+        portfolio = get_object_or_404(Portfolio, pk=pk)
+        day = date_query_param(request, "date") or timezone.localdate()
+
+        if portfolio.versions.exists():
+            version = PortfolioVersion.as_of(portfolio.pk, day)
+            if version is None:
+                return Response(
+                    {"detail": "The portfolio had no composition on that date."},
+                    status=status.HTTP_404_NOT_FOUND,
+                )
+            valid_from, valid_to, weights = version.valid_from, version.valid_to, version.weights
+        else:
+            # Created before versioning, only the current components are known
+            valid_from = valid_to = None
+            weights = {
+                str(stock_id): weight
+                for stock_id, weight in portfolio.components.values_list("stock_id", "weight")
+            }
+
+        symbols = dict(
+            Stock.all_objects.filter(pk__in=[int(stock_id) for stock_id in weights]).values_list("pk", "symbol")
+        )
+        data = {
+            "portfolio_id": portfolio.pk,
+            "date": day,
+            "valid_from": valid_from,
+            "valid_to": valid_to,
+            "components": [
+                {"stock_id": int(stock_id), "symbol": symbols[int(stock_id)], "weight": weight}
+                for stock_id, weight in sorted(weights.items(), key=lambda item: int(item[0]))
+            ],
+        }
+        return Response(PortfolioCompositionSerializer(data).data)
+
+
 @extend_schema(
     summary="Get total portfolio value for a user",
     description=(
         "Calcula el valor actual del portafolio de un usuario. "
         "Suma el valor de todas las posiciones en acciones (BUY menos SELL) "
-        "utilizando el precio actual de cada acción, y opcionalmente el efectivo "
-        "derivado de depósitos y retiros."
+        "utilizando el precio actual de cada acción, y el efectivo disponible "
+        "según el libro de caja (depósitos, retiros, compras y ventas). "
+        "Con el parámetro opcional `?as_of=YYYY-MM-DD` calcula el valor a esa fecha: "
+        "solo considera órdenes y transacciones ejecutadas hasta ese día y el último precio "
+        "disponible a esa fecha."
     ),
+    parameters=[
+        OpenApiParameter("as_of", OpenApiTypes.DATE, description="Fecha de valorización (YYYY-MM-DD)."),
+    ],
     responses={200: PortfolioTotalSerializer},
 )
-class UserPortfolioTotalView(APIView):
+class UserPortfolioTotalView(ConditionalGetMixin, APIView):
     """
-    GET /api/users/<int:user_id>/portfolio/total/
+    GET /api/users/<int:user_id>/portfolio/total/?as_of=YYYY-MM-DD
     """
+    versions = ("ledger", "ledger_at", "prices", "prices_at")
 
     def get(self, request, user_id: int):
-        try:
-            user = User.objects.get(pk=user_id, is_deleted=False)
-        except User.DoesNotExist:
+        # The user and their ledger head were read with the conditional GET validators
+        if self.user_versions is None:
             return Response(
                 {"detail": "User not found."},
                 status=status.HTTP_404_NOT_FOUND,
             )
 
-        # 1) Compute cash from Transactions (DEPOSIT - WITHDRAW)
-
-        cash = Decimal("0.00")
-        transactions = Transaction.objects.filter(user=user, is_deleted=False)
-        for t in transactions:
-            if t.transaction_type == Transaction.DEPOSIT and t.amount:
-                cash += t.amount
-            elif t.transaction_type == Transaction.WITHDRAW and t.amount:
-                cash -= t.amount
-
-        # 2) Aggregate stock positions from Orders
-        orders = (
-            Order.objects.filter(
-                user=user,
-                asset_type=Order.ASSET_STOCK,
-                is_deleted=False,
-            )
-            .select_related("stock")
-            .order_by("execution_date", "created_at")
+        as_of = date_query_param(request, "as_of")
+
+        # Cash comes from the ledger and positions from a grouped aggregate, so
+        # only one row per held stock leaves the database
+        data = portfolio_total(
+            user_id,
+            as_of=as_of,
+            last_entry_id=self.user_versions["ledger"] or 0,
+            last_price_id=self.user_versions["prices"] or 0,
         )
 
-        qty_by_stock = defaultdict(lambda: Decimal("0.0000"))
+        serializer = PortfolioTotalSerializer(data)
+        return Response(serializer.data, status=status.HTTP_200_OK)
 
-        for o in orders:
-            if not o.quantity or not o.stock:
-                continue
 
-            factor = Decimal("1") if o.side == Order.BUY else Decimal("-1")
-            qty_by_stock[o.stock] += factor * o.quantity
-            
-            # Discount the cash used in BUY orders
-            if o.side == Order.BUY:
-                cash -= o.quantity * o.execution_price
+@extend_schema(
+    summary="Get realized and unrealized P&L of a user",
+    description=(
+        "Devuelve, por acción, la cantidad abierta, el costo (FIFO), el valor de mercado con el "
+        "último precio, la ganancia no realizada y la ganancia realizada por las ventas, junto "
+        "con los lotes abiertos (fecha de compra, cantidad restante y costo unitario). "
+        "Se lee de las tablas de posiciones y lotes, que se actualizan al ejecutar cada orden."
+    ),
+    responses={200: ProfitAndLossSerializer},
+)
+class UserProfitAndLossView(APIView):
+    """
+    GET /api/users/<int:user_id>/pnl/
+    """
 
-        positions = []
-        stocks_total = Decimal("0.00")
+    def get(self, request, user_id: int):
+        if not User.objects.filter(pk=user_id).exists():
+            return Response(
+                {"detail": "User not found."},
+                status=status.HTTP_404_NOT_FOUND,
+            )
 
-        for stock, qty in qty_by_stock.items():
-            if qty <= 0:
-                continue
-            
-            price = StockPrice.objects.filter(stock=stock).order_by('-date').first()
-            price = Decimal(str(price.value))
-            value = (qty * price).quantize(Decimal("0.01"))
-
-            positions.append(
-                {
-                    "symbol": stock.symbol,
-                    "quantity": qty.quantize(Decimal("0.0001")),
-                    "price": price.quantize(Decimal("0.0001")),
-                    "value": value,
-                }
+        # Open lots and running totals are kept per position, the order log is not read
+        data = profit_and_loss(user_id)
+        return Response(ProfitAndLossSerializer(data).data, status=status.HTTP_200_OK)
+
+
+@extend_schema(
+    summary="Get the dashboard of a user",
+    description=(
+        "Reúne en una sola respuesta el valor total del portafolio, los últimos movimientos y la "
+        "evolución diaria del valor (efectivo + acciones) del usuario. Las secciones comparten la "
+        "búsqueda del usuario, las órdenes ejecutadas y una sola consulta de precios. "
+        "`?include=total,movements,evolution` elige las secciones (todas por defecto), `?limit=` "
+        "la cantidad de movimientos (10 por defecto), `?from=YYYY-MM-DD&to=YYYY-MM-DD` el rango de "
+        f"la evolución (los últimos {settings.DASHBOARD_EVOLUTION_DAYS} días por defecto) y "
+        f"`?points=` la cantidad máxima de puntos de la evolución ({settings.DASHBOARD_EVOLUTION_POINTS} por defecto)."
+    ),
+    parameters=[
+        OpenApiParameter("include", OpenApiTypes.STR, description=f"Secciones separadas por coma: {', '.join(SECTIONS)}."),
+        OpenApiParameter("limit", OpenApiTypes.INT, description="Cantidad de movimientos."),
+        OpenApiParameter("from", OpenApiTypes.DATE, description="Inicio de la evolución (incluido)."),
+        OpenApiParameter("to", OpenApiTypes.DATE, description="Fin de la evolución (incluido)."),
+        OpenApiParameter("points", OpenApiTypes.INT, description=f"Cantidad máxima de puntos de la evolución (2 a {settings.PRICE_HISTORY_MAX_POINTS})."),
+    ],
+    responses={200: DashboardSerializer},
+)
+class UserDashboardView(APIView):
+    """
+    GET /api/users/<int:user_id>/dashboard/?include=total,movements,evolution&limit=10&from=YYYY-MM-DD&to=YYYY-MM-DD&points=N
+    """
+
+    def get(self, request, user_id: int):
+        user = User.objects.filter(pk=user_id).values("id", "first_name", "last_name", "email").first()
+        if user is None:
+            return Response(
+                {"detail": "User not found."},
+                status=status.HTTP_404_NOT_FOUND,
             )
-            stocks_total += value
 
-        portfolio_total = (cash + stocks_total).quantize(Decimal("0.01"))
+        include = SECTIONS
+        if request.query_params.get("include"):
+            include = [name.strip() for name in request.query_params["include"].split(",") if name.strip()]
+            unknown = [name for name in include if name not in SECTIONS]
+            if unknown:
+                raise ValidationError(
+                    {"include": [f"Unknown section(s): {', '.join(unknown)}. Choose from {', '.join(SECTIONS)}."]}
+                )
 
-        data = {
-            "user_id": user.pk,
-            "cash": cash.quantize(Decimal("0.01")),
-            "stocks_total": stocks_total.quantize(Decimal("0.01")),
-            "portfolio_total": portfolio_total,
-            "positions": positions,
-        }
+        try:
+            limit = int(request.query_params.get("limit", 10))
+        except ValueError:
+            limit = 10
+        if limit <= 0:
+            limit = 10
 
-        serializer = PortfolioTotalSerializer(data)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        start = date_query_param(request, "from")
+        end = date_query_param(request, "to")
+        # `to` defaults to today, a later `from` would leave the evolution without days
+        if start and start > (end or timezone.localdate()):
+            raise ValidationError({"from": ["Must be before or equal to `to` (today by default)."]})
+
+        points = request.query_params.get("points")
+        if points is not None:
+            try:
+                points = int(points)
+            except ValueError:
+                points = 0
+            if not 2 <= points <= settings.PRICE_HISTORY_MAX_POINTS:
+                raise ValidationError(
+                    {"points": [f"Must be an integer between 2 and {settings.PRICE_HISTORY_MAX_POINTS}."]}
+                )
+
+        data = user_dashboard(user, include, limit, start, end, points)
+        return Response(DashboardSerializer(data).data, status=status.HTTP_200_OK)
 
 
 @extend_schema(
@@ -371,15 +813,15 @@ class UserPortfolioTotalView(APIView):
     ),
     responses={200: MovementSerializer(many=True)},
 )
-class UserLastMovementsView(APIView):
+class UserLastMovementsView(ConditionalGetMixin, APIView):
     """
     GET /api/users/<int:user_id>/movements/?limit=10
     """
+    versions = ("orders_at", "transactions_at")
 
     def get(self, request, user_id: int):
-        try:
-            user = User.objects.get(pk=user_id, is_deleted=False)
-        except User.DoesNotExist:
+        # Looked up with the conditional GET validators
+        if self.user_versions is None:
             return Response(
                 {"detail": "User not found."},
                 status=status.HTTP_404_NOT_FOUND,
@@ -392,72 +834,8 @@ class UserLastMovementsView(APIView):
         if limit <= 0:
             limit = 10
 
-        movements = []
-
-        # 1) Transactions: DEPOSIT / WITHDRAW
-        transactions = Transaction.objects.filter(
-            user=user,
-            is_deleted=False,
-        ).order_by("-created_at")
-
-        for t in transactions:
-            movements.append(
-                {
-                    "type": "TRANSACTION",
-                    "subtype": t.transaction_type,
-                    "asset_type": None,
-                    "symbol": None,
-                    "portfolio_id": None,
-                    "amount": t.amount,
-                    "quantity": None,
-                    "execution_price": None,
-                    "value": t.amount,
-                    "date": t.execution_date or t.created_at.date(),
-                    "created_at": t.created_at,
-                }
-            )
-
-        # 2) Orders: BUY / SELL of STOCK / PORTFOLIO
-        orders = (
-            Order.objects.filter(
-                user=user,
-                is_deleted=False,
-            )
-            .select_related("stock", "portfolio")
-            .order_by("-created_at")
-        )
-
-        for o in orders:
-            symbol = o.stock.symbol if (o.asset_type == Order.ASSET_STOCK and o.stock) else None
-            portfolio_id = o.portfolio.pk if (o.asset_type == Order.ASSET_PORTFOLIO and o.portfolio) else None
-
-            if o.quantity is not None and o.execution_price is not None:
-                value = (o.quantity * o.execution_price).quantize(Decimal("0.01"))
-            else:
-                value = None
-
-            movements.append(
-                {
-                    "type": "ORDER",
-                    "subtype": o.side,
-                    "asset_type": o.asset_type,
-                    "symbol": symbol,
-                    "portfolio_id": portfolio_id,
-                    "amount": None,
-                    "quantity": o.quantity,
-                    "execution_price": o.execution_price,
-                    "value": value,
-                    "date": o.execution_date or o.created_at.date(),
-                    "created_at": o.created_at,
-                }
-            )
-
-        # 3) Order all movements by created_at DESC and apply limit
-        movements_sorted = sorted(
-            movements,
-            key=lambda m: m["created_at"],
-            reverse=True,
-        )[:limit]
+        # Only the newest `limit` transactions and orders are read
+        movements = last_movements(user_id, limit)
 
-        serializer = MovementSerializer(movements_sorted, many=True)
+        serializer = MovementSerializer(movements, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)